@@ -0,0 +1,210 @@
+import os
+import time
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection becomes available within the checkout timeout."""
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of database connections.
+
+    Connections are created lazily up to ``size``. On checkout, a connection
+    that has been idle longer than ``idle_timeout`` or alive longer than
+    ``max_lifetime`` is replaced, and one idle longer than ``ping_after`` is
+    health-checked first. Released connections are rolled back so the next
+    borrower never inherits an open transaction (or its stale snapshot).
+    """
+
+    def __init__(self, connect: Callable[[], object], size: int = 5, timeout: float = 10.0,
+                 idle_timeout: float = 300.0, max_lifetime: float = 3600.0, ping_after: float = 5.0,
+                 name: str = "pool"):
+        self._connect = connect
+        self.size = size
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.max_lifetime = max_lifetime
+        self.ping_after = ping_after
+        self.name = name
+        self._idle = deque()   # (conn, created_at, released_at)
+        self._created = {}     # id(conn) -> created_at, for every open connection
+        self._pending = 0      # slots reserved by threads currently connecting
+        self._cond = threading.Condition()
+        self._closed = False
+        self.checkouts = 0
+        self.waits = 0
+        self.timeouts = 0
+        self.discarded = 0
+        logger.info("ConnectionPool %s initialized with size %d", name, size)
+
+    def acquire(self, timeout: Optional[float] = None):
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._cond:
+                if self._closed:
+                    raise RuntimeError(f"ConnectionPool {self.name} is closed")
+                if self._idle:
+                    conn, created_at, released_at = self._idle.pop()
+                elif len(self._created) + self._pending < self.size:
+                    conn = None
+                    self._pending += 1  # reserve a slot while connecting outside the lock
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.timeouts += 1
+                        raise PoolTimeout(f"No connection available from {self.name} within {timeout:.1f}s")
+                    self.waits += 1
+                    self._cond.wait(remaining)
+                    continue
+            if conn is None:
+                return self._open_reserved()
+            now = time.monotonic()
+            if now - released_at > self.idle_timeout or now - created_at > self.max_lifetime:
+                self._discard(conn)
+                continue
+            if now - released_at > self.ping_after and not self._is_alive(conn):
+                self._discard(conn)
+                continue
+            with self._cond:
+                self.checkouts += 1
+            return conn
+
+    def _open_reserved(self):
+        try:
+            conn = self._connect()
+        except Exception:
+            with self._cond:
+                self._pending -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._pending -= 1
+            self._created[id(conn)] = time.monotonic()
+            self.checkouts += 1
+        logger.debug("ConnectionPool %s opened a connection (%d open)", self.name, len(self._created))
+        return conn
+
+    @staticmethod
+    def _is_alive(conn) -> bool:
+        try:
+            if hasattr(conn, "ping"):
+                conn.ping(reconnect=False)
+            elif hasattr(conn, "is_connected"):
+                return conn.is_connected()
+            else:
+                conn.cursor().close()
+            return True
+        except Exception:
+            return False
+
+    def _discard(self, conn) -> None:
+        with self._cond:
+            self._created.pop(id(conn), None)
+            self.discarded += 1
+            self._cond.notify()
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def release(self, conn, broken: bool = False) -> None:
+        """Returns a connection to the pool; ``broken`` connections are closed instead."""
+        if not broken:
+            try:
+                conn.rollback()
+            except Exception:
+                broken = True
+        with self._cond:
+            created_at = self._created.get(id(conn))
+            if not broken and not self._closed and created_at is not None:
+                self._idle.append((conn, created_at, time.monotonic()))
+                self._cond.notify()
+                return
+        self._discard(conn)
+
+    @contextmanager
+    def connection(self, timeout: Optional[float] = None):
+        """Checks out a connection for the duration of the ``with`` block."""
+        conn = self.acquire(timeout)
+        broken = False
+        try:
+            yield conn
+        except Exception as e:
+            # Connection-level failures must not be handed to the next borrower.
+            broken = not self._is_alive(conn)
+            if broken:
+                logger.warning("Discarding connection from %s after error: %s", self.name, str(e))
+            raise
+        finally:
+            self.release(conn, broken=broken)
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            idle = [conn for conn, _, _ in self._idle]
+            self._idle.clear()
+            for conn in idle:
+                self._created.pop(id(conn), None)
+            self._cond.notify_all()
+        for conn in idle:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "size": self.size,
+                "open": len(self._created),
+                "idle": len(self._idle),
+                "checkouts": self.checkouts,
+                "waits": self.waits,
+                "timeouts": self.timeouts,
+                "discarded": self.discarded,
+            }
+
+
+def mysql_config_from_env() -> dict:
+    return {
+        "host": os.getenv("MYSQL_HOST"),
+        "port": int(os.getenv("MYSQL_PORT", 3306)),
+        "user": os.getenv("MYSQL_USER"),
+        "password": os.getenv("MYSQL_PASSWORD"),
+        "database": os.getenv("MYSQL_DATABASE"),
+    }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_mysql_pool(db_config: Optional[dict] = None, size: Optional[int] = None) -> ConnectionPool:
+    """Returns the process-wide pool for ``db_config`` (default: MYSQL_* environment variables)."""
+    db_config = dict(db_config or mysql_config_from_env())
+    key = tuple(sorted(db_config.items()))
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            def connect():
+                import mysql.connector
+                return mysql.connector.connect(**db_config)
+
+            pool = ConnectionPool(
+                connect,
+                size=size or int(os.getenv("MYSQL_POOL_SIZE", 5)),
+                timeout=float(os.getenv("MYSQL_POOL_TIMEOUT", 10)),
+                idle_timeout=float(os.getenv("MYSQL_POOL_IDLE_TIMEOUT", 300)),
+                name=f"mysql://{db_config.get('host')}:{db_config.get('port')}/{db_config.get('database')}",
+            )
+            _pools[key] = pool
+        return pool
@@ -0,0 +1,192 @@
+import time
+import logging
+import threading
+from collections import namedtuple
+from typing import TYPE_CHECKING, Dict, List, Optional, Set
+from QueryCache import PromptIndex, normalize_prompt
+from SchemaManager import estimate_tokens
+from SQLTokenizer import SQLPolicy, extract_sql
+
+if TYPE_CHECKING:
+    import sqlite3
+
+logger = logging.getLogger(__name__)
+
+Example = namedtuple("Example", "question sql db_type executed runtime")
+
+
+class ExampleStore:
+    """
+    Few-shot examples drawn from the query history.
+
+    Each example is a (question, validated SQL, executed OK, runtime) tuple
+    per database type, kept in memory under the same character n-gram
+    TF-IDF index the query cache uses for fuzzy matches and, with a
+    ``path``, persisted in SQLite. ``select`` returns the examples most
+    similar to a request that fit a token budget. Examples whose SQL
+    executed successfully come first, then at most ``max_unverified`` whose
+    outcome is unknown (such as pairs imported from a log that never
+    recorded one); failed ones are never offered. ``executed`` is None until
+    an execution is reported.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_examples: int = 5000,
+                 policy: Optional[SQLPolicy] = None):
+        self.path = path
+        self.max_examples = max_examples
+        self.policy = policy or SQLPolicy.read_only()
+        self._examples: Dict[str, Example] = {}
+        self._by_sql: Dict[str, Set[str]] = {}
+        self._index = PromptIndex()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        if path:
+            conn = self._conn()
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS examples (
+                    key TEXT PRIMARY KEY,
+                    question TEXT NOT NULL,
+                    sql TEXT NOT NULL,
+                    db_type TEXT NOT NULL,
+                    executed INTEGER,
+                    runtime REAL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            rows = conn.execute("SELECT key, question, sql, db_type, executed, runtime FROM examples "
+                                "ORDER BY updated_at DESC LIMIT ?", (max_examples,)).fetchall()
+            for key, question, sql, db_type, executed, runtime in reversed(rows):
+                self._add(key, Example(question, sql, db_type, None if executed is None else bool(executed),
+                                       runtime))
+        logger.info("ExampleStore opened with %d examples%s", len(self._examples),
+                    f" from {path}" if path else "")
+
+    def _conn(self) -> "sqlite3.Connection":
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            import sqlite3
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _key(question: str, db_type: str) -> str:
+        return f"{db_type.lower()}:{normalize_prompt(question)}"
+
+    @staticmethod
+    def _sql_key(sql: str) -> str:
+        return " ".join(extract_sql(sql).rstrip().rstrip(";").split())
+
+    def _add(self, key: str, example: Example) -> None:
+        old = self._examples.pop(key, None)
+        if old is not None:
+            self._by_sql.get(self._sql_key(old.sql), set()).discard(key)
+        else:
+            self._index.add(key, example.db_type, key.split(":", 1)[1])
+        self._examples[key] = example
+        self._by_sql.setdefault(self._sql_key(example.sql), set()).add(key)
+        while len(self._examples) > self.max_examples:
+            oldest = next(iter(self._examples))
+            self._remove(oldest)
+
+    def _remove(self, key: str) -> None:
+        example = self._examples.pop(key)
+        self._index.remove(key)
+        keys = self._by_sql.get(self._sql_key(example.sql))
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_sql[self._sql_key(example.sql)]
+        if self.path:
+            self._conn().execute("DELETE FROM examples WHERE key = ?", (key,))
+
+    def _save(self, key: str, example: Example) -> None:
+        if not self.path:
+            return
+        executed = None if example.executed is None else int(example.executed)
+        self._conn().execute(
+            "INSERT OR REPLACE INTO examples (key, question, sql, db_type, executed, runtime, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (key, example.question, example.sql, example.db_type, executed, example.runtime, time.time()))
+
+    def record(self, question: str, sql: str, db_type: str, executed: Optional[bool] = None,
+               runtime: Optional[float] = None) -> bool:
+        """Adds or replaces the example for ``question``; returns False if ``sql`` fails the policy."""
+        sql = extract_sql(sql).strip()
+        if self.policy.check(sql, db_type) is not None:
+            return False
+        key = self._key(question, db_type)
+        example = Example(question.strip(), sql, db_type.lower(), executed, runtime)
+        with self._lock:
+            old = self._examples.get(key)
+            if executed is None and old is not None and self._sql_key(old.sql) == self._sql_key(sql):
+                example = example._replace(executed=old.executed, runtime=old.runtime)
+            self._add(key, example)
+            self._save(key, example)
+        return True
+
+    def record_execution(self, sql: str, ok: bool, runtime: Optional[float] = None) -> int:
+        """Marks every example with this SQL as executed (or failed); returns how many were updated."""
+        with self._lock:
+            keys = list(self._by_sql.get(self._sql_key(sql), ()))
+            for key in keys:
+                example = self._examples[key]._replace(executed=ok, runtime=runtime)
+                self._examples[key] = example
+                self._save(key, example)
+        return len(keys)
+
+    def select(self, question: str, db_type: str, k: int = 3, token_budget: int = 400,
+               min_similarity: float = 0.3, max_unverified: int = 1) -> List[Example]:
+        """
+        Up to ``k`` examples most similar to ``question`` whose rendering fits
+        ``token_budget``. Executed examples come first; at most
+        ``max_unverified`` examples whose SQL never ran are added after them.
+        """
+        normalized = normalize_prompt(question)
+        selected, seen_sql, used, unverified = [], set(), 0, 0
+        with self._lock:
+            candidates = self._index.search(db_type.lower(), normalized, k=k * 4, match_guard=False)
+            examples = [(self._examples[key], similarity) for key, similarity in candidates]
+        # Stable sort: verified examples first, each group still most similar first.
+        examples.sort(key=lambda item: item[0].executed is not True)
+        for example, similarity in examples:
+            if similarity < min_similarity or example.executed is False:
+                continue
+            if example.executed is None and unverified >= max_unverified:
+                continue
+            sql_key = self._sql_key(example.sql)
+            if sql_key in seen_sql:
+                continue
+            cost = estimate_tokens(self.format([example]))
+            if used + cost > token_budget:
+                continue
+            selected.append(example)
+            seen_sql.add(sql_key)
+            used += cost
+            unverified += example.executed is None
+            if len(selected) == k:
+                break
+        return selected
+
+    @staticmethod
+    def format(examples: List[Example]) -> str:
+        """Renders examples for the user prompt ("" when there are none)."""
+        if not examples:
+            return ""
+        pairs = "\n\n".join(f"Request: {example.question}\nSQL: {example.sql}" for example in examples)
+        return f"Examples of similar requests and SQL that answered them:\n{pairs}"
+
+    def import_log(self, path: str = "application.log") -> int:
+        """Records every generated query in an ``application.log``; returns how many were imported."""
+        from log_history import iter_query_pairs
+        imported = 0
+        for pair in iter_query_pairs(path):
+            if self.record(pair.question, pair.sql, pair.db_type, executed=pair.executed):
+                imported += 1
+        logger.info("Imported %d examples from %s", imported, path)
+        return imported
+
+    def __len__(self) -> int:
+        return len(self._examples)
@@ -0,0 +1,278 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import List, Optional, Sequence
+from ai_clients import AIClient, GenerationCancelled, cancel_event
+from QueryOptimizer import QueryOptimizer
+from SQLTokenizer import extract_sql
+from Metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HEDGE_AFTER = float(os.getenv("LLM_HEDGE_AFTER", 2.0))
+
+
+class CircuitOpen(RuntimeError):
+    """Raised when every provider is skipped because its circuit is open."""
+
+
+class CircuitBreaker:
+    """
+    Opens after ``failure_threshold`` consecutive failures and rejects calls
+    for a backoff that starts at ``base_backoff`` seconds and doubles, up to
+    ``max_backoff``, each time a trial call after the backoff fails again.
+    One successful call closes it and resets the backoff.
+    """
+
+    def __init__(self, failure_threshold: int = 3, base_backoff: float = 5.0, max_backoff: float = 300.0):
+        self.failure_threshold = failure_threshold
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.failures = 0
+        self.trips = 0
+        self.open_until = 0.0
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self.trips == 0:
+                return "closed"
+            return "open" if time.monotonic() < self.open_until else "half_open"
+
+    def allow(self) -> bool:
+        """True if a call may go through; while half-open only one trial call is let through at a time."""
+        with self._lock:
+            if self.trips == 0:
+                return True
+            if time.monotonic() < self.open_until or self._trial:
+                return False
+            self._trial = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.trips = 0
+            self._trial = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.trips or self.failures >= self.failure_threshold:
+                backoff = min(self.max_backoff, self.base_backoff * 2 ** self.trips)
+                self.trips += 1
+                self.open_until = time.monotonic() + backoff
+                self._trial = False
+                logger.warning("Circuit opened for %.1fs after %d consecutive failures", backoff, self.failures)
+
+    def release(self) -> None:
+        """Ends a trial call that was cancelled before it could succeed or fail."""
+        with self._lock:
+            self._trial = False
+
+
+class HedgedClient(AIClient):
+    """
+    Composite AIClient over several providers, in order of preference.
+
+    The request goes to the first provider whose circuit is closed. If no
+    reply that passes ``QueryOptimizer.validate`` has arrived after
+    ``hedge_after`` seconds (or the provider failed), the next provider is
+    asked as well, and the first valid reply wins; the calls still running
+    are cancelled. ``timeout`` bounds the whole request. Errors and
+    timeouts count against a provider's circuit breaker, so a provider that
+    keeps failing is skipped until its backoff expires.
+
+        client = HedgedClient([OpenAIClient(), QwenClient(key)], hedge_after=1.5)
+    """
+
+    def __init__(self, providers: Sequence[AIClient], names: Optional[Sequence[str]] = None,
+                 hedge_after: float = DEFAULT_HEDGE_AFTER, timeout: Optional[float] = None,
+                 optimizer: Optional[QueryOptimizer] = None, failure_threshold: int = 3,
+                 base_backoff: float = 5.0, max_backoff: float = 300.0, max_workers: int = 32):
+        if not providers:
+            raise ValueError("HedgedClient needs at least one provider")
+        self.providers = list(providers)
+        self.names = list(names) if names else [type(provider).__name__ for provider in self.providers]
+        self.hedge_after = hedge_after
+        self.timeout = timeout
+        self.optimizer = optimizer or QueryOptimizer(row_limit=None)
+        self.breakers = [CircuitBreaker(failure_threshold, base_backoff, max_backoff) for _ in self.providers]
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="hedged-llm")
+        logger.info("HedgedClient initialized with providers %s, hedging after %.2fs", self.names, hedge_after)
+
+    def _next_provider(self, queue: List[int]) -> Optional[int]:
+        """Pops providers off ``queue`` until one whose breaker lets the call through."""
+        while queue:
+            index = queue.pop(0)
+            if self.breakers[index].allow():
+                return index
+            metrics.incr("llm_circuit_open", provider=self.names[index])
+        return None
+
+    def _circuit_open(self) -> CircuitOpen:
+        return CircuitOpen(f"All providers are unavailable: {', '.join(self.names)}")
+
+    def _valid(self, result: dict) -> bool:
+        return self.optimizer.validate(extract_sql(result.get("query") or ""))
+
+    @staticmethod
+    def _call(provider: AIClient, event: threading.Event, prompt: str, max_tokens: int,
+              system_prompt: Optional[str]) -> dict:
+        token = cancel_event.set(event)
+        try:
+            return provider.generate_query(prompt, max_tokens, system_prompt)
+        finally:
+            cancel_event.reset(token)
+
+    def _settle(self, index: int, result: Optional[dict], error: Optional[BaseException], started: float,
+                hedged: bool) -> Optional[dict]:
+        """Records the outcome of one provider call; returns the result if it is the one to use."""
+        name, breaker = self.names[index], self.breakers[index]
+        if isinstance(error, (GenerationCancelled, asyncio.CancelledError)):
+            breaker.release()
+            return None
+        if error is not None:
+            breaker.record_failure()
+            metrics.incr("llm_provider_errors", provider=name)
+            logger.warning("Provider %s failed: %s", name, str(error))
+            return None
+        breaker.record_success()
+        if not self._valid(result):
+            metrics.incr("llm_provider_invalid", provider=name)
+            logger.warning("Provider %s returned SQL that failed validation", name)
+            return None
+        metrics.incr("llm_provider_wins", provider=name)
+        logger.info("Provider %s answered in %.2fs%s", name, time.monotonic() - started,
+                    " (hedged)" if hedged else "")
+        return dict(result, provider=name, hedged=hedged)
+
+    def _timed_out(self, running: List[int]) -> TimeoutError:
+        for index in running:
+            self.breakers[index].record_failure()
+            metrics.incr("llm_provider_errors", provider=self.names[index])
+        return TimeoutError(f"No valid SQL from {', '.join(self.names[i] for i in running)} "
+                            f"within {self.timeout:.1f}s")
+
+    def generate_query(self, prompt: str, max_tokens: int, system_prompt: Optional[str] = None) -> dict:
+        queue = list(range(len(self.providers)))
+        primary, started = self._next_provider(queue), time.monotonic()
+        if primary is None:
+            raise self._circuit_open()
+        deadline = None if self.timeout is None else started + self.timeout
+        running, events = {}, {}  # future -> provider index, provider index -> cancel event
+
+        def launch(index):
+            if running:
+                metrics.incr("llm_hedges")
+                logger.info("Hedging request to %s", self.names[index])
+            events[index] = threading.Event()
+            running[self._executor.submit(self._call, self.providers[index], events[index], prompt,
+                                          max_tokens, system_prompt)] = index
+            return time.monotonic() + self.hedge_after
+
+        error = None
+        next_hedge = launch(primary)
+        try:
+            while running or queue:
+                if not running:
+                    index = self._next_provider(queue)
+                    if index is None:
+                        break
+                    next_hedge = launch(index)
+                now = time.monotonic()
+                waits = [t - now for t in (next_hedge if queue else None, deadline) if t is not None]
+                done, _ = wait(running, timeout=max(0.0, min(waits)) if waits else None,
+                               return_when=FIRST_COMPLETED)
+                for future in done:
+                    index = running.pop(future)
+                    failure = future.exception()
+                    result = None if failure is not None else future.result()
+                    settled = self._settle(index, result, failure, started, hedged=index != primary)
+                    if settled is not None:
+                        return settled
+                    error = failure or ValueError(f"{self.names[index]} returned SQL that failed validation")
+                if done:
+                    continue
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise self._timed_out(list(running.values()))
+                if queue and time.monotonic() >= next_hedge:
+                    index = self._next_provider(queue)
+                    if index is not None:
+                        next_hedge = launch(index)
+        finally:
+            # The losers stop at their next chunk; a trial call of a half-open breaker is released when it ends.
+            for future, index in running.items():
+                events[index].set()
+                future.cancel()
+                future.add_done_callback(lambda _, breaker=self.breakers[index]: breaker.release())
+        raise error or self._circuit_open()
+
+    @staticmethod
+    async def _acall(provider: AIClient, event: threading.Event, prompt: str, max_tokens: int,
+                     system_prompt: Optional[str]) -> dict:
+        cancel_event.set(event)  # the task runs in its own copy of the context
+        return await provider.agenerate_query(prompt, max_tokens, system_prompt)
+
+    async def agenerate_query(self, prompt: str, max_tokens: int, system_prompt: Optional[str] = None) -> dict:
+        """Coroutine version of generate_query; losing calls are cancelled as tasks."""
+        queue = list(range(len(self.providers)))
+        primary, started = self._next_provider(queue), time.monotonic()
+        if primary is None:
+            raise self._circuit_open()
+        deadline = None if self.timeout is None else started + self.timeout
+        running, events = {}, {}  # task -> provider index, provider index -> cancel event
+
+        def launch(index):
+            if running:
+                metrics.incr("llm_hedges")
+                logger.info("Hedging request to %s", self.names[index])
+            events[index] = threading.Event()
+            running[asyncio.ensure_future(self._acall(self.providers[index], events[index], prompt,
+                                                      max_tokens, system_prompt))] = index
+            return time.monotonic() + self.hedge_after
+
+        error = None
+        next_hedge = launch(primary)
+        try:
+            while running or queue:
+                if not running:
+                    index = self._next_provider(queue)
+                    if index is None:
+                        break
+                    next_hedge = launch(index)
+                now = time.monotonic()
+                waits = [t - now for t in (next_hedge if queue else None, deadline) if t is not None]
+                done, _ = await asyncio.wait(running, timeout=max(0.0, min(waits)) if waits else None,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    index = running.pop(task)
+                    failure = task.exception()
+                    result = None if failure is not None else task.result()
+                    settled = self._settle(index, result, failure, started, hedged=index != primary)
+                    if settled is not None:
+                        return settled
+                    error = failure or ValueError(f"{self.names[index]} returned SQL that failed validation")
+                if done:
+                    continue
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise self._timed_out(list(running.values()))
+                if queue and time.monotonic() >= next_hedge:
+                    index = self._next_provider(queue)
+                    if index is not None:
+                        next_hedge = launch(index)
+        finally:
+            for task, index in running.items():
+                events[index].set()
+                task.cancel()
+                task.add_done_callback(lambda _, breaker=self.breakers[index]: breaker.release())
+        raise error or self._circuit_open()
+
+    def stats(self) -> dict:
+        return {name: {"state": breaker.state, "failures": breaker.failures, "trips": breaker.trips}
+                for name, breaker in zip(self.names, self.breakers)}
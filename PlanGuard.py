@@ -0,0 +1,285 @@
+import os
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import List, Optional
+from ConnectionPool import ConnectionPool
+from SQLTokenizer import analyze, extract_sql
+from Metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ROWS_EXAMINED = int(os.getenv("PLAN_MAX_ROWS_EXAMINED", 1000000))
+DEFAULT_MAX_SCAN_ROWS = int(os.getenv("PLAN_MAX_SCAN_ROWS", 100000))
+DEFAULT_MAX_SORT_ROWS = int(os.getenv("PLAN_MAX_SORT_ROWS", 100000))
+
+# Errors EXPLAIN reports for SQL that can never run: syntax, unknown table/column, ambiguity, GROUP BY.
+_INVALID_SQL_ERRNOS = frozenset({1052, 1054, 1055, 1064, 1146})
+
+# Top-level constructs that have to read every qualifying row before the first one is returned.
+_FULL_READ_KEYWORDS = frozenset({"GROUP", "ORDER", "DISTINCT", "HAVING", "UNION", "EXCEPT", "INTERSECT",
+                                 "OVER", "WINDOW"})
+_AGGREGATES = frozenset({"COUNT", "SUM", "AVG", "MIN", "MAX", "GROUP_CONCAT", "JSON_ARRAYAGG",
+                         "JSON_OBJECTAGG", "STD", "STDDEV", "STDDEV_POP", "STDDEV_SAMP", "VARIANCE",
+                         "VAR_POP", "VAR_SAMP", "BIT_AND", "BIT_OR", "BIT_XOR"})
+
+
+class PlanRejected(ValueError):
+    """Raised when a query's plan exceeds the guard's thresholds; ``hints`` say how to fix it."""
+
+    def __init__(self, reason: str, hints: Optional[List[str]] = None, stats: Optional[dict] = None):
+        super().__init__(reason)
+        self.reason = reason
+        self.hints = hints or []
+        self.stats = stats or {}
+
+
+def _number(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def row_bound(sql: str) -> Optional[int]:
+    """
+    The most rows a single SELECT can read before it stops: LIMIT n (plus
+    any offset) or TOP n, when nothing at the top level (ORDER BY, GROUP BY,
+    DISTINCT, an aggregate, a set operation or window) needs the whole
+    input first. None when the query is not bounded that way.
+    """
+    statements = analyze(extract_sql(sql)).statements
+    if len(statements) != 1:
+        return None
+    tokens = statements[0].tokens
+    bound, depth = None, 0
+    for i, token in enumerate(tokens):
+        if token.kind == "open":
+            depth += 1
+        elif token.kind == "close":
+            depth -= 1
+        if depth or token.kind in ("open", "close"):
+            continue
+        following = tokens[i + 1:i + 4]
+        if token.kind == "keyword" and token.value in _FULL_READ_KEYWORDS:
+            return None
+        if token.kind == "identifier" and token.value.upper() in _AGGREGATES and following \
+                and following[0].kind == "open":
+            return None
+        if token.kind != "keyword" or not following or following[0].kind != "number":
+            continue
+        if token.value in ("LIMIT", "TOP"):
+            bound = int(_number(following[0].value))
+            if token.value == "LIMIT" and len(following) == 3 and following[1].value == "," \
+                    and following[2].kind == "number":
+                bound += int(_number(following[2].value))  # LIMIT offset, count
+        elif token.value == "OFFSET" and bound is not None:
+            bound += int(_number(following[0].value))
+    return bound
+
+
+def plan_stats(plan: dict) -> dict:
+    """
+    Summarizes a MySQL ``EXPLAIN FORMAT=JSON`` document: estimated rows
+    examined (each nested-loop table's scan size times the rows produced by
+    the tables before it), per-table access types, temporary table and
+    filesort usage, and tables joined without any condition.
+    """
+    stats = {"rows_examined": 0, "query_cost": None, "tables": [], "temporary": False,
+             "filesort": False, "cartesian": []}
+    cost = plan.get("query_block", {}).get("cost_info", {}).get("query_cost")
+    if cost is not None:
+        stats["query_cost"] = _number(cost)
+
+    def add_table(table: dict, prefix: float, joined: bool) -> float:
+        scan = _number(table.get("rows_examined_per_scan"))
+        stats["rows_examined"] += int(prefix * scan)
+        stats["tables"].append({
+            "table": table.get("table_name"),
+            "access_type": table.get("access_type"),
+            "rows": int(scan),
+            "filtered": _number(table.get("filtered", 100)),
+            "key": table.get("key"),
+            "possible_keys": table.get("possible_keys") or [],
+        })
+        if joined and table.get("access_type") == "ALL" and table.get("using_join_buffer") \
+                and not table.get("attached_condition"):
+            stats["cartesian"].append(table.get("table_name"))
+        walk(table, skip=("table_name",))
+        # rows_produced_per_join is cumulative: the rows the join has produced up to this table.
+        return _number(table.get("rows_produced_per_join")) or prefix * scan
+
+    def walk(node, skip=()):
+        if isinstance(node, list):
+            for item in node:
+                walk(item)
+            return
+        if not isinstance(node, dict):
+            return
+        if node.get("using_temporary_table"):
+            stats["temporary"] = True
+        if node.get("using_filesort"):
+            stats["filesort"] = True
+        for key, value in node.items():
+            if key in skip:
+                continue
+            if key == "nested_loop" and isinstance(value, list):
+                prefix = 1.0
+                for i, step in enumerate(value):
+                    if isinstance(step, dict) and isinstance(step.get("table"), dict):
+                        prefix = add_table(step["table"], prefix, joined=i > 0)
+                    else:
+                        walk(step)
+            elif key == "table" and isinstance(value, dict) and "table_name" in value:
+                add_table(value, 1.0, joined=False)
+            else:
+                walk(value)
+
+    walk(plan)
+    return stats
+
+
+class PlanGuard:
+    """
+    Pre-execution check of MySQL query plans.
+
+    ``check`` runs ``EXPLAIN FORMAT=JSON`` on a pooled connection and raises
+    PlanRejected when the estimated rows examined exceed
+    ``max_rows_examined``, a table is fully scanned beyond
+    ``max_scan_rows``, a temporary table or filesort covers more than
+    ``max_sort_rows``, or tables are joined without any condition. For a
+    query that stops at a LIMIT/TOP (see ``row_bound``), the driving table's
+    scan and the rows examined are scaled down to what producing that many
+    rows is estimated to read. Plans are cached per normalized SQL for
+    ``cache_ttl`` seconds, so repeated queries skip the EXPLAIN round trip.
+    """
+
+    def __init__(self, pool: ConnectionPool, max_rows_examined: int = DEFAULT_MAX_ROWS_EXAMINED,
+                 max_scan_rows: int = DEFAULT_MAX_SCAN_ROWS, max_sort_rows: int = DEFAULT_MAX_SORT_ROWS,
+                 reject_cartesian: bool = True, cache_size: int = 1024, cache_ttl: float = 600.0):
+        self.pool = pool
+        self.max_rows_examined = max_rows_examined
+        self.max_scan_rows = max_scan_rows
+        self.max_sort_rows = max_sort_rows
+        self.reject_cartesian = reject_cartesian
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self._plans = OrderedDict()  # normalized SQL -> (stats, expires_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.rejections = 0
+        logger.info("PlanGuard initialized: max %d rows examined, %d rows per full scan",
+                    max_rows_examined, max_scan_rows)
+
+    @staticmethod
+    def normalize(sql: str) -> str:
+        """Whitespace, comments, fences and keyword case do not change the plan key."""
+        statements = analyze(extract_sql(sql)).statements
+        return ";".join(" ".join(token.value for token in statement.tokens) for statement in statements)
+
+    def _explain(self, sql: str) -> dict:
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("EXPLAIN FORMAT=JSON " + sql)
+                row = cursor.fetchone()
+            finally:
+                cursor.close()
+        return json.loads(row[0])
+
+    def explain(self, sql: str) -> Optional[dict]:
+        """Returns plan_stats for ``sql`` (cached), or None if the server could not explain it."""
+        key = self.normalize(sql)
+        now = time.monotonic()
+        with self._lock:
+            cached = self._plans.get(key)
+            if cached is not None and cached[1] > now:
+                self._plans.move_to_end(key)
+                self.hits += 1
+                metrics.incr("plan_cache_hits")
+                return cached[0]
+            self.misses += 1
+        try:
+            stats = plan_stats(self._explain(extract_sql(sql).rstrip(";")))
+        except Exception as e:
+            if getattr(e, "errno", None) in _INVALID_SQL_ERRNOS:
+                stats = {"error": str(e)}
+            else:
+                logger.warning("EXPLAIN failed, skipping plan check: %s", str(e))
+                return None
+        with self._lock:
+            self._plans[key] = (stats, now + self.cache_ttl)
+            self._plans.move_to_end(key)
+            while len(self._plans) > self.cache_size:
+                self._plans.popitem(last=False)
+        return stats
+
+    @staticmethod
+    def _limit_scale(stats: dict, bound: Optional[int]) -> float:
+        """The fraction of the driving table a query stopping after ``bound`` rows is expected to read."""
+        if bound is None or not stats["tables"] or not stats["tables"][0]["rows"]:
+            return 1.0
+        driving = stats["tables"][0]
+        # Rows that pass the driving table's condition are ``filtered`` percent of those read.
+        needed = bound * 100.0 / max(driving["filtered"], 0.01)
+        return min(1.0, needed / driving["rows"])
+
+    def _violations(self, stats: dict, schema: Optional[dict], bound: Optional[int] = None):
+        if "error" in stats:
+            return [f"the query does not run: {stats['error']}"], ["Use only tables and columns from the schema."]
+        reasons, hints = [], []
+        tables = (schema or {}).get("tables", {})
+        scale = self._limit_scale(stats, bound)
+        rows_examined = int(stats["rows_examined"] * scale)
+        for position, table in enumerate(stats["tables"]):
+            rows = int(table["rows"] * scale) if position == 0 else table["rows"]
+            if table["access_type"] in ("ALL", "index") and rows > self.max_scan_rows:
+                reasons.append(f"full scan of {table['table']} (~{rows} rows)")
+                indexed = sorted({index["columns"][0] for index in
+                                  tables.get(table["table"], {}).get("indexes", {}).values() if index.get("columns")})
+                candidates = table["possible_keys"] or indexed
+                if candidates:
+                    hints.append(f"Filter or join {table['table']} on an indexed column ({', '.join(candidates)}).")
+                else:
+                    hints.append(f"Add a selective filter on {table['table']} or aggregate before joining it.")
+        if rows_examined > self.max_rows_examined:
+            reasons.append(f"~{rows_examined} rows examined (limit {self.max_rows_examined})")
+        if (stats["temporary"] or stats["filesort"]) and rows_examined > self.max_sort_rows:
+            reasons.append("temporary table/filesort over a large intermediate result")
+            hints.append("Filter before GROUP BY/ORDER BY, or order by an indexed column.")
+        if self.reject_cartesian and stats["cartesian"]:
+            reasons.append(f"cartesian join with {', '.join(stats['cartesian'])}")
+            hints.append("Give every joined table an ON condition on its foreign key.")
+        return reasons, hints
+
+    def check(self, sql: str, schema: Optional[dict] = None) -> Optional[dict]:
+        """
+        Raises PlanRejected if the plan of ``sql`` exceeds the thresholds;
+        otherwise returns its plan statistics (None if it could not be explained).
+        ``schema`` (a SchemaGenerator schema) lets hints name indexed columns.
+        """
+        with metrics.timer("plan_check"):
+            stats = self.explain(sql)
+        if stats is None:
+            return None
+        reasons, hints = self._violations(stats, schema, row_bound(sql))
+        if reasons:
+            with self._lock:
+                self.rejections += 1
+            metrics.incr("plan_rejects")
+            reason = "; ".join(reasons)
+            logger.warning("Plan guard rejected query: %s", reason)
+            raise PlanRejected(reason, hints, stats)
+        return stats
+
+    def clear(self) -> None:
+        with self._lock:
+            self._plans.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"plans": len(self._plans), "hits": self.hits, "misses": self.misses,
+                    "rejections": self.rejections}
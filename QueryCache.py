@@ -1,35 +1,430 @@
+import re
+import math
+import time
 import hashlib
 import logging
-from typing import Optional
-from logging_config import setup_logging
+import threading
+from collections import Counter, OrderedDict, defaultdict
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional
+from Metrics import metrics
+
+if TYPE_CHECKING:
+    from SQLiteCacheStore import SQLiteCacheStore
 
-setup_logging()
 logger = logging.getLogger(__name__)
 
+STOP_WORDS = frozenset("""
+    a an the please me us i we my our you can could would will give show get fetch list find display
+    return tell what which is are was were be of for to in on at by from with that this these those
+    there here do does did how
+""".split())
+
+# Quoted literals (kept verbatim), comparison operators and words; everything else is punctuation.
+_PROMPT_TOKEN = re.compile(r""""[^"]*"|'[^']*'|[<>!]=|<>|[<>=]|[A-Za-z0-9]+""")
+
+
+def _stem(word: str) -> str:
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def _normalize_token(token: str) -> str:
+    if token[0] in "'\"":
+        # A literal keeps its case; whitespace inside it becomes \x1f so the key stays one token per word.
+        return "'" + "\x1f".join(token[1:-1].split()) + "'"
+    return token.lower()
+
+
+def normalize_prompt(text: str) -> str:
+    """
+    Lower-cases, strips punctuation, stop words and plural endings and
+    collapses whitespace. Comparison operators and quoted literals are kept,
+    so 'amount > 100' and 'amount < 100', or '"TX"' and '"WA"', stay distinct.
+    """
+    tokens = [_normalize_token(t) for t in _PROMPT_TOKEN.findall(text)]
+    kept = [t for t in tokens if t not in STOP_WORDS]
+    return " ".join(_stem(t) if t.isalnum() else t for t in kept or tokens)
+
+
+def _ngrams(text: str, n: int = 3) -> Counter:
+    padded = f" {text} "
+    return Counter(padded[i:i + n] for i in range(len(padded) - n + 1))
+
+
+def _guard_terms(normalized: str) -> frozenset:
+    # Every content word, number, operator and literal: a fuzzy match may only differ in order and repetition.
+    return frozenset(normalized.split())
+
+
+class _Entry:
+    __slots__ = ("query", "expires_at", "size", "user_input", "normalized", "db_type",
+                 "fingerprint", "dependencies", "references")
+
+    def __init__(self, query, expires_at, size, user_input, normalized, db_type,
+                 fingerprint, dependencies, references):
+        self.query = query
+        self.expires_at = expires_at
+        self.size = size
+        self.user_input = user_input
+        self.normalized = normalized
+        self.db_type = db_type
+        self.fingerprint = fingerprint
+        self.dependencies = dependencies  # table -> schema version when the query was generated
+        self.references = references      # table -> referenced columns
+
+
+class PromptIndex:
+    """Character n-gram TF-IDF index over the normalized prompts held in memory."""
+
+    MAX_CANDIDATES = 32
+
+    def __init__(self):
+        self.postings = defaultdict(set)  # n-gram -> keys
+        self.vectors = {}                 # key -> (namespace, n-gram counts, guard terms)
+
+    def add(self, key: str, namespace: str, normalized: str) -> None:
+        grams = _ngrams(normalized)
+        self.vectors[key] = (namespace, grams, _guard_terms(normalized))
+        for gram in grams:
+            self.postings[gram].add(key)
+
+    def remove(self, key: str) -> None:
+        entry = self.vectors.pop(key, None)
+        if entry is None:
+            return
+        for gram in entry[1]:
+            keys = self.postings.get(gram)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.postings[gram]
+
+    def clear(self) -> None:
+        self.postings.clear()
+        self.vectors.clear()
+
+    def _idf(self, gram: str, n_docs: int) -> float:
+        return math.log(n_docs / (len(self.postings.get(gram, ())) + 1)) + 1.0
+
+    def nearest(self, namespace: str, normalized: str):
+        """Returns (key, cosine similarity) of the closest prompt in the namespace, or None."""
+        best = self.search(namespace, normalized, k=1)
+        return best[0] if best else None
+
+    def search(self, namespace: str, normalized: str, k: int = 1, match_guard: bool = True) -> list:
+        """
+        Returns up to ``k`` (key, cosine similarity) pairs in the namespace,
+        most similar first. With ``match_guard`` only prompts with the same
+        content words, numbers, operators and quoted literals are considered.
+        """
+        grams = _ngrams(normalized)
+        guard = _guard_terms(normalized)
+        n_docs = len(self.vectors) + 1
+
+        overlap = Counter()
+        for gram in grams:
+            for key in self.postings.get(gram, ()):
+                overlap[key] += 1
+        if not overlap:
+            return []
+        idf = {}
+        query_weights = {}
+        for gram, count in grams.items():
+            idf[gram] = self._idf(gram, n_docs)
+            query_weights[gram] = count * idf[gram]
+        query_norm = math.sqrt(sum(w * w for w in query_weights.values()))
+        scored = []
+        for key, _ in overlap.most_common(max(self.MAX_CANDIDATES, k)):
+            entry_namespace, entry_grams, entry_guard = self.vectors[key]
+            if entry_namespace != namespace or (match_guard and entry_guard != guard):
+                continue
+            dot, norm = 0.0, 0.0
+            for gram, count in entry_grams.items():
+                if gram not in idf:
+                    idf[gram] = self._idf(gram, n_docs)
+                weight = count * idf[gram]
+                norm += weight * weight
+                if gram in query_weights:
+                    dot += weight * query_weights[gram]
+            similarity = dot / (math.sqrt(norm) * query_norm) if norm and query_norm else 0.0
+            scored.append((key, similarity))
+        scored.sort(key=lambda item: item[1], reverse=True)
+        return scored[:k]
+
+
 class QueryCache:
-    """LRU cache for generated queries"""
+    """
+    Thread-safe LRU cache for generated queries.
+
+    Entries are bounded both by count (``max_size``) and by the total size of
+    the cached queries (``max_bytes``) and expire after ``ttl`` seconds. All
+    operations are O(1): the OrderedDict keeps recency order, so a hit is a
+    ``move_to_end`` and an eviction pops the oldest entry.
+
+    Prompts are normalized before hashing, so case, whitespace, punctuation
+    and stop words do not cause misses. ``lookup(fuzzy=True)`` additionally
+    falls back to a character n-gram TF-IDF nearest-neighbour search over the
+    in-memory prompts and reports how confident the match is; a fuzzy match
+    must still have exactly the same content words, numbers, operators and
+    quoted literals, so it only absorbs reordering and repetition.
 
-    def __init__(self, max_size: int = 100):
-        self.cache = {}
+    With an ``l2`` store, misses read through to the shared on-disk tier and
+    promote what they find; sets are written through to both tiers.
+
+    Every entry remembers the schema fingerprint it was generated against
+    and the tables and columns its SQL references, with those tables'
+    versions. After a schema change an entry is still served if none of its
+    tables changed; otherwise it is dropped on access. A reverse index from
+    table to keys lets ``invalidate_tables`` drop affected entries eagerly.
+    """
+
+    _KEY_OVERHEAD = 64  # hex sha256 key held alongside every entry
+
+    def __init__(self, max_size: int = 100, max_bytes: int = 16 * 1024 * 1024,
+                 ttl: Optional[float] = 3600, l2: Optional["SQLiteCacheStore"] = None,
+                 fuzzy_threshold: Optional[float] = 0.85):
+        self.cache = OrderedDict()  # key -> _Entry
         self.max_size = max_size
-        logger.info("QueryCache initialized with max_size %d", max_size)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.l2 = l2
+        self.fuzzy_threshold = fuzzy_threshold
+        self._index = PromptIndex()
+        self._tables = defaultdict(set)  # table -> keys of entries referencing it
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.l2_hits = 0
+        self.fuzzy_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.bytes = 0
+        logger.info("QueryCache initialized with max_size %d, max_bytes %d, ttl %s", max_size, max_bytes, ttl)
 
     def _generate_key(self, user_input: str, db_type: str) -> str:
-        key = hashlib.sha256(f"{user_input}-{db_type}".encode()).hexdigest()
-        logger.debug(f"Generated cache key: {key} for input: {user_input} and db_type: {db_type}")
-        return key
+        normalized = normalize_prompt(user_input)
+        return hashlib.sha256(f"{normalized}-{db_type.lower()}".encode()).hexdigest()
+
+    def key_for(self, user_input: str, db_type: str) -> str:
+        """Returns the cache key a prompt maps to; equivalent prompts share a key."""
+        return self._generate_key(user_input, db_type)
+
+    @staticmethod
+    def _still_valid(fingerprint: str, dependencies: Optional[dict], schema_fingerprint: str,
+                     schema_versions: Optional[dict]) -> bool:
+        # A lookup without a fingerprint has nothing to compare with and must not evict.
+        if not schema_fingerprint or fingerprint == schema_fingerprint:
+            return True
+        if not dependencies or schema_versions is None:
+            return False
+        return all(schema_versions.get(table) == version for table, version in dependencies.items())
+
+    def get(self, user_input: str, db_type: str, schema_fingerprint: str = "",
+            schema_versions: Optional[dict] = None) -> Optional[str]:
+        """Returns the cached query for an exact or normalized match, without fuzzy fallback."""
+        result = self.lookup(user_input, db_type, schema_fingerprint, schema_versions, fuzzy=False)
+        return result["query"] if result else None
 
-    def get(self, user_input: str, db_type: str) -> Optional[str]:
+    def lookup(self, user_input: str, db_type: str, schema_fingerprint: str = "",
+               schema_versions: Optional[dict] = None, fuzzy: bool = False) -> Optional[dict]:
+        """
+        Returns a dictionary with keys "query", "match" ("exact", "normalized"
+        or "fuzzy"), "confidence" (1.0 unless fuzzy) and "matched_input", or
+        None on a miss.
+        """
+        with metrics.timer("cache_lookup"):
+            found = self._lookup(user_input, db_type, schema_fingerprint, schema_versions, fuzzy)
+        if found is None:
+            metrics.incr("cache_misses")
+        else:
+            metrics.incr("cache_hits", match=found["match"])
+        return found
+
+    def _lookup(self, user_input: str, db_type: str, schema_fingerprint: str,
+                schema_versions: Optional[dict], fuzzy: bool) -> Optional[dict]:
         key = self._generate_key(user_input, db_type)
-        result = self.cache.get(key)
-        logger.info("Cache get for key %s: %s", key, result)
-        return result
+        with self._lock:
+            entry = self._get_live(key, schema_fingerprint, schema_versions)
+            if entry is not None:
+                self.cache.move_to_end(key)
+                self.hits += 1
+                logger.debug("Cache hit for key %s", key)
+                exact = entry.user_input == user_input
+                return {"query": entry.query, "match": "exact" if exact else "normalized",
+                        "confidence": 1.0, "matched_input": entry.user_input}
+        if self.l2 is not None:
+            try:
+                found = self.l2.get(key)
+            except Exception as e:
+                logger.warning("L2 cache read failed: %s", str(e))
+                found = None
+            if found is not None and not self._still_valid(found["fingerprint"], found["dependencies"],
+                                                           schema_fingerprint, schema_versions):
+                self.l2.delete(key)
+                found = None
+            if found is not None:
+                ttl = found["expires_at"] - time.time() if found["expires_at"] is not None else 0
+                self._set_local(key, found["user_input"] or user_input, db_type, found["query"], ttl,
+                                schema_fingerprint or found["fingerprint"], found["dependencies"],
+                                found["references"])
+                with self._lock:
+                    self.hits += 1
+                    self.l2_hits += 1
+                logger.debug("L2 cache hit for key %s", key)
+                return {"query": found["query"], "match": "normalized", "confidence": 1.0,
+                        "matched_input": found["user_input"] or user_input}
+        if fuzzy and self.fuzzy_threshold is not None:
+            normalized = normalize_prompt(user_input)
+            with self._lock:
+                nearest = self._index.nearest(db_type.lower(), normalized)
+                if nearest is not None and nearest[1] >= self.fuzzy_threshold:
+                    entry = self._get_live(nearest[0], schema_fingerprint, schema_versions)
+                    if entry is not None:
+                        self.cache.move_to_end(nearest[0])
+                        self.hits += 1
+                        self.fuzzy_hits += 1
+                        logger.debug("Fuzzy cache hit for key %s (similarity %.3f)", nearest[0], nearest[1])
+                        return {"query": entry.query, "match": "fuzzy", "confidence": round(nearest[1], 4),
+                                "matched_input": entry.user_input}
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def _get_live(self, key: str, schema_fingerprint: str,
+                  schema_versions: Optional[dict]) -> Optional[_Entry]:
+        # Caller holds the lock.
+        entry = self.cache.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at is not None and entry.expires_at <= time.monotonic():
+            self._remove(key)
+            self.expirations += 1
+            return None
+        if not self._still_valid(entry.fingerprint, entry.dependencies, schema_fingerprint, schema_versions):
+            self._remove(key)
+            self.invalidations += 1
+            return None
+        if schema_fingerprint:
+            entry.fingerprint = schema_fingerprint
+        return entry
 
-    def set(self, user_input: str, db_type: str, query: str) -> None:
+    def set(self, user_input: str, db_type: str, query: str, ttl: Optional[float] = None,
+            schema_fingerprint: str = "", references: Optional[Dict[str, List[str]]] = None,
+            schema_versions: Optional[dict] = None) -> None:
+        """
+        Caches ``query``. ``references`` maps each table the SQL uses to the
+        referenced columns; with ``schema_versions`` the entry survives schema
+        changes that do not touch those tables.
+        """
         key = self._generate_key(user_input, db_type)
-        if len(self.cache) >= self.max_size:
-            evicted_key = next(iter(self.cache))
-            logger.warning("Cache max size reached. Evicting key: %s", evicted_key)
-            self.cache.pop(evicted_key)
-        self.cache[key] = query
-        logger.info("Cache set for key %s with query: %s", key, query)
\ No newline at end of file
+        ttl = self.ttl if ttl is None else ttl
+        references = references or {}
+        dependencies = {table: schema_versions.get(table) for table in references} if schema_versions else {}
+        self._set_local(key, user_input, db_type, query, ttl, schema_fingerprint, dependencies, references)
+        if self.l2 is not None:
+            try:
+                self.l2.set(key, query, ttl, user_input=user_input, fingerprint=schema_fingerprint,
+                            dependencies=dependencies, references=references)
+            except Exception as e:
+                logger.warning("L2 cache write failed: %s", str(e))
+
+    def _set_local(self, key: str, user_input: str, db_type: str, query: str, ttl: Optional[float],
+                   schema_fingerprint: str, dependencies: dict, references: dict) -> None:
+        size = len(query.encode()) + len(user_input.encode()) + self._KEY_OVERHEAD
+        if size > self.max_bytes:
+            logger.warning("Query of %d bytes exceeds cache max_bytes; not caching key %s", size, key)
+            return
+        expires_at = time.monotonic() + ttl if ttl else None
+        normalized = normalize_prompt(user_input)
+        with self._lock:
+            if key in self.cache:
+                self._remove(key)
+            self.cache[key] = _Entry(query, expires_at, size, user_input, normalized, db_type.lower(),
+                                     schema_fingerprint, dependencies, references)
+            self._index.add(key, db_type.lower(), normalized)
+            for table in references:
+                self._tables[table].add(key)
+            self.bytes += size
+            while len(self.cache) > self.max_size or self.bytes > self.max_bytes:
+                evicted_key = next(iter(self.cache))
+                self._remove(evicted_key)
+                self.evictions += 1
+                logger.debug("Cache full. Evicted key: %s", evicted_key)
+        logger.debug("Cache set for key %s (%d bytes)", key, size)
+
+    def _remove(self, key: str) -> None:
+        entry = self.cache.pop(key)
+        self._index.remove(key)
+        for table in entry.references:
+            keys = self._tables.get(table)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tables[table]
+        self.bytes -= entry.size
+
+    def references(self, user_input: str, db_type: str) -> Optional[Dict[str, List[str]]]:
+        """Returns the tables and columns referenced by the cached query, if it is in memory."""
+        with self._lock:
+            entry = self.cache.get(self._generate_key(user_input, db_type))
+            return dict(entry.references) if entry is not None else None
+
+    def invalidate_tables(self, tables: Iterable[str]) -> int:
+        """Drops every entry whose query references one of ``tables``; returns the number dropped."""
+        tables = list(tables)
+        with self._lock:
+            keys = set()
+            for table in tables:
+                keys |= self._tables.get(table, set())
+            for key in keys:
+                self._remove(key)
+            self.invalidations += len(keys)
+        dropped = len(keys)
+        if self.l2 is not None and tables:
+            try:
+                dropped = max(dropped, self.l2.delete_tables(tables))
+            except Exception as e:
+                logger.warning("L2 cache invalidation failed: %s", str(e))
+        if dropped:
+            logger.info("Invalidated %d cached queries referencing %s", dropped, tables)
+        return dropped
+
+    def invalidate(self, user_input: str, db_type: str) -> bool:
+        key = self._generate_key(user_input, db_type)
+        if self.l2 is not None:
+            self.l2.delete(key)
+        with self._lock:
+            if key not in self.cache:
+                return False
+            self._remove(key)
+            return True
+
+    def clear(self) -> None:
+        with self._lock:
+            self.cache.clear()
+            self._index.clear()
+            self._tables.clear()
+            self.bytes = 0
+        if self.l2 is not None:
+            self.l2.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.cache),
+                "bytes": self.bytes,
+                "hits": self.hits,
+                "l2_hits": self.l2_hits,
+                "fuzzy_hits": self.fuzzy_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+    def __len__(self) -> int:
+        return len(self.cache)
@@ -1,25 +1,222 @@
-import logging
-from logging_config import setup_logging
-
-setup_logging()
-logger = logging.getLogger(__name__)
-
-class QueryOptimizer:
-    """Handles query optimization and validation"""
-
-    def __init__(self):
-        self.prohibited_patterns = ['DROP', 'DELETE', 'TRUNCATE', 'GRANT', 'REVOKE', 'ALTER']
-        logger.info("QueryOptimizer initialized with prohibited patterns: %s", self.prohibited_patterns)
-
-    def optimize(self, query: str, db_type: str) -> str:
-        optimized = query.strip(';') + ';'
-        logger.info("Optimized query: %s", optimized)
-        return optimized
-
-    def validate(self, query: str) -> bool:
-        for pattern in self.prohibited_patterns:
-            if pattern in query.upper():
-                logger.warning("Query validation failed: found prohibited pattern %s", pattern)
-                return False
-        logger.info("Query validation passed.")
-        return True
\ No newline at end of file
+import re
+import logging
+from collections import namedtuple
+from typing import Dict, List, Optional
+from SQLTokenizer import SQLPolicy, analyze, extract_sql
+from logging_config import log_payload
+
+logger = logging.getLogger(__name__)
+
+RewriteResult = namedtuple("RewriteResult", "sql rewrites")
+
+_DATE_TYPES = ("date", "datetime", "timestamp", "smalldatetime", "datetime2", "datetimeoffset")
+_SET_OPERATORS = frozenset({"UNION", "EXCEPT", "INTERSECT"})
+_NAME_KINDS = ("identifier", "quoted")
+
+
+def _unquote(value: str) -> str:
+    return value[1:-1] if value[:1] in ('`', '"', '[') else value
+
+
+def _depths(tokens) -> List[int]:
+    """Parenthesis depth of each token."""
+    depths, depth = [], 0
+    for token in tokens:
+        if token.kind == "close":
+            depth -= 1
+        depths.append(depth)
+        if token.kind == "open":
+            depth += 1
+    return depths
+
+
+def _end(token) -> int:
+    return token.start + len(token.value)
+
+
+class QueryOptimizer:
+    """Handles query optimization and validation"""
+
+    def __init__(self, policy: Optional[SQLPolicy] = None, row_limit: Optional[int] = 1000):
+        self.policy = policy or SQLPolicy.read_only()
+        self.row_limit = row_limit
+        self.prohibited_patterns = sorted(self.policy.denied_keywords)
+        logger.info("QueryOptimizer initialized with prohibited patterns: %s", self.prohibited_patterns)
+
+    def optimize(self, query: str, db_type: str, schema: Optional[dict] = None) -> str:
+        return self.rewrite(query, db_type, schema).sql
+
+    def rewrite(self, query: str, db_type: str, schema: Optional[dict] = None) -> RewriteResult:
+        """
+        Extracts the SQL from a generated reply and, for a single SELECT,
+        applies schema-aware rewrites: YEAR(col) comparisons on indexed date
+        columns become ranges and a dialect row limit is added when there is
+        none. Returns the SQL and a description of each rewrite applied.
+        """
+        sql = extract_sql(query).rstrip().rstrip(";").rstrip()
+        analysis = analyze(sql, db_type)
+        rewrites = []
+        if analysis.error is None and len(analysis.statements) == 1 and analysis.statements[0].type == "SELECT":
+            tokens = analysis.statements[0].tokens
+            sql = sql[:_end(tokens[-1])]  # a trailing comment would swallow the appended LIMIT and ';'
+            depths = _depths(tokens)
+            tables = (schema or {}).get("tables", {})
+            aliases = self._aliases(tokens, tables)
+            edits = self._sargable_years(sql, tokens, tables, aliases, rewrites)
+            edits += self._row_limit(tokens, depths, db_type, rewrites)
+            for start, end, text in sorted(edits, reverse=True):
+                sql = sql[:start] + text + sql[end:]
+        optimized = sql + ";"
+        log_payload(logger, "Optimized query: %s", optimized)
+        if rewrites:
+            logger.info("Applied rewrites: %s", "; ".join(rewrites))
+        return RewriteResult(optimized, rewrites)
+
+    @staticmethod
+    def _aliases(tokens, tables: dict) -> Dict[str, str]:
+        """Maps lower-cased table names and their aliases to schema table names."""
+        lookup = {table.lower(): table for table in tables}
+        aliases = {}
+        for i, token in enumerate(tokens):
+            if token.kind not in _NAME_KINDS or (i and tokens[i - 1].value == "."):
+                continue
+            j = i
+            while j + 2 < len(tokens) and tokens[j + 1].value == "." and tokens[j + 2].kind in _NAME_KINDS:
+                j += 2  # schema- or database-qualified name: the last part is the table
+            table = lookup.get(_unquote(tokens[j].value).lower())
+            if table is None:
+                continue
+            aliases[table.lower()] = table
+            k = j + 1
+            if k < len(tokens) and tokens[k].value == "AS" and tokens[k].kind == "keyword":
+                k += 1
+            if k < len(tokens) and tokens[k].kind in _NAME_KINDS and \
+                    (k + 1 == len(tokens) or tokens[k + 1].value != "."):
+                aliases[_unquote(tokens[k].value).lower()] = table
+        return aliases
+
+    @staticmethod
+    def _indexed_date_column(info: dict, column: str) -> bool:
+        if not info.get("column_types", {}).get(column, "").lower().startswith(_DATE_TYPES):
+            return False
+        leading = [index["columns"][0] for index in info.get("indexes", {}).values() if index.get("columns")]
+        if info.get("primary_key"):
+            leading.append(info["primary_key"][0])
+        return column in leading
+
+    def _sargable_years(self, sql: str, tokens, tables: dict, aliases: Dict[str, str], rewrites: list) -> list:
+        """YEAR(col) <op> 2014 on an indexed date column -> range predicate on col."""
+        edits = []
+        for i, token in enumerate(tokens):
+            if token.kind != "identifier" or token.value.upper() != "YEAR" or i + 3 >= len(tokens):
+                continue
+            if tokens[i + 1].kind != "open" or (i and tokens[i - 1].kind in ("operator", "identifier")):
+                continue
+            j, qualifier = i + 2, None
+            if j + 2 < len(tokens) and tokens[j + 1].value == "." and tokens[j].kind in _NAME_KINDS:
+                qualifier, j = _unquote(tokens[j].value).lower(), j + 2
+            if tokens[j].kind not in _NAME_KINDS or j + 1 >= len(tokens) or tokens[j + 1].kind != "close":
+                continue
+            column = _unquote(tokens[j].value)
+            k, op = j + 2, ""
+            # Adjacent operator tokens form one comparison (">", "=" -> ">=").
+            while k < len(tokens) and tokens[k].kind == "operator" and \
+                    (not op or tokens[k].start == _end(tokens[k - 1])):
+                op += tokens[k].value
+                k += 1
+            if op not in ("=", ">=", ">", "<", "<=") or k >= len(tokens) or tokens[k].kind != "number":
+                continue
+            if not re.fullmatch(r"\d{4}", tokens[k].value) or \
+                    (k + 1 < len(tokens) and tokens[k + 1].kind == "operator"):
+                continue
+            if qualifier is not None:
+                candidates = {aliases.get(qualifier)} - {None}
+            else:
+                candidates = {table for table in aliases.values()
+                              if column.lower() in (c.lower() for c in tables[table].get("columns", []))}
+            if len(candidates) != 1:
+                continue
+            table = candidates.pop()
+            info = tables[table]
+            column = next((c for c in info.get("columns", []) if c.lower() == column.lower()), column)
+            if not self._indexed_date_column(info, column):
+                continue
+            year = int(tokens[k].value)
+            ref = sql[tokens[i + 2].start:tokens[j + 1].start].strip()
+            low, high = f"'{year}-01-01'", f"'{year + 1}-01-01'"
+            text = {"=": f"({ref} >= {low} AND {ref} < {high})", ">=": f"{ref} >= {low}",
+                    ">": f"{ref} >= {high}", "<": f"{ref} < {low}", "<=": f"{ref} < {high}"}[op]
+            edits.append((token.start, _end(tokens[k]), text))
+            rewrites.append(f"YEAR({ref}) {op} {year} -> range on indexed {table}.{column}")
+        return edits
+
+    def _row_limit(self, tokens, depths: List[int], db_type: str, rewrites: list) -> list:
+        """Adds LIMIT n (or TOP n for MSSQL) to a SELECT that does not bound its rows."""
+        if not self.row_limit:
+            return []
+        top_level = [t for t, depth in zip(tokens, depths) if depth == 0 and t.kind == "keyword"]
+        words = {t.value for t in top_level}
+        if "FROM" not in words or words & {"LIMIT", "TOP", "FETCH", "OFFSET", "INTO"}:
+            return []
+        if db_type.lower() != "mssql":
+            rewrites.append(f"added LIMIT {self.row_limit}")
+            return [(_end(tokens[-1]), _end(tokens[-1]), f" LIMIT {self.row_limit}")]
+        if words & _SET_OPERATORS:
+            return []  # TOP would bind to the first SELECT only
+        select = tokens.index(next(t for t in top_level if t.value == "SELECT"))
+        anchor = tokens[select]
+        if select + 1 < len(tokens) and tokens[select + 1].value in ("DISTINCT", "ALL"):
+            anchor = tokens[select + 1]
+        rewrites.append(f"added TOP {self.row_limit}")
+        return [(_end(anchor), _end(anchor), f" TOP {self.row_limit}")]
+
+    def paginate(self, query: str, db_type: str, offset: int, count: int) -> str:
+        """
+        Returns a single SELECT narrowed to ``count`` rows starting at
+        ``offset`` of its result. A LIMIT/OFFSET the query already has is
+        combined with the page, so a page never reaches past the original
+        bound. Raises ValueError for anything else and for MSSQL, whose
+        OFFSET ... FETCH needs an ORDER BY.
+        """
+        sql = extract_sql(query).rstrip().rstrip(";").rstrip()
+        analysis = analyze(sql, db_type)
+        if analysis.error is not None or len(analysis.statements) != 1 or analysis.statements[0].type != "SELECT":
+            raise ValueError("only a single SELECT can be paginated")
+        if db_type.lower() == "mssql":
+            raise ValueError("pagination needs LIMIT/OFFSET, which MSSQL does not have")
+        tokens = analysis.statements[0].tokens
+        sql = sql[:_end(tokens[-1])]
+        bound = [i for i, (t, depth) in enumerate(zip(tokens, _depths(tokens)))
+                 if depth == 0 and t.kind == "keyword" and t.value in ("LIMIT", "OFFSET")]
+        base_offset, base_count = 0, None
+        if bound:
+            rest, i = tokens[bound[0]:], 0
+            # LIMIT n, LIMIT m, n and OFFSET m, in either order, must end the statement.
+            while i < len(rest):
+                if i + 1 >= len(rest) or rest[i].kind != "keyword" or rest[i + 1].kind != "number":
+                    raise ValueError(f"cannot paginate a query ending in {sql[rest[i].start:]!r}")
+                if rest[i].value == "OFFSET":
+                    base_offset, i = int(rest[i + 1].value), i + 2
+                elif rest[i].value == "LIMIT" and i + 3 < len(rest) and rest[i + 2].value == "," \
+                        and rest[i + 3].kind == "number":
+                    base_offset, base_count, i = int(rest[i + 1].value), int(rest[i + 3].value), i + 4
+                elif rest[i].value == "LIMIT":
+                    base_count, i = int(rest[i + 1].value), i + 2
+                else:
+                    raise ValueError(f"cannot paginate a query ending in {sql[rest[i].start:]!r}")
+            sql = sql[:tokens[bound[0]].start].rstrip()
+        if base_count is not None:
+            count = max(0, min(count, base_count - offset))
+        return f"{sql} LIMIT {count} OFFSET {base_offset + offset};"
+
+    def check(self, query: str, db_type: Optional[str] = None) -> Optional[str]:
+        """Returns why the query is rejected by the policy (lexed as ``db_type``), or None if it passes."""
+        return self.policy.check(query, db_type)
+
+    def validate(self, query: str, db_type: Optional[str] = None) -> bool:
+        reason = self.check(query, db_type)
+        if reason is not None:
+            logger.warning("Query validation failed: %s", reason)
+            return False
+        logger.info("Query validation passed.")
+        return True
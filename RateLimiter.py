@@ -1,26 +1,174 @@
 import time
 import logging
-from logging_config import setup_logging
+import threading
+from functools import wraps
+from typing import Hashable, Optional
+from Metrics import metrics
 
-setup_logging()
 logger = logging.getLogger(__name__)
 
+
+class _Bucket:
+    """Token bucket holding up to ``capacity`` tokens, refilled at ``rate`` tokens per second."""
+
+    __slots__ = ("capacity", "rate", "tokens", "updated")
+
+    def __init__(self, capacity: float, rate: float):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        # Requests larger than the bucket only wait for a full bucket, then go into debt.
+        needed = min(amount, self.capacity) - self.tokens
+        return max(needed, 0.0) / self.rate
+
+
 class RateLimiter:
-    """Enforces rate limits for API calls"""
+    """
+    Enforces rate limits for API calls with token buckets.
+
+    Each key gets a request bucket of ``calls_per_minute`` (bursting up to
+    ``burst`` calls) and, when ``tokens_per_minute`` is set, a bucket of LLM
+    tokens. ``acquire`` reserves one call plus an estimate of the tokens it
+    will use; ``record_usage`` settles the estimate against the ``usage``
+    the client reported. Acquire blocking, with ``try_acquire`` or with
+    ``await aacquire``. Used as a decorator, every call acquires first.
+    """
 
-    def __init__(self, calls_per_minute: int):
+    def __init__(self, calls_per_minute: int, tokens_per_minute: Optional[int] = None,
+                 burst: Optional[int] = None):
         self.calls_per_minute = calls_per_minute
-        self.timestamps = []
-        logger.info("RateLimiter initialized with %d calls per minute", calls_per_minute)
+        self.tokens_per_minute = tokens_per_minute
+        self.burst = burst or calls_per_minute
+        self._buckets = {}  # key -> (call bucket, token bucket or None)
+        self._lock = threading.Lock()
+        self.throttled = 0
+        self.rejected = 0
+        logger.info("RateLimiter initialized with %d calls per minute, %s tokens per minute",
+                    calls_per_minute, tokens_per_minute or "unlimited")
+
+    def _get_buckets(self, key: Hashable):
+        buckets = self._buckets.get(key)
+        if buckets is None:
+            calls = _Bucket(self.burst, self.calls_per_minute / 60.0)
+            tokens = _Bucket(self.tokens_per_minute, self.tokens_per_minute / 60.0) if self.tokens_per_minute else None
+            buckets = self._buckets[key] = (calls, tokens)
+        return buckets
+
+    def _reserve(self, tokens: int, key: Hashable) -> float:
+        """Takes a call and ``tokens`` if available and returns 0, else returns the seconds to wait."""
+        with self._lock:
+            calls, token_bucket = self._get_buckets(key)
+            now = time.monotonic()
+            calls.refill(now)
+            wait = calls.wait_time(1)
+            if token_bucket is not None and tokens:
+                token_bucket.refill(now)
+                wait = max(wait, token_bucket.wait_time(tokens))
+            if wait > 0:
+                return wait
+            calls.tokens -= 1
+            if token_bucket is not None:
+                token_bucket.tokens -= tokens
+            return 0.0
+
+    def try_acquire(self, tokens: int = 0, key: Hashable = None) -> bool:
+        """Reserves a call without waiting; returns False if the limit is reached."""
+        if self._reserve(tokens, key) == 0.0:
+            return True
+        with self._lock:
+            self.rejected += 1
+        metrics.incr("rate_limit_rejects")
+        return False
+
+    def acquire(self, tokens: int = 0, key: Hashable = None, timeout: Optional[float] = None) -> bool:
+        """Blocks until a call (and ``tokens``) is available; returns False if ``timeout`` expires first."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        waited_since = None
+        while True:
+            wait = self._reserve(tokens, key)
+            if wait == 0.0:
+                if waited_since is not None:
+                    metrics.observe("rate_limit_wait", time.monotonic() - waited_since)
+                return True
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    with self._lock:
+                        self.rejected += 1
+                    metrics.incr("rate_limit_rejects")
+                    return False
+                wait = min(wait, remaining)
+            if waited_since is None:
+                waited_since = time.monotonic()
+                with self._lock:
+                    self.throttled += 1
+                metrics.incr("rate_limited")
+                logger.warning("Rate limit reached. Waiting %.2f seconds.", wait)
+            time.sleep(wait)
+
+    async def aacquire(self, tokens: int = 0, key: Hashable = None, timeout: Optional[float] = None) -> bool:
+        """Coroutine version of acquire that waits without blocking the event loop."""
+        import asyncio  # already loaded by the running event loop; kept out of synchronous imports
+        deadline = None if timeout is None else time.monotonic() + timeout
+        waited_since = None
+        while True:
+            wait = self._reserve(tokens, key)
+            if wait == 0.0:
+                if waited_since is not None:
+                    metrics.observe("rate_limit_wait", time.monotonic() - waited_since)
+                return True
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    with self._lock:
+                        self.rejected += 1
+                    metrics.incr("rate_limit_rejects")
+                    return False
+                wait = min(wait, remaining)
+            if waited_since is None:
+                waited_since = time.monotonic()
+                with self._lock:
+                    self.throttled += 1
+                metrics.incr("rate_limited")
+                logger.warning("Rate limit reached. Waiting %.2f seconds.", wait)
+            await asyncio.sleep(wait)
+
+    def record_usage(self, reserved: int, usage: Optional[dict], key: Hashable = None) -> None:
+        """Corrects the token bucket once the actual ``usage`` of a call that reserved ``reserved`` is known."""
+        if not self.tokens_per_minute or not usage:
+            return
+        used = usage.get("total_tokens")
+        if used is None:
+            return
+        with self._lock:
+            _, token_bucket = self._get_buckets(key)
+            token_bucket.refill(time.monotonic())
+            token_bucket.tokens += reserved - used
+
+    def stats(self, key: Hashable = None) -> dict:
+        with self._lock:
+            calls, token_bucket = self._get_buckets(key)
+            now = time.monotonic()
+            calls.refill(now)
+            if token_bucket is not None:
+                token_bucket.refill(now)
+            return {
+                "calls_available": calls.tokens,
+                "tokens_available": token_bucket.tokens if token_bucket is not None else None,
+                "throttled": self.throttled,
+                "rejected": self.rejected,
+            }
 
     def __call__(self, func):
+        @wraps(func)
         def wrapper(*args, **kwargs):
-            current_time = time.time()
-            self.timestamps = [t for t in self.timestamps if t > current_time - 60]
-            if len(self.timestamps) >= self.calls_per_minute:
-                sleep_time = 60 - (current_time - self.timestamps[0])
-                logger.warning("Rate limit reached. Sleeping for %s seconds.", sleep_time)
-                time.sleep(sleep_time)
-            self.timestamps.append(current_time)
+            self.acquire()
             return func(*args, **kwargs)
-        return wrapper
\ No newline at end of file
+        return wrapper
@@ -0,0 +1,218 @@
+import time
+import logging
+from typing import Callable, Iterator, List, Optional
+from ConnectionPool import ConnectionPool
+from db_backends import DIALECTS, Dialect
+from SQLTokenizer import extract_sql
+from Metrics import metrics
+from logging_config import log_payload
+
+logger = logging.getLogger(__name__)
+
+
+def _value_size(value) -> int:
+    if value is None:
+        return 1
+    if isinstance(value, (str, bytes, bytearray)):
+        return len(value)
+    return 8
+
+
+class ResultStream:
+    """
+    Streams a query result in batches from a pooled connection.
+
+    Rows are read with ``fetchmany`` on the dialect's streaming cursor
+    (unbuffered on MySQL, server-side on PostgreSQL), so memory is bounded by
+    ``batch_size`` rather than by the result size. Reading stops at
+    ``max_rows`` or once ``max_bytes`` (estimated from the values) have been
+    produced; ``truncated`` tells whether rows were left out (one row is
+    read past a cap to tell). The statement runs with the dialect's timeout
+    set to ``timeout_ms``, and ``cancel`` interrupts it from another thread.
+    A stream closed before the result is exhausted ends the statement (KILL
+    QUERY on MySQL) and returns its connection to the pool; the connection
+    is dropped only if that fails. ``on_complete(stream, error)`` is called
+    once the result has been read to the end or to a cap (error None) or
+    the statement failed; ``elapsed`` is then the seconds it took.
+
+        with db.stream_mysql_query(sql, max_rows=1000) as result:
+            for batch in result.batches():
+                ...
+    """
+
+    def __init__(self, pool: ConnectionPool, sql: str, batch_size: int = 1000,
+                 max_rows: Optional[int] = 100000, max_bytes: Optional[int] = 64 * 1024 * 1024,
+                 timeout_ms: Optional[int] = 30000, dialect: Optional[Dialect] = None,
+                 on_complete: Optional[Callable[["ResultStream", Optional[Exception]], None]] = None):
+        self.pool = pool
+        self.dialect = dialect or DIALECTS["mysql"]
+        self.sql = extract_sql(sql)
+        self.batch_size = batch_size
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.timeout_ms = timeout_ms
+        self.columns: List[str] = []
+        self.row_count = 0
+        self.byte_count = 0
+        self.truncated = False
+        self.exhausted = False
+        self.elapsed: Optional[float] = None
+        self.on_complete = on_complete
+        self._conn = None
+        self._cursor = None
+        self._prefetched: Optional[List[tuple]] = None
+        self._cancelled = False
+        self._started: Optional[float] = None
+
+    def open(self) -> "ResultStream":
+        if self._conn is not None:
+            return self
+        self._started = time.perf_counter()
+        try:
+            self._conn = self.pool.acquire()
+            self._cursor = self.dialect.open_cursor(self._conn, self.timeout_ms)
+            if self._cancelled:
+                raise RuntimeError("Query cancelled")
+            log_payload(logger, "Streaming SQL query: %s", self.sql)
+            with metrics.timer("db_execute"):
+                self._cursor.execute(self.sql)
+                if self._cursor.description is None and self.dialect.describes_on_fetch:
+                    self._prefetched = self._cursor.fetchmany(self._first_batch_size())
+            self.columns = [desc[0] for desc in self._cursor.description] if self._cursor.description else []
+            if not self.columns:
+                self.exhausted = True
+        except Exception as e:
+            self._finish(e)
+            self.close()
+            raise
+        return self
+
+    def _finish(self, error: Optional[Exception]) -> None:
+        """Reports the outcome once; a cancelled stream has none."""
+        if self.elapsed is not None or self._cancelled:
+            return
+        self.elapsed = time.perf_counter() - self._started
+        if self.on_complete is None:
+            return
+        try:
+            self.on_complete(self, error)
+        except Exception as e:
+            logger.warning("Result stream completion callback failed: %s", str(e))
+
+    def _first_batch_size(self) -> int:
+        return min(self.batch_size, self.max_rows) if self.max_rows is not None else self.batch_size
+
+    def _more_rows(self) -> bool:
+        """Reads one row past a cap: a result that ends exactly at the cap is not truncated."""
+        if self._cursor.fetchmany(1):
+            return True
+        self.exhausted = True
+        return False
+
+    def batches(self) -> Iterator[List[tuple]]:
+        """Yields lists of at most ``batch_size`` rows until exhausted or a cap is reached."""
+        self.open()
+        try:
+            while not self.exhausted and not self.truncated:
+                size = self.batch_size
+                if self.max_rows is not None:
+                    size = min(size, self.max_rows - self.row_count)
+                    if size <= 0:
+                        self.truncated = self._more_rows()
+                        break
+                if self._prefetched is not None:
+                    # A server-side cursor's first batch, fetched by open() to learn the columns.
+                    rows, self._prefetched = self._prefetched, None
+                else:
+                    rows = self._cursor.fetchmany(size)
+                if not rows:
+                    self.exhausted = True
+                    break
+                ended = len(rows) < size  # a short batch is the end of the result
+                if self.max_bytes is not None:
+                    for i, row in enumerate(rows):
+                        self.byte_count += sum(_value_size(value) for value in row)
+                        if self.byte_count > self.max_bytes:
+                            self.truncated = i + 1 < len(rows) or (not ended and self._more_rows())
+                            ended = not self.truncated
+                            rows = rows[:i + 1]
+                            break
+                self.row_count += len(rows)
+                metrics.incr("rows_streamed", len(rows))
+                if ended:
+                    self.exhausted = True
+                yield rows
+            if self.truncated:
+                logger.warning("Result truncated after %d rows / %d bytes", self.row_count, self.byte_count)
+        except Exception as e:
+            self._finish(e)
+            raise
+        finally:
+            if self.exhausted or self.truncated:
+                self._finish(None)
+                self.close()
+
+    def rows(self) -> Iterator[tuple]:
+        for batch in self.batches():
+            yield from batch
+
+    def arrays(self) -> Iterator[dict]:
+        """Yields each batch as {column: numpy.ndarray}."""
+        import numpy as np
+
+        for batch in self.batches():
+            yield {name: np.array(values) for name, values in zip(self.columns, zip(*batch))}
+
+    def dataframes(self) -> Iterator["pandas.DataFrame"]:
+        """Yields each batch as a pandas DataFrame."""
+        import pandas as pd
+
+        for batch in self.batches():
+            yield pd.DataFrame.from_records(batch, columns=self.columns)
+
+    def fetchall(self) -> List[tuple]:
+        """Collects the (capped) result into a list."""
+        return list(self.rows())
+
+    def close(self) -> None:
+        if self._conn is None:
+            return
+        conn, self._conn = self._conn, None
+        broken = False
+        if not self.exhausted:
+            # Unread rows would poison the connection for its next borrower; end the statement or drop it.
+            broken = self._cursor is None or not self.dialect.discard_rest(conn, self._cursor, self.pool)
+        try:
+            if not broken:
+                if self._cursor is not None:
+                    self._cursor.close()
+                self.dialect.close_cursor(conn, self.timeout_ms)
+        except Exception as e:
+            logger.warning("Failed to reset connection after streaming: %s", str(e))
+            broken = True
+        self.pool.release(conn, broken=broken)
+        self._cursor = None
+
+    def cancel(self) -> None:
+        """
+        Interrupts the statement from another thread; the thread reading the
+        stream then gets an error and closes it. A stream not yet executing
+        fails as soon as it would start.
+        """
+        self._cancelled = True
+        conn, cursor = self._conn, self._cursor
+        if conn is None or cursor is None:
+            return
+        try:
+            self.dialect.cancel(conn, cursor, self.pool)
+        except Exception as e:
+            logger.warning("Failed to cancel streaming query: %s", str(e))
+
+    def __enter__(self) -> "ResultStream":
+        return self.open()
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def __iter__(self) -> Iterator[tuple]:
+        return self.rows()
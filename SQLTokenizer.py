@@ -0,0 +1,240 @@
+import re
+from collections import namedtuple
+from functools import lru_cache
+from typing import Iterable, Optional, Tuple
+
+KEYWORDS = frozenset("""
+    ADD ALL ALTER AND ANY AS ASC BEGIN BETWEEN BY CALL CASE CAST CHECK COLUMN COMMIT CONSTRAINT CREATE
+    CROSS DATABASE DEALLOCATE DECLARE DEFAULT DELETE DESC DESCRIBE DISTINCT DO DROP DUMPFILE ELSE END
+    EXCEPT EXEC EXECUTE EXISTS EXPLAIN FETCH FOR FOREIGN FROM FULL GRANT GROUP HANDLER HAVING IF IN
+    INDEX INNER INSERT INTERSECT INTO IS JOIN KEY KILL LEFT LIKE LIMIT LOAD LOCK MERGE NOT NULL OFFSET
+    ON OR ORDER OUTER OUTFILE OVER PARTITION PREPARE PRIMARY PROCEDURE RECURSIVE REFERENCES RENAME
+    REPLACE REVOKE RIGHT ROLLBACK ROWS SAVEPOINT SELECT SET SHOW SHUTDOWN TABLE THEN TOP TRUNCATE
+    UNION UNIQUE UNLOCK UPDATE USE USING VALUES VIEW WHEN WHERE WINDOW WITH
+""".split())
+
+# Statement verbs that a WITH clause can lead into.
+_DML = frozenset({"SELECT", "INSERT", "UPDATE", "DELETE", "REPLACE", "MERGE"})
+
+# Keywords that are also built-in functions; followed by "(" they are a call, not a clause
+# (REPLACE(name, 'a', 'b'), MySQL's INSERT(str, pos, len, new) and TRUNCATE(x, d)).
+_FUNCTION_KEYWORDS = frozenset({"REPLACE", "INSERT", "TRUNCATE", "LEFT", "RIGHT", "IF"})
+
+# Lexical rules per dialect: which strings honour backslash escapes, which characters quote
+# identifiers, and what starts a comment. MySQL runs the body of /*! ... */ (and MariaDB's
+# /*M! ... */) as SQL and reads /*+ ... */ as optimizer hints, so their bodies are lexed like the
+# rest of the statement; "--" starts a MySQL comment only when followed by whitespace.
+_DIALECT_RULES = {
+    "mysql": {
+        "hint": r"/\*(?:M?!\d*|\+)",
+        "comment": r"--(?=\s|$)[^\n]*|\#[^\n]*|/\*.*?\*/",
+        "string": r"'(?:[^'\\]|\\.|'')*'|[Nn]'(?:[^'\\]|\\.|'')*'",
+        "quoted": r'"(?:[^"\\]|\\.|"")*"|`(?:[^`]|``)*`',
+        "error": r"['\"`]|/\*",
+    },
+    "postgresql": {
+        "comment": r"--[^\n]*|/\*.*?\*/",
+        # E'...' strings take backslash escapes, standard ones do not; $tag$...$tag$ is dollar-quoted.
+        "string": r"[Ee]'(?:[^'\\]|\\.|'')*'|'(?:[^']|'')*'|\$(?P<tag>(?:[A-Za-z_]\w*)?)\$.*?\$(?P=tag)\$",
+        "quoted": r'"(?:[^"]|"")*"',
+        "error": r"['\"]|/\*|\$(?:[A-Za-z_]\w*)?\$",
+    },
+    "mssql": {
+        "comment": r"--[^\n]*|/\*.*?\*/",
+        "string": r"'(?:[^']|'')*'|[Nn]'(?:[^']|'')*'",
+        "quoted": r'"(?:[^"]|"")*"|\[(?:[^\]]|\]\])*\]',
+        "error": r"['\"\[]|/\*",
+    },
+    "sqlite": {
+        "comment": r"--[^\n]*|/\*.*?\*/",
+        "string": r"'(?:[^']|'')*'",
+        "quoted": r'"(?:[^"]|"")*"|`(?:[^`]|``)*`|\[[^\]]*\]',
+        "error": r"['\"`\[]|/\*",
+    },
+}
+
+
+def _lexer(rules: dict):
+    return re.compile(r"""
+        (?P<ws>\s+)
+      | (?P<hint>{hint})
+      | (?P<comment>{comment})
+      | (?P<fence>```[A-Za-z]*)
+      | (?P<string>{string})
+      | (?P<quoted>{quoted})
+      | (?P<number>\d+(?:\.\d*)?(?:[eE][+-]?\d+)?|\.\d+)
+      | (?P<word>[A-Za-z_][A-Za-z0-9_$]*)
+      | (?P<variable>@@?[A-Za-z0-9_.$]*|\?|:[A-Za-z_]\w*|%s|\$\d+)
+      | (?P<semicolon>;)
+      | (?P<open>\()
+      | (?P<close>\))
+      | (?P<error>{error})
+      | (?P<operator>.)
+    """.format(hint=rules.get("hint", "(?!)"), comment=rules["comment"], string=rules["string"],
+               quoted=rules["quoted"], error=rules["error"]), re.VERBOSE | re.DOTALL)
+
+
+_LEXERS = {name: _lexer(rules) for name, rules in _DIALECT_RULES.items()}
+
+
+def _dialect_name(dialect) -> str:
+    """A dialect name or a db_backends.Dialect; unknown dialects are lexed as MySQL."""
+    name = str(getattr(dialect, "name", dialect) or "mysql").lower()
+    return name if name in _LEXERS else "mysql"
+
+
+Token = namedtuple("Token", "kind value start")
+
+_SQL_FENCE = re.compile(r"```(?:sql)?\s*(.*?)\s*```", re.DOTALL | re.IGNORECASE)
+
+
+def extract_sql(query: str) -> str:
+    """Returns the SQL inside a markdown code block, or the stripped input."""
+    match = _SQL_FENCE.search(query)
+    return match.group(1).strip() if match else query.strip()
+
+
+Statement = namedtuple("Statement", "type keywords tokens")
+Analysis = namedtuple("Analysis", "statements error")
+
+
+def tokenize(sql: str, dialect="mysql") -> Tuple[Token, ...]:
+    """
+    Splits SQL into tokens in one pass. Whitespace, comments and markdown
+    fences are dropped, but the bodies of executable comments and optimizer
+    hints are tokens; words are "keyword" or "identifier"; an unterminated
+    string, quoted identifier or comment yields an "error" token. ``start``
+    is the token's offset in ``sql``. Strings, quoted identifiers and
+    comments follow ``dialect``'s rules (a name or a db_backends.Dialect).
+    """
+    lexer = _LEXERS[_dialect_name(dialect)]
+    tokens, hint, pos = [], None, 0
+    while pos < len(sql):
+        if hint is not None and sql.startswith("*/", pos):
+            hint, pos = None, pos + 2
+            continue
+        match = lexer.match(sql, pos)
+        pos = match.end()
+        kind = match.lastgroup
+        if kind in ("ws", "comment", "fence"):
+            continue
+        value = match.group()
+        if kind == "hint":
+            hint = hint or match
+            continue
+        if kind == "word":
+            upper = value.upper()
+            if upper in KEYWORDS:
+                tokens.append(Token("keyword", upper, match.start()))
+                continue
+            kind = "identifier"
+        tokens.append(Token(kind, value, match.start()))
+    if hint is not None:
+        tokens.append(Token("error", hint.group(), hint.start()))
+    return tuple(tokens)
+
+
+def _clause_keywords(tokens: Tuple[Token, ...]) -> frozenset:
+    """The statement's keywords, leaving out function calls such as REPLACE(...)."""
+    keywords = set()
+    for i, token in enumerate(tokens):
+        if token.kind != "keyword":
+            continue
+        if token.value in _FUNCTION_KEYWORDS and i + 1 < len(tokens) and tokens[i + 1].kind == "open":
+            continue
+        keywords.add(token.value)
+    return frozenset(keywords)
+
+
+def _statement_type(tokens: Tuple[Token, ...]) -> str:
+    first = next((token.value for token in tokens if token.kind == "keyword"), None)
+    if first is None:
+        return "UNKNOWN"
+    if first != "WITH":
+        return first
+    # The verb of a WITH statement is the first DML keyword outside the CTE bodies.
+    depth = 0
+    for token in tokens:
+        if token.kind == "open":
+            depth += 1
+        elif token.kind == "close":
+            depth -= 1
+        elif depth == 0 and token.kind == "keyword" and token.value in _DML:
+            return token.value
+    return "WITH"
+
+
+@lru_cache(maxsize=2048)
+def analyze(sql: str, dialect="mysql") -> Analysis:
+    """
+    Tokenizes SQL and splits it into statements, each with its type (the
+    leading verb; WITH resolves to the verb after the CTEs) and the set of
+    keywords it uses as clauses (function calls like REPLACE(...) excluded).
+    Results are cached per query text and dialect.
+    """
+    tokens = tokenize(sql, dialect)
+    error = next((f"unterminated {token.value!r}" for token in tokens if token.kind == "error"), None)
+    statements, current = [], []
+    for token in tokens + (Token("semicolon", ";", len(sql)),):
+        if token.kind != "semicolon":
+            current.append(token)
+            continue
+        if current:
+            current = tuple(current)
+            keywords = _clause_keywords(current)
+            statements.append(Statement(_statement_type(current), keywords, current))
+        current = []
+    return Analysis(tuple(statements), error)
+
+
+class SQLPolicy:
+    """
+    Allow/deny rules applied to analyzed SQL. ``allowed_statements`` limits
+    statement types (None allows any), ``denied_keywords`` rejects a
+    statement that uses any of them as a clause outside strings and
+    comments; a function of the same name (REPLACE(...)) is not a clause.
+    SQL is lexed with ``dialect``'s rules (see ``tokenize``) unless ``check``
+    is given another dialect, so a comment or string in one dialect cannot
+    hide a statement another one runs.
+    """
+
+    WRITE_KEYWORDS = frozenset({
+        "ALTER", "CALL", "CREATE", "DELETE", "DROP", "DUMPFILE", "EXEC", "EXECUTE", "GRANT", "HANDLER",
+        "INSERT", "INTO", "KILL", "LOAD", "LOCK", "MERGE", "OUTFILE", "RENAME", "REPLACE", "REVOKE",
+        "SHUTDOWN", "TRUNCATE", "UNLOCK", "UPDATE",
+    })
+
+    def __init__(self, allowed_statements: Optional[Iterable[str]] = None,
+                 denied_keywords: Iterable[str] = (), max_statements: Optional[int] = 1, dialect="mysql"):
+        self.allowed_statements = frozenset(s.upper() for s in allowed_statements) if allowed_statements else None
+        self.denied_keywords = frozenset(k.upper() for k in denied_keywords)
+        self.max_statements = max_statements
+        self.dialect = _dialect_name(dialect)
+
+    @classmethod
+    def read_only(cls, dialect="mysql") -> "SQLPolicy":
+        """A single SELECT (plain or WITH ... SELECT) that writes nothing."""
+        return cls(allowed_statements={"SELECT"}, denied_keywords=cls.WRITE_KEYWORDS, dialect=dialect)
+
+    @classmethod
+    def no_ddl(cls, dialect="mysql") -> "SQLPolicy":
+        """The original blacklist: any statement without DROP/DELETE/TRUNCATE/GRANT/REVOKE/ALTER."""
+        return cls(denied_keywords={"DROP", "DELETE", "TRUNCATE", "GRANT", "REVOKE", "ALTER"}, max_statements=None,
+                   dialect=dialect)
+
+    def check(self, sql: str, dialect=None) -> Optional[str]:
+        """Returns why ``sql`` violates the policy, or None if it is allowed."""
+        analysis = analyze(sql, dialect or self.dialect)
+        if analysis.error:
+            return f"malformed SQL: {analysis.error}"
+        if not analysis.statements:
+            return "no SQL statement found"
+        if self.max_statements is not None and len(analysis.statements) > self.max_statements:
+            return f"{len(analysis.statements)} statements found, at most {self.max_statements} allowed"
+        for statement in analysis.statements:
+            if self.allowed_statements is not None and statement.type not in self.allowed_statements:
+                return f"{statement.type} statements are not allowed"
+            denied = statement.keywords & self.denied_keywords
+            if denied:
+                return f"prohibited keyword {', '.join(sorted(denied))}"
+        return None
@@ -0,0 +1,195 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+class SQLiteCacheStore:
+    """
+    On-disk second cache tier shared by every process on the host.
+
+    SQLite in WAL mode lets many readers proceed concurrently with a single
+    writer, so Streamlit and worker processes can share one file safely.
+    Each thread gets its own connection; the store never holds a lock of its
+    own across calls.
+    """
+
+    ACCESS_GRANULARITY = 60.0  # seconds between last_access updates for a hot key
+
+    def __init__(self, path: Optional[str] = None, max_entries: int = 100000,
+                 max_bytes: int = 512 * 1024 * 1024):
+        self.path = path or os.getenv("QUERY_CACHE_PATH", "query_cache.sqlite3")
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._compaction_stop = None
+        conn = self._conn()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS query_cache (
+                key TEXT PRIMARY KEY,
+                query TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                expires_at REAL,
+                last_access REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_query_cache_last_access ON query_cache (last_access);
+            CREATE INDEX IF NOT EXISTS idx_query_cache_expires_at ON query_cache (expires_at);
+            CREATE TABLE IF NOT EXISTS query_cache_tables (
+                key TEXT NOT NULL,
+                table_name TEXT NOT NULL,
+                PRIMARY KEY (key, table_name)
+            );
+            CREATE INDEX IF NOT EXISTS idx_query_cache_tables_table ON query_cache_tables (table_name);
+        """)
+        existing = {row[1] for row in conn.execute("PRAGMA table_info(query_cache)")}
+        for column in ("user_input", "fingerprint", "dependencies", "refs"):
+            if column not in existing:
+                conn.execute(f"ALTER TABLE query_cache ADD COLUMN {column} TEXT")
+        logger.info("SQLiteCacheStore opened at %s", self.path)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[dict]:
+        """
+        Returns a dictionary with keys "query", "expires_at" (wall-clock),
+        "user_input", "fingerprint", "dependencies" and "references", or None.
+        """
+        now = time.time()
+        row = self._conn().execute(
+            "SELECT query, expires_at, last_access, user_input, fingerprint, dependencies, refs "
+            "FROM query_cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        query, expires_at, last_access, user_input, fingerprint, dependencies, refs = row
+        if expires_at is not None and expires_at <= now:
+            self.delete(key)
+            return None
+        if now - last_access > self.ACCESS_GRANULARITY:
+            # Keep reads mostly write-free; recency only needs to be approximate for compaction.
+            self._conn().execute("UPDATE query_cache SET last_access = ? WHERE key = ?", (now, key))
+        return {
+            "query": query,
+            "expires_at": expires_at,
+            "user_input": user_input,
+            "fingerprint": fingerprint or "",
+            "dependencies": json.loads(dependencies) if dependencies else {},
+            "references": json.loads(refs) if refs else {},
+        }
+
+    def set(self, key: str, query: str, ttl: Optional[float] = None, user_input: Optional[str] = None,
+            fingerprint: str = "", dependencies: Optional[dict] = None,
+            references: Optional[Dict[str, List[str]]] = None) -> None:
+        now = time.time()
+        references = references or {}
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "INSERT OR REPLACE INTO query_cache (key, query, size, created_at, expires_at, last_access, "
+                "user_input, fingerprint, dependencies, refs) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, query, len(query.encode()), now, now + ttl if ttl else None, now, user_input,
+                 fingerprint, json.dumps(dependencies or {}), json.dumps(references)))
+            conn.execute("DELETE FROM query_cache_tables WHERE key = ?", (key,))
+            conn.executemany("INSERT INTO query_cache_tables (key, table_name) VALUES (?, ?)",
+                             [(key, table) for table in references])
+
+    def delete(self, key: str) -> None:
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM query_cache WHERE key = ?", (key,))
+            conn.execute("DELETE FROM query_cache_tables WHERE key = ?", (key,))
+
+    def delete_tables(self, tables: Iterable[str]) -> int:
+        """Deletes every entry that references one of ``tables``; returns the number deleted."""
+        tables = list(tables)
+        if not tables:
+            return 0
+        placeholders = ", ".join("?" * len(tables))
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            keys = [(row[0],) for row in conn.execute(
+                f"SELECT DISTINCT key FROM query_cache_tables WHERE table_name IN ({placeholders})", tables)]
+            conn.executemany("DELETE FROM query_cache WHERE key = ?", keys)
+            conn.executemany("DELETE FROM query_cache_tables WHERE key = ?", keys)
+        return len(keys)
+
+    def clear(self) -> None:
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM query_cache")
+            conn.execute("DELETE FROM query_cache_tables")
+
+    def stats(self) -> dict:
+        entries, size = self._conn().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM query_cache").fetchone()
+        return {"entries": entries, "bytes": size}
+
+    def compact(self) -> dict:
+        """
+        Removes expired entries, trims the least recently used ones down to
+        ``max_entries``/``max_bytes`` and truncates the WAL file.
+        """
+        conn = self._conn()
+        now = time.time()
+        expired = conn.execute(
+            "DELETE FROM query_cache WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,)).rowcount
+        trimmed = 0
+        entries, size = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM query_cache").fetchone()
+        if entries > self.max_entries or size > self.max_bytes:
+            # Walk from the oldest access until both bounds hold, then delete that prefix at once.
+            excess_entries, excess_bytes = entries - self.max_entries, size - self.max_bytes
+            cutoff = None
+            cursor = conn.execute("SELECT last_access, size FROM query_cache ORDER BY last_access")
+            for last_access, row_size in cursor:
+                excess_entries -= 1
+                excess_bytes -= row_size
+                cutoff = last_access
+                if excess_entries <= 0 and excess_bytes <= 0:
+                    break
+            cursor.close()
+            trimmed = conn.execute("DELETE FROM query_cache WHERE last_access <= ?", (cutoff,)).rowcount
+        conn.execute("DELETE FROM query_cache_tables WHERE key NOT IN (SELECT key FROM query_cache)")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        logger.info("SQLiteCacheStore compacted: %d expired, %d trimmed", expired, trimmed)
+        return {"expired": expired, "trimmed": trimmed}
+
+    def start_compaction(self, interval: float = 600.0) -> None:
+        """Runs compact() now and then every ``interval`` seconds on a daemon thread."""
+        if self._compaction_stop is not None:
+            return
+        stop = threading.Event()
+        self._compaction_stop = stop
+
+        def loop():
+            # A file that grew while no process was compacting is trimmed at startup.
+            while True:
+                try:
+                    self.compact()
+                except sqlite3.Error as e:
+                    logger.error("Query cache compaction failed: %s", str(e))
+                if stop.wait(interval):
+                    return
+
+        threading.Thread(target=loop, name="query-cache-compaction", daemon=True).start()
+
+    def stop_compaction(self) -> None:
+        if self._compaction_stop is not None:
+            self._compaction_stop.set()
+            self._compaction_stop = None
@@ -1,9 +1,10 @@
-import os
 import logging
-import mysql.connector
-from logging_config import setup_logging
+from contextlib import contextmanager
+from typing import Optional
+from ConnectionPool import ConnectionPool, get_mysql_pool, mysql_config_from_env
+from Metrics import metrics
+from logging_config import log_payload
 
-setup_logging()
 logger = logging.getLogger(__name__)
 
 class SchemaGenerator:
@@ -11,66 +12,228 @@ class SchemaGenerator:
     Generates a schema dictionary dynamically by extracting tables, columns,
     and their relationships (foreign keys) from a connected MySQL database.
     """
-    def __init__(self):
+    def __init__(self, pool: Optional[ConnectionPool] = None, db_config: Optional[dict] = None):
+        # An explicitly attached connection takes precedence over the pool.
         self.mysql_conn = None
         self.schema = {}
         self.relationships = {}
         self.logger = logger
-        self.db_config = {
-            "host": os.getenv("MYSQL_HOST"),
-            "port": int(os.getenv("MYSQL_PORT", 3306)),
-            "user": os.getenv("MYSQL_USER"),
-            "password": os.getenv("MYSQL_PASSWORD"),
-            "database": os.getenv("MYSQL_DATABASE"),
+        self.db_config = db_config or mysql_config_from_env()
+        self.pool = pool or get_mysql_pool(self.db_config)
+        self.logger.info("SchemaGenerator initialized for %s", self.pool.name)
+
+    @contextmanager
+    def _connection(self):
+        if self.mysql_conn is not None:
+            yield self.mysql_conn
+        else:
+            with self.pool.connection() as conn:
+                yield conn
+
+    @staticmethod
+    def _text(value):
+        # mysql-connector returns some catalog columns (e.g. DESCRIBE's Type) as bytes.
+        return value.decode() if isinstance(value, (bytes, bytearray)) else value
+
+    def _describe_table(self, cursor, table):
+        cursor.execute(f"DESCRIBE `{table}`;")
+        described = cursor.fetchall()
+        self.schema[table] = {
+            "columns": [column[0] for column in described],
+            "primary_key": None,
+            "column_types": {column[0]: self._text(column[1]) for column in described},
+            "nullable": [column[0] for column in described if column[2] == "YES"],
+            "indexes": {},
         }
-        self.logger.info("SchemaGenerator initialized with DB config: %s", self.db_config)
+        cursor.execute(f"SHOW KEYS FROM `{table}`;")
+        for row in cursor.fetchall():
+            non_unique, key_name, column_name = row[1], row[2], row[4]
+            if key_name == "PRIMARY":
+                self.schema[table]["primary_key"] = (self.schema[table]["primary_key"] or []) + [column_name]
+            else:
+                index = self.schema[table]["indexes"].setdefault(
+                    key_name, {"columns": [], "unique": not int(non_unique)})
+                index["columns"].append(column_name)
+
+    @staticmethod
+    def _table_filter(tables):
+        if tables is None:
+            return "", ()
+        return " AND TABLE_NAME IN (%s)" % ", ".join(["%s"] * len(tables)), tuple(tables)
+
+    def _fetch_relationships(self, cursor, tables=None):
+        table_filter, params = self._table_filter(tables)
+        if tables is not None:
+            for table in tables:
+                self.relationships.pop(table, None)
+        cursor.execute("""
+            SELECT TABLE_NAME, COLUMN_NAME, CONSTRAINT_NAME, REFERENCED_TABLE_NAME, REFERENCED_COLUMN_NAME 
+            FROM INFORMATION_SCHEMA.KEY_COLUMN_USAGE 
+            WHERE TABLE_SCHEMA = DATABASE() AND REFERENCED_TABLE_SCHEMA = DATABASE()
+              AND REFERENCED_TABLE_NAME IS NOT NULL""" + table_filter + """
+            ORDER BY TABLE_NAME, CONSTRAINT_NAME, ORDINAL_POSITION;
+        """, params)
+        foreign_keys = cursor.fetchall()
+        for row in foreign_keys:
+            table_name, column_name, constraint_name, ref_table, ref_column = row
+            if table_name not in self.relationships:
+                self.relationships[table_name] = []
+            self.relationships[table_name].append({
+                "column": column_name,
+                "references": {"table": ref_table, "column": ref_column}
+            })
+
+    def _fetch_bulk(self, cursor, tables=None):
+        """
+        Introspects tables, columns, keys and foreign keys with four set-based
+        INFORMATION_SCHEMA queries, independent of the number of tables.
+        """
+        table_filter, params = self._table_filter(tables)
+        cursor.execute("""
+            SELECT TABLE_NAME FROM INFORMATION_SCHEMA.TABLES
+            WHERE TABLE_SCHEMA = DATABASE()""" + table_filter + """
+            ORDER BY TABLE_NAME;
+        """, params)
+        found = [row[0] for row in cursor.fetchall()]
+        for table in found:
+            self.schema[table] = {"columns": [], "primary_key": None, "column_types": {},
+                                  "nullable": [], "indexes": {}}
+
+        cursor.execute("""
+            SELECT TABLE_NAME, COLUMN_NAME, COLUMN_TYPE, IS_NULLABLE
+            FROM INFORMATION_SCHEMA.COLUMNS
+            WHERE TABLE_SCHEMA = DATABASE()""" + table_filter + """
+            ORDER BY TABLE_NAME, ORDINAL_POSITION;
+        """, params)
+        for table_name, column_name, column_type, is_nullable in cursor.fetchall():
+            entry = self.schema.get(table_name)
+            if entry is None:
+                continue
+            entry["columns"].append(column_name)
+            entry["column_types"][column_name] = self._text(column_type)
+            if is_nullable == "YES":
+                entry["nullable"].append(column_name)
+
+        cursor.execute("""
+            SELECT TABLE_NAME, INDEX_NAME, NON_UNIQUE, COLUMN_NAME
+            FROM INFORMATION_SCHEMA.STATISTICS
+            WHERE TABLE_SCHEMA = DATABASE()""" + table_filter + """
+            ORDER BY TABLE_NAME, INDEX_NAME, SEQ_IN_INDEX;
+        """, params)
+        for table_name, index_name, non_unique, column_name in cursor.fetchall():
+            entry = self.schema.get(table_name)
+            if entry is None:
+                continue
+            if index_name == "PRIMARY":
+                entry["primary_key"] = (entry["primary_key"] or []) + [column_name]
+            else:
+                index = entry["indexes"].setdefault(
+                    index_name, {"columns": [], "unique": not int(non_unique)})
+                index["columns"].append(column_name)
+
+        self._fetch_relationships(cursor, found if tables is not None else None)
+        return found
 
-    def connect_mysql(self):
+    def fetch_schema(self, bulk: bool = True):
+        """
+        Fetches the full schema. The default bulk path needs a constant number
+        of round trips; ``bulk=False`` keeps the original per-table
+        DESCRIBE/SHOW KEYS path (2N+2 round trips) for comparison.
+        """
         try:
-            self.mysql_conn = mysql.connector.connect(**self.db_config)
-            self.logger.info("Connected to MySQL database.")
+            with metrics.timer("schema_fetch"), self._connection() as conn:
+                cursor = conn.cursor()
+                if bulk:
+                    tables = self._fetch_bulk(cursor)
+                else:
+                    cursor.execute("SHOW TABLES;")
+                    tables = [table[0] for table in cursor.fetchall()]
+                    for table in tables:
+                        self._describe_table(cursor, table)
+                    self._fetch_relationships(cursor)
+                cursor.close()
+            log_payload(self.logger, "Tables found: %s", tables)
+            self.logger.info("Database schema and relationships successfully fetched.")
+            return {"tables": self.schema, "relationships": self.relationships}
         except Exception as e:
-            self.logger.error("Failed to connect to MySQL: %s", str(e))
+            self.logger.error("Failed to fetch schema: %s", str(e))
             raise
 
-    def fetch_schema(self):
-        if not self.mysql_conn:
-            self.connect_mysql()
+    def fetch_tables(self, tables):
+        """
+        Re-introspects only the given tables and merges them into the current
+        schema. Returns {"tables", "relationships"} restricted to those tables.
+        """
+        tables = list(tables)
+        if not tables:
+            return {"tables": {}, "relationships": {}}
         try:
-            cursor = self.mysql_conn.cursor()
-            cursor.execute("SHOW TABLES;")
-            tables = [table[0] for table in cursor.fetchall()]
-            self.logger.info("Tables found: %s", tables)
             for table in tables:
-                cursor.execute(f"DESCRIBE {table};")
-                columns = [column[0] for column in cursor.fetchall()]
-                self.schema[table] = {"columns": columns, "primary_key": None}
-                cursor.execute(f"SHOW KEYS FROM {table} WHERE Key_name = 'PRIMARY';")
-                primary_keys = [row[4] for row in cursor.fetchall()]
-                if primary_keys:
-                    self.schema[table]["primary_key"] = primary_keys
-            cursor.execute("""
-                SELECT TABLE_NAME, COLUMN_NAME, CONSTRAINT_NAME, REFERENCED_TABLE_NAME, REFERENCED_COLUMN_NAME 
-                FROM INFORMATION_SCHEMA.KEY_COLUMN_USAGE 
-                WHERE TABLE_SCHEMA = DATABASE() AND REFERENCED_TABLE_NAME IS NOT NULL;
-            """)
-            foreign_keys = cursor.fetchall()
-            for row in foreign_keys:
-                table_name, column_name, constraint_name, ref_table, ref_column = row
-                if table_name not in self.relationships:
-                    self.relationships[table_name] = []
-                self.relationships[table_name].append({
-                    "column": column_name,
-                    "references": {"table": ref_table, "column": ref_column}
-                })
-            cursor.close()
-            self.logger.info("Database schema and relationships successfully fetched.")
-            return {"tables": self.schema, "relationships": self.relationships}
+                self.schema.pop(table, None)
+            with metrics.timer("schema_fetch_tables"), self._connection() as conn:
+                cursor = conn.cursor()
+                self._fetch_bulk(cursor, tables)
+                cursor.close()
+            self.logger.info("Re-introspected %d tables.", len(tables))
+            return {
+                "tables": {t: self.schema[t] for t in tables if t in self.schema},
+                "relationships": {t: self.relationships[t] for t in tables if t in self.relationships},
+            }
         except Exception as e:
-            self.logger.error("Failed to fetch schema: %s", str(e))
+            self.logger.error("Failed to fetch tables %s: %s", tables, str(e))
+            raise
+
+    def fetch_table_versions(self):
+        """
+        Returns {table: version} in a single round trip. The version combines
+        CREATE_TIME (changed by table rebuilds) with CRC32 checksums over the
+        column definitions, the index keys (STATISTICS) and the foreign keys
+        (KEY_COLUMN_USAGE), so DDL that only adds or drops an index or a
+        foreign key is detected too, without a per-table DESCRIBE.
+        UPDATE_TIME is deliberately ignored: it tracks row changes, which do
+        not affect the schema.
+        """
+        try:
+            with metrics.timer("schema_versions"), self._connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    SELECT t.TABLE_NAME, t.CREATE_TIME, COALESCE(c.checksum, 0),
+                           COALESCE(s.checksum, 0), COALESCE(k.checksum, 0)
+                    FROM INFORMATION_SCHEMA.TABLES t
+                    LEFT JOIN (
+                        SELECT TABLE_NAME, SUM(CRC32(CONCAT_WS(':', ORDINAL_POSITION, COLUMN_NAME, COLUMN_TYPE,
+                                                               IS_NULLABLE, COLUMN_KEY))) AS checksum
+                        FROM INFORMATION_SCHEMA.COLUMNS
+                        WHERE TABLE_SCHEMA = DATABASE()
+                        GROUP BY TABLE_NAME
+                    ) c ON c.TABLE_NAME = t.TABLE_NAME
+                    LEFT JOIN (
+                        SELECT TABLE_NAME, SUM(CRC32(CONCAT_WS(':', INDEX_NAME, SEQ_IN_INDEX, COLUMN_NAME,
+                                                               NON_UNIQUE))) AS checksum
+                        FROM INFORMATION_SCHEMA.STATISTICS
+                        WHERE TABLE_SCHEMA = DATABASE()
+                        GROUP BY TABLE_NAME
+                    ) s ON s.TABLE_NAME = t.TABLE_NAME
+                    LEFT JOIN (
+                        SELECT TABLE_NAME, SUM(CRC32(CONCAT_WS(':', CONSTRAINT_NAME, ORDINAL_POSITION, COLUMN_NAME,
+                                                               REFERENCED_TABLE_NAME, REFERENCED_COLUMN_NAME))) AS checksum
+                        FROM INFORMATION_SCHEMA.KEY_COLUMN_USAGE
+                        WHERE TABLE_SCHEMA = DATABASE() AND REFERENCED_TABLE_NAME IS NOT NULL
+                        GROUP BY TABLE_NAME
+                    ) k ON k.TABLE_NAME = t.TABLE_NAME
+                    WHERE t.TABLE_SCHEMA = DATABASE();
+                """)
+                versions = {
+                    table: f"{create_time}:{columns}:{indexes}:{foreign_keys}"
+                    for table, create_time, columns, indexes, foreign_keys in cursor.fetchall()
+                }
+                cursor.close()
+            return versions
+        except Exception as e:
+            self.logger.error("Failed to fetch table versions: %s", str(e))
             raise
 
     def get_schema(self):
         if not self.schema:
             return self.fetch_schema()
-        return {"tables": self.schema, "relationships": self.relationships}
\ No newline at end of file
+        return {"tables": self.schema, "relationships": self.relationships}
@@ -1,24 +1,228 @@
-from typing import Dict, List 
-import logging  
-
-class SchemaManager:
-    """Manages schema context efficiently"""
-    
-    def __init__(self, full_schema: Dict[str, List[str]]):
-        self.full_schema = full_schema
-        self.usage_stats = {table: 0 for table in full_schema}
-        
-    def get_context(self, user_input: str) -> str:
-        """Extract relevant schema parts based on input"""
-        '''
-        relevant_tables = [
-            table for table, columns in self.full_schema.items()
-            if any(word.lower() in table.lower() for word in user_input.split())
-        ]
-        '''
-        context = []
-        for table in relevant_tables[:3]:  # Limit to 3 tables
-            context.append(f"{table}({', '.join(self.full_schema[table])})")
-            self.usage_stats[table] += 1
-            
-        return ' '.join(context)
\ No newline at end of file
+import re
+import math
+import difflib
+import logging
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_IDENTIFIER_PARTS = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+")
+
+STOP_WORDS = frozenset("""
+    a an and are as at be by can do does for from get give has have how i in is it list me my
+    of on or per please show tell than that the their them there these this those to was we were
+    what when where which who whose will with within you all each every number find return
+""".split())
+
+DEFAULT_SYNONYMS = [
+    {"customer", "client", "buyer", "shopper"},
+    {"employee", "staff", "worker", "personnel"},
+    {"product", "item", "good", "merchandise"},
+    {"order", "purchase"},
+    {"vendor", "supplier"},
+    {"sale", "revenue", "sold"},
+    {"amount", "total", "sum", "value"},
+    {"price", "cost"},
+    {"address", "location"},
+    {"territory", "region"},
+    {"birth", "birthday", "born"},
+    {"hire", "hired", "joined"},
+    {"person", "people"},
+    {"quantity", "qty"},
+]
+
+
+def stem(token: str) -> str:
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def split_identifier(name: str) -> List[str]:
+    """Splits snake_case, camelCase and PascalCase identifiers into lower-case stems."""
+    tokens = []
+    for part in re.split(r"[^A-Za-z0-9]+", name):
+        tokens.extend(stem(t.lower()) for t in _IDENTIFIER_PARTS.findall(part))
+    return tokens
+
+
+def estimate_tokens(text: str) -> int:
+    # Roughly four characters per token for English and SQL identifiers.
+    return len(text) // 4 + 1
+
+
+class SchemaManager:
+    """Manages schema context efficiently"""
+
+    TABLE_WEIGHT = 3.0
+    COLUMN_WEIGHT = 1.0
+    NEIGHBOR_DECAY = 0.5
+
+    def __init__(self, full_schema: dict, token_budget: int = 1500, max_tables: int = 8,
+                 synonyms: Optional[Iterable[set]] = None, include_types: bool = False):
+        self.full_schema = full_schema
+        self.tables = full_schema.get("tables", {})
+        self.token_budget = token_budget
+        self.max_tables = max_tables
+        self.include_types = include_types
+        self.usage_stats = {table: 0 for table in self.tables}
+        self.synonyms = self._build_synonyms(DEFAULT_SYNONYMS if synonyms is None else synonyms)
+        self.index = self._build_index()
+        self.neighbors = self._build_neighbors(full_schema.get("relationships", {}), self.tables)
+        self._table_lookup = {table.lower(): table for table in self.tables}
+        self._rendered = {}
+        self._fuzzy_memo = {}
+        logger.info("SchemaManager indexed %d tables and %d tokens", len(self.tables), len(self.index))
+
+    @staticmethod
+    def _build_synonyms(groups: Iterable[set]) -> Dict[str, set]:
+        synonyms = defaultdict(set)
+        for group in groups:
+            stems = {stem(word.lower()) for word in group}
+            for word in stems:
+                synonyms[word] |= stems
+        return dict(synonyms)
+
+    def _build_index(self) -> Dict[str, Dict[str, float]]:
+        """Inverted index: token -> {table: weight}, weighted by IDF across tables."""
+        raw = defaultdict(dict)
+        for table, info in self.tables.items():
+            for token in split_identifier(table):
+                raw[token][table] = self.TABLE_WEIGHT
+            for column in info.get("columns", []):
+                for token in split_identifier(column):
+                    raw[token][table] = max(raw[token].get(table, 0.0), self.COLUMN_WEIGHT)
+        n_tables = max(len(self.tables), 1)
+        index = {}
+        for token, postings in raw.items():
+            idf = math.log(1 + n_tables / len(postings))
+            index[token] = {table: weight * idf for table, weight in postings.items()}
+        return index
+
+    @staticmethod
+    def _build_neighbors(relationships: dict, tables: dict) -> Dict[str, set]:
+        neighbors = defaultdict(set)
+        for table, foreign_keys in relationships.items():
+            for fk in foreign_keys:
+                referenced = fk["references"]["table"]
+                if table not in tables or referenced not in tables:
+                    continue  # a table in another schema or dropped since the snapshot was taken
+                neighbors[table].add(referenced)
+                neighbors[referenced].add(table)
+        return dict(neighbors)
+
+    def _query_tokens(self, user_input: str) -> List[str]:
+        tokens = []
+        for word in re.findall(r"[A-Za-z0-9_]+", user_input):
+            for token in split_identifier(word):
+                if token in STOP_WORDS or token.isdigit():
+                    continue
+                if token not in self.index and token not in self.synonyms:
+                    token = self._closest_token(token)
+                    if token is None:
+                        continue
+                tokens.append(token)
+        return tokens
+
+    def _closest_token(self, token: str) -> Optional[str]:
+        """Maps misspelled words (e.g. "employyes") onto the index vocabulary."""
+        if token not in self._fuzzy_memo:
+            match = difflib.get_close_matches(token, self.index.keys(), n=1, cutoff=0.8)
+            self._fuzzy_memo[token] = match[0] if match else None
+        return self._fuzzy_memo[token]
+
+    def rank_tables(self, user_input: str, limit: Optional[int] = None) -> List[Tuple[str, float]]:
+        """Scores tables against the input and expands the best ones to their FK neighbours."""
+        limit = limit or self.max_tables
+        scores = defaultdict(float)
+        for token in set(self._query_tokens(user_input)):
+            for variant in self.synonyms.get(token, {token}):
+                postings = self.index.get(variant)
+                if not postings:
+                    continue
+                factor = 1.0 if variant == token else 0.8
+                for table, weight in postings.items():
+                    scores[table] += weight * factor
+        if not scores:
+            return []
+
+        seeds = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+        ranked = dict(seeds)
+        for table, score in seeds:
+            for neighbor in self.neighbors.get(table, ()):
+                bonus = score * self.NEIGHBOR_DECAY
+                if ranked.get(neighbor, 0.0) < bonus:
+                    ranked[neighbor] = max(bonus, scores.get(neighbor, 0.0))
+        return sorted(ranked.items(), key=lambda item: item[1], reverse=True)[:limit]
+
+    def find_references(self, sql: str) -> Dict[str, List[str]]:
+        """
+        Returns {table: [columns]} for the schema tables a SQL statement uses.
+        Identifiers are matched against the schema, so aliases, keywords and
+        names inside string literals or comments are ignored.
+        """
+        sql = re.sub(r"```\w*", " ", sql)
+        sql = re.sub(r"'(?:[^'\\]|\\.|'')*'|--[^\n]*|#[^\n]*|/\*.*?\*/", " ", sql, flags=re.DOTALL)
+        identifiers = {next(group for group in match.groups() if group)
+                       for match in re.finditer(r'`([^`]+)`|"([^"]+)"|\[([^\]]+)\]|([A-Za-z_][A-Za-z0-9_$]*)', sql)}
+        lowered = {identifier.lower() for identifier in identifiers}
+        references = {}
+        for identifier in lowered:
+            table = self._table_lookup.get(identifier)
+            if table is not None:
+                references[table] = sorted(column for column in self.tables[table].get("columns", [])
+                                           if column.lower() in lowered)
+        return references
+
+    def _render_table(self, table: str) -> str:
+        rendered = self._rendered.get(table)
+        if rendered is None:
+            info = self.tables[table]
+            primary_key = set(info.get("primary_key") or [])
+            types = info.get("column_types", {}) if self.include_types else {}
+            foreign_keys = {
+                fk["column"]: f'{fk["references"]["table"]}.{fk["references"]["column"]}'
+                for fk in self.full_schema.get("relationships", {}).get(table, [])
+                if fk["references"]["table"] in self.tables
+            }
+            columns = []
+            for column in info.get("columns", []):
+                text = f"`{column}`" if not re.fullmatch(r"\w+", column) else column
+                if column in types:
+                    text += f" {types[column]}"
+                if column in primary_key:
+                    text += " PK"
+                if column in foreign_keys:
+                    text += f" -> {foreign_keys[column]}"
+                columns.append(text)
+            rendered = f"{table}({', '.join(columns)})"
+            self._rendered[table] = rendered
+        return rendered
+
+    def get_context(self, user_input: str, token_budget: Optional[int] = None) -> str:
+        """Extract relevant schema parts based on input"""
+        budget = token_budget or self.token_budget
+        ranked = [table for table, _ in self.rank_tables(user_input)]
+        if not ranked:
+            # Nothing matched: fall back to the most used, then best connected tables.
+            ranked = sorted(self.tables, key=lambda t: (self.usage_stats.get(t, 0),
+                                                        len(self.neighbors.get(t, ()))),
+                            reverse=True)[:self.max_tables]
+        context = []
+        used = 0
+        for table in ranked:
+            line = self._render_table(table)
+            cost = estimate_tokens(line)
+            if used + cost > budget:
+                if not context:
+                    context.append(line[:budget * 4])
+                    self.usage_stats[table] += 1
+                continue
+            context.append(line)
+            used += cost
+            self.usage_stats[table] += 1
+        logger.debug("Schema context for %r: %d tables, ~%d tokens", user_input, len(context), used)
+        return "\n".join(context)
@@ -0,0 +1,213 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import weakref
+import threading
+from typing import Callable, Dict, List, Optional
+from SchemaGenerator import SchemaGenerator
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SCHEMA_TTL = float(os.getenv("SCHEMA_CACHE_TTL", 300))
+
+
+class SchemaSnapshot:
+    """Immutable view of a database schema at a point in time"""
+
+    def __init__(self, schema: dict, versions: Dict[str, str], fetched_at: float):
+        self.schema = schema
+        self.versions = versions
+        self.fetched_at = fetched_at
+        self.fingerprint = hashlib.sha256(
+            json.dumps(sorted(versions.items()), default=str).encode()).hexdigest()[:16]
+
+    @property
+    def tables(self) -> dict:
+        return self.schema["tables"]
+
+    @property
+    def relationships(self) -> dict:
+        return self.schema["relationships"]
+
+    def age(self) -> float:
+        return time.monotonic() - self.fetched_at
+
+
+class SchemaStore:
+    """
+    Process-wide schema snapshot store.
+
+    The first call introspects the database synchronously. After that,
+    readers always get the current snapshot without touching the database;
+    once it is older than ``ttl`` a single background thread checks the
+    per-table versions and re-introspects only the tables that changed.
+    Snapshots are replaced, never mutated, so readers need no locking.
+    """
+
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, ttl: float = DEFAULT_SCHEMA_TTL,
+                 generator_factory: Callable[[], SchemaGenerator] = SchemaGenerator):
+        self.ttl = ttl
+        self.generator = generator_factory()
+        self._snapshot: Optional[SchemaSnapshot] = None
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._auto_refresh_stop = None
+        self._listeners = []
+        logger.info("SchemaStore initialized with ttl %.1fs", ttl)
+
+    @classmethod
+    def shared(cls, ttl: Optional[float] = None,
+               generator_factory: Callable[[], SchemaGenerator] = SchemaGenerator) -> "SchemaStore":
+        """Returns the store for the configured database, creating it once per process."""
+        generator = generator_factory()
+        key = (generator.db_config.get("host"), generator.db_config.get("port"),
+               generator.db_config.get("database"))
+        with cls._instances_lock:
+            store = cls._instances.get(key)
+            if store is None:
+                store = cls(DEFAULT_SCHEMA_TTL if ttl is None else ttl, lambda: generator)
+                cls._instances[key] = store
+            elif ttl is not None:
+                store.ttl = ttl
+            return store
+
+    def peek(self) -> Optional[SchemaSnapshot]:
+        """Returns the current snapshot without loading or refreshing it."""
+        return self._snapshot
+
+    def get_snapshot(self) -> SchemaSnapshot:
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self._lock:
+                if self._snapshot is None:
+                    self._snapshot = self._load_full()
+                return self._snapshot
+        if snapshot.age() > self.ttl:
+            self._refresh_in_background()
+        return snapshot
+
+    def get_schema(self) -> dict:
+        """Returns {"tables", "relationships"}; callers must treat it as read-only."""
+        return self.get_snapshot().schema
+
+    def add_listener(self, callback: Callable[[List[str], List[str]], None]) -> None:
+        """
+        Registers ``callback(changed_tables, removed_tables)``, called after a
+        refresh that found schema changes. Bound methods are held weakly, so
+        registering does not keep their instance alive.
+        """
+        if hasattr(callback, "__self__"):
+            self._listeners.append(weakref.WeakMethod(callback))
+        else:
+            self._listeners.append(lambda: callback)
+
+    def _notify(self, changed: List[str], removed: List[str]) -> None:
+        alive = []
+        for ref in self._listeners:
+            callback = ref()
+            if callback is None:
+                continue
+            alive.append(ref)
+            try:
+                callback(changed, removed)
+            except Exception as e:
+                logger.error("Schema change listener failed: %s", str(e))
+        self._listeners = alive
+
+    def invalidate(self) -> None:
+        """Drops the snapshot so the next read performs a full introspection."""
+        with self._lock:
+            self._snapshot = None
+
+    def refresh(self) -> SchemaSnapshot:
+        """Synchronously brings the snapshot up to date, re-introspecting only changed tables."""
+        with self._lock:
+            if self._snapshot is None:
+                self._snapshot = self._load_full()
+            else:
+                self._snapshot = self._load_incremental(self._snapshot)
+            return self._snapshot
+
+    def start_auto_refresh(self, interval: Optional[float] = None) -> None:
+        """Starts a daemon thread that refreshes the snapshot every ``interval`` seconds."""
+        if self._auto_refresh_stop is not None:
+            return
+        stop = threading.Event()
+        self._auto_refresh_stop = stop
+        interval = interval or self.ttl
+
+        def loop():
+            while not stop.wait(interval):
+                try:
+                    self.refresh()
+                except Exception as e:
+                    logger.error("Background schema refresh failed: %s", str(e))
+
+        threading.Thread(target=loop, name="schema-refresh", daemon=True).start()
+
+    def stop_auto_refresh(self) -> None:
+        if self._auto_refresh_stop is not None:
+            self._auto_refresh_stop.set()
+            self._auto_refresh_stop = None
+
+    def _refresh_in_background(self) -> None:
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                self.refresh()
+            except Exception as e:
+                # Keep serving the stale snapshot; the next read past the TTL retries.
+                logger.error("Background schema refresh failed: %s", str(e))
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=run, name="schema-refresh", daemon=True).start()
+
+    def _load_full(self) -> SchemaSnapshot:
+        start = time.perf_counter()
+        self.generator.schema = {}
+        self.generator.relationships = {}
+        versions = self.generator.fetch_table_versions()
+        schema = self.generator.fetch_schema()
+        snapshot = SchemaSnapshot(
+            {"tables": dict(schema["tables"]), "relationships": dict(schema["relationships"])},
+            versions, time.monotonic())
+        logger.info("Loaded schema snapshot with %d tables in %.3fs",
+                    len(snapshot.tables), time.perf_counter() - start)
+        return snapshot
+
+    def _load_incremental(self, current: SchemaSnapshot) -> SchemaSnapshot:
+        start = time.perf_counter()
+        versions = self.generator.fetch_table_versions()
+        changed = [t for t, v in versions.items() if current.versions.get(t) != v]
+        removed = [t for t in current.versions if t not in versions]
+        if not changed and not removed:
+            # A new snapshot of the same schema: readers holding the current one never see it change.
+            return SchemaSnapshot(current.schema, current.versions, time.monotonic())
+
+        tables = dict(current.tables)
+        relationships = dict(current.relationships)
+        for table in removed:
+            tables.pop(table, None)
+            relationships.pop(table, None)
+            self.generator.schema.pop(table, None)
+            self.generator.relationships.pop(table, None)
+        partial = self.generator.fetch_tables(changed)
+        for table in changed:
+            relationships.pop(table, None)
+        tables.update(partial["tables"])
+        relationships.update(partial["relationships"])
+        logger.info("Schema refresh: %d changed, %d removed tables in %.3fs",
+                    len(changed), len(removed), time.perf_counter() - start)
+        self._notify(changed, removed)
+        return SchemaSnapshot({"tables": tables, "relationships": relationships},
+                              versions, time.monotonic())
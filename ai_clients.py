@@ -1,14 +1,106 @@
 import os
+import re
 import time
+import zlib
 import logging
+import threading
 from abc import ABC, abstractmethod
-from typing import Optional
-import openai
-from logging_config import setup_logging
+from contextvars import ContextVar
+from typing import Callable, Optional
+from Metrics import metrics
+from SchemaManager import estimate_tokens
+from SQLTokenizer import tokenize
+from logging_config import log_payload
 
-setup_logging()
 logger = logging.getLogger(__name__)
 
+# Set around a call that may be abandoned (see HedgedClient); streaming clients stop reading once it is set.
+cancel_event: ContextVar[Optional[threading.Event]] = ContextVar("cancel_event", default=None)
+
+
+class GenerationCancelled(Exception):
+    """Raised by a client whose ``cancel_event`` was set before the reply was complete."""
+
+_SQL_START = re.compile(r"(?i)(select|with|insert|update|delete|replace|show|describe|explain)\b")
+# Strings, quoted identifiers and comments (terminated or not) are skipped; a bare ';' ends the statement.
+_SQL_SCAN = re.compile(r"'(?:[^'\\]|\\.)*(?:'|$)|\"(?:[^\"\\]|\\.)*(?:\"|$)|`[^`]*(?:`|$)"
+                       r"|--[^\n]*|#[^\n]*|/\*.*?(?:\*/|$)|;", re.DOTALL)
+# Words of a sentence that are not plausible SQL identifiers.
+_PROSE_WORDS = frozenset("""
+    the you your me we our this these here following can could will would should please
+""".split())
+
+
+def _looks_like_sql(statement: str) -> bool:
+    """
+    Whether the text before a reply's first ';' reads as SQL rather than as
+    prose that happens to open with an SQL word ("Show me the ...", "With the
+    schema above, ..."): it lexes cleanly, has no sentence punctuation, no
+    run of three plain words and none of the words prose is made of.
+    """
+    tokens = tokenize(statement)
+    run = 0
+    for token in tokens:
+        if token.kind == "error":
+            return False
+        if token.kind == "operator" and token.value in ".:!" and \
+                statement[token.start + 1:token.start + 2].strip() == "":
+            return False  # ends a sentence, where SQL's "." qualifies a name
+        if token.kind == "identifier":
+            run += 1
+            if run == 3 or token.value.lower() in _PROSE_WORDS:
+                return False
+        else:
+            run = 0
+    return True
+
+
+class SQLStreamParser:
+    """
+    Accumulates a streamed completion and tells when its SQL is complete:
+    at the closing fence of a markdown code block, or at the first ';'
+    outside strings and comments of a reply that starts with SQL. Text
+    before that ';' that reads as prose (see _looks_like_sql) is not SQL; the
+    parser then waits for a fence, or for the end of the reply.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self._body = None  # offset where the SQL starts, once known
+        self._fenced = False
+        self._prose = False  # the reply opened with prose, so only a fence can hold the SQL
+
+    def feed(self, delta: str) -> Optional[str]:
+        """Adds a chunk; returns the completion cut after the SQL once it is complete."""
+        self.text += delta
+        if not self._fenced:
+            # A fence can follow prose that looked like SQL, so it is looked for until one is found.
+            fence = self.text.find("```")
+            if fence != -1:
+                newline = self.text.find("\n", fence)
+                if newline == -1:
+                    return None
+                self._fenced = True
+                self._body = newline + 1
+            elif self._prose:
+                return None
+            elif self._body is None:
+                stripped = self.text.lstrip()
+                if not _SQL_START.match(stripped):
+                    return None
+                self._body = len(self.text) - len(stripped)
+        if self._fenced:
+            close = self.text.find("```", self._body)
+            return self.text[:close + 3] if close != -1 else None
+        for match in _SQL_SCAN.finditer(self.text, self._body):
+            if match.group() == ";":
+                if _looks_like_sql(self.text[self._body:match.start()]):
+                    return self.text[:match.end()]
+                self._prose = True
+                return None
+        return None
+
+
 class AIClient(ABC):
     @abstractmethod
     def generate_query(self, prompt: str, max_tokens: int, system_prompt: Optional[str] = None) -> dict:
@@ -17,38 +109,160 @@ class AIClient(ABC):
           - "query": The generated query (str)
           - "latency": The latency (float)
           - "usage": Token usage info (dict)
+          - "ttft": Seconds until the first token arrived (float, optional)
         """
         pass
 
+    async def agenerate_query(self, prompt: str, max_tokens: int, system_prompt: Optional[str] = None) -> dict:
+        """
+        Async version of generate_query returning the same dictionary.
+        Clients without a native async API run the blocking call in a worker thread.
+        """
+        import asyncio  # already loaded by the running event loop; kept out of synchronous imports
+        return await asyncio.to_thread(self.generate_query, prompt, max_tokens, system_prompt)
+
 class OpenAIClient(AIClient):
-    def __init__(self, api_key: str = None):
+    """
+    Generates queries with the OpenAI chat API. With ``stream`` the reply is
+    read incrementally and the request is closed as soon as the SQL is
+    complete (see SQLStreamParser); streamed usage is estimated. The
+    ``openai`` package is imported when the first client is created.
+    """
+
+    def __init__(self, api_key: str = None, model: str = "gpt-3.5-turbo", stream: bool = True):
+        self.model = model
+        self.stream = stream
+        import openai
+        self.openai = openai
         openai.api_key = os.getenv("OPENAI_API_KEY", api_key)
         if not openai.api_key:
             raise ValueError("OpenAI API key not found. Please set OPENAI_API_KEY in .env or pass as an argument.")
-        logger.info(f"OpenAI API Key loaded: {openai.api_key[:5]}...")
+        logger.info("OpenAI API Key loaded: %s...", openai.api_key[:5])
+
+    @staticmethod
+    def _messages(prompt: str, system_prompt: Optional[str]) -> list:
+        messages = []
+        if system_prompt:
+            messages.append({"role": "system", "content": system_prompt})
+        else:
+            messages.append({"role": "system", "content": "You are a MYSQL expert assistant."})
+        messages.append({"role": "user", "content": prompt})
+        return messages
+
+    @staticmethod
+    def _record(ttft: float, usage: dict) -> None:
+        metrics.observe("llm_ttft", ttft)
+        metrics.incr("llm_tokens", usage.get("prompt_tokens", 0), kind="prompt")
+        metrics.incr("llm_tokens", usage.get("completion_tokens", 0), kind="completion")
+
+    @classmethod
+    def _result(cls, response, latency: float) -> dict:
+        generated = response.choices[0].message.content.strip()
+        usage = response.get("usage", {})  # Contains prompt_tokens, completion_tokens, total_tokens
+        cls._record(latency, usage)
+        logger.info("Generated query in %.2fs (usage: %s)", latency, usage)
+        log_payload(logger, "Generated query: %s", generated)
+        return {"query": generated, "latency": latency, "usage": usage, "ttft": latency}
+
+    @staticmethod
+    def _chunk_text(chunk) -> str:
+        if not chunk.choices:
+            return ""
+        return chunk.choices[0].delta.get("content") or ""
+
+    @classmethod
+    def _stream_result(cls, text: str, messages: list, chunks: int, start_time: float,
+                       first_token: Optional[float], stopped: bool) -> dict:
+        latency = time.time() - start_time
+        ttft = first_token - start_time if first_token is not None else latency
+        generated = text.strip()
+        # Streamed responses carry no usage; count roughly one token per chunk.
+        prompt_tokens = sum(len(message["content"]) // 4 + 1 for message in messages)
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": chunks,
+                 "total_tokens": prompt_tokens + chunks, "estimated": True}
+        cls._record(ttft, usage)
+        logger.info("Generated query in %.2fs (ttft: %.2fs, stopped early: %s, usage: %s)",
+                    latency, ttft, stopped, usage)
+        log_payload(logger, "Generated query: %s", generated)
+        return {"query": generated, "latency": latency, "usage": usage, "ttft": ttft}
 
     def generate_query(self, prompt: str, max_tokens: int, system_prompt: Optional[str] = None) -> dict:
         try:
-            messages = []
-            if system_prompt:
-                messages.append({"role": "system", "content": system_prompt})
-            else:
-                messages.append({"role": "system", "content": "You are a MYSQL expert assistant."})
-            messages.append({"role": "user", "content": prompt})
-            logger.info(f"Generating query with prompt: {prompt}")
+            messages = self._messages(prompt, system_prompt)
+            log_payload(logger, "Generating query with prompt: %s", prompt)
             start_time = time.time()
-            response = openai.ChatCompletion.create(
-                model="gpt-3.5-turbo",
+            response = self.openai.ChatCompletion.create(
+                model=self.model,
                 messages=messages,
-                max_tokens=max_tokens
+                max_tokens=max_tokens,
+                stream=self.stream
             )
-            latency = time.time() - start_time
-            generated = response.choices[0].message.content.strip()
-            usage = response.get("usage", {})  # Contains prompt_tokens, completion_tokens, total_tokens
-            logger.info(f"Generated query: {generated} (latency: {latency:.2f}s, usage: {usage})")
-            return {"query": generated, "latency": latency, "usage": usage}
+            if not self.stream:
+                return self._result(response, time.time() - start_time)
+            parser, chunks, first_token, completed = SQLStreamParser(), 0, None, None
+            cancel = cancel_event.get()
+            try:
+                for chunk in response:
+                    if cancel is not None and cancel.is_set():
+                        raise GenerationCancelled("OpenAI request cancelled")
+                    text = self._chunk_text(chunk)
+                    if not text:
+                        continue
+                    chunks += 1
+                    if first_token is None:
+                        first_token = time.time()
+                    completed = parser.feed(text)
+                    if completed is not None:
+                        break
+            finally:
+                # Closing the stream ends the request, so no tokens are generated past the SQL.
+                close = getattr(response, "close", None)
+                if close is not None:
+                    close()
+            return self._stream_result(completed or parser.text, messages, chunks, start_time, first_token,
+                                       completed is not None)
+        except GenerationCancelled:
+            logger.info("OpenAI stream closed after cancellation")
+            raise
+        except Exception as e:
+            metrics.incr("llm_errors", client="openai")
+            logger.error("OpenAI API error: %s", str(e))
+            raise
+
+    async def agenerate_query(self, prompt: str, max_tokens: int, system_prompt: Optional[str] = None) -> dict:
+        try:
+            messages = self._messages(prompt, system_prompt)
+            log_payload(logger, "Generating query asynchronously with prompt: %s", prompt)
+            start_time = time.time()
+            response = await self.openai.ChatCompletion.acreate(
+                model=self.model,
+                messages=messages,
+                max_tokens=max_tokens,
+                stream=self.stream
+            )
+            if not self.stream:
+                return self._result(response, time.time() - start_time)
+            parser, chunks, first_token, completed = SQLStreamParser(), 0, None, None
+            try:
+                async for chunk in response:
+                    text = self._chunk_text(chunk)
+                    if not text:
+                        continue
+                    chunks += 1
+                    if first_token is None:
+                        first_token = time.time()
+                    completed = parser.feed(text)
+                    if completed is not None:
+                        break
+            finally:
+                aclose = getattr(response, "aclose", None)
+                if aclose is not None:
+                    await aclose()
+            return self._stream_result(completed or parser.text, messages, chunks, start_time, first_token,
+                                       completed is not None)
         except Exception as e:
-            logger.error(f"OpenAI API error: {str(e)}")
+            metrics.incr("llm_errors", client="openai")
+            logger.error("OpenAI API error: %s", str(e))
             raise
 
 class DeepSeaClient(AIClient):
@@ -59,11 +273,15 @@ class DeepSeaClient(AIClient):
         try:
             logger.info("DeepSeaClient generate_query called")
             # Return a dummy response with zero latency and no usage info.
-            return {"query": "SELECT * FROM mock_data", "latency": 0.0, "usage": {}}
+            return {"query": "SELECT * FROM mock_data", "latency": 0.0, "usage": {}, "ttft": 0.0}
         except Exception as e:
-            logger.error(f"DeepSea API error: {str(e)}")
+            logger.error("DeepSea API error: %s", str(e))
             raise
 
+    async def agenerate_query(self, prompt: str, max_tokens: int, system_prompt: Optional[str] = None) -> dict:
+        # The mock never blocks, so it answers on the event loop directly.
+        return self.generate_query(prompt, max_tokens, system_prompt)
+
 class QwenClient(AIClient):
     def __init__(self, api_key: str):
         self.api_key = api_key
@@ -71,7 +289,60 @@ class QwenClient(AIClient):
     def generate_query(self, prompt: str, max_tokens: int, system_prompt: Optional[str] = None) -> dict:
         try:
             logger.info("QwenClient generate_query called")
-            return {"query": "SELECT * FROM sample_table", "latency": 0.0, "usage": {}}
+            return {"query": "SELECT * FROM sample_table", "latency": 0.0, "usage": {}, "ttft": 0.0}
         except Exception as e:
-            logger.error(f"Qwen API error: {str(e)}")
-            raise
\ No newline at end of file
+            logger.error("Qwen API error: %s", str(e))
+            raise
+
+    async def agenerate_query(self, prompt: str, max_tokens: int, system_prompt: Optional[str] = None) -> dict:
+        return self.generate_query(prompt, max_tokens, system_prompt)
+
+
+class MockClient(AIClient):
+    """
+    Deterministic offline client for benchmarks and replays. Answers with
+    ``responder(prompt)`` (a fixed query by default) after ``latency``
+    seconds plus up to ``jitter`` seconds derived from the prompt, so the
+    same workload always sees the same delays. Usage is estimated from the
+    prompt and reply sizes.
+    """
+
+    def __init__(self, responder: Optional[Callable[[str], str]] = None, latency: float = 0.0,
+                 jitter: float = 0.0, ttft: Optional[float] = None):
+        self.responder = responder or (lambda prompt: "SELECT * FROM mock_data")
+        self.latency = latency
+        self.jitter = jitter
+        self.ttft = ttft
+        self.calls = 0
+
+    def delay(self, prompt: str) -> float:
+        if not self.jitter:
+            return self.latency
+        return self.latency + self.jitter * (zlib.crc32(prompt.encode()) % 1000) / 1000.0
+
+    def _result(self, prompt: str, system_prompt: Optional[str], delay: float) -> dict:
+        self.calls += 1
+        query = self.responder(prompt)
+        prompt_tokens = estimate_tokens(prompt) + (estimate_tokens(system_prompt) if system_prompt else 0)
+        completion_tokens = estimate_tokens(query)
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                 "total_tokens": prompt_tokens + completion_tokens}
+        ttft = self.ttft if self.ttft is not None else delay
+        return {"query": query, "latency": delay, "usage": usage, "ttft": min(ttft, delay)}
+
+    def generate_query(self, prompt: str, max_tokens: int, system_prompt: Optional[str] = None) -> dict:
+        delay = self.delay(prompt)
+        cancel = cancel_event.get()
+        if cancel is not None:
+            if cancel.wait(delay):
+                raise GenerationCancelled("MockClient request cancelled")
+        elif delay:
+            time.sleep(delay)
+        return self._result(prompt, system_prompt, delay)
+
+    async def agenerate_query(self, prompt: str, max_tokens: int, system_prompt: Optional[str] = None) -> dict:
+        import asyncio
+        delay = self.delay(prompt)
+        if delay:
+            await asyncio.sleep(delay)
+        return self._result(prompt, system_prompt, delay)
@@ -0,0 +1,96 @@
+"""
+Import-time budget check for the modules every worker and Streamlit rerun loads.
+
+Each of ``--modules`` is imported ``--repeat`` times in a fresh interpreter
+under ``python -X importtime`` and the fastest run is kept. A module fails
+when its cumulative import time is over ``--budget-ms`` (or more than
+``--tolerance`` above its time in a ``--baseline`` file written earlier with
+``--write-baseline``), or when importing it pulled in one of the heavy
+modules in ``--forbid``, which must load only when a backend or the event
+loop is first used. Prints one JSON line per module with its slowest
+imports and exits with status 1 if any module failed.
+
+    python benchmark_imports.py --budget-ms 150
+    python benchmark_imports.py --write-baseline import_baseline.json
+    python benchmark_imports.py --baseline import_baseline.json --tolerance 0.25
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+DEFAULT_MODULES = ["database_query", "ai_clients", "prompttemplate", "QueryCache", "SchemaStore"]
+DEFAULT_FORBIDDEN = ["openai", "mysql", "pyodbc", "numpy", "pandas", "asyncio", "ssl", "sqlite3",
+                     "logging.handlers"]
+
+
+def import_times(module: str) -> dict:
+    """{imported module: (self µs, cumulative µs)} for one import of ``module`` in a fresh interpreter."""
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                               cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{completed.stderr.strip()}")
+    times = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        times[name.strip()] = (int(own), int(cumulative))
+    return times
+
+
+def measure(module: str, repeat: int, forbidden, top: int) -> dict:
+    best = None
+    for _ in range(repeat):
+        times = import_times(module)
+        if best is None or times[module][1] < best[module][1]:
+            best = times
+    slowest = sorted(best.items(), key=lambda item: item[1][0], reverse=True)[:top]
+    return {
+        "module": module,
+        "total_ms": round(best[module][1] / 1000, 2),
+        "modules_imported": len(best),
+        "forbidden_imported": [name for name in forbidden if name in best],
+        "slowest_self_ms": {name: round(own / 1000, 2) for name, (own, _) in slowest},
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--modules", nargs="+", default=DEFAULT_MODULES)
+    parser.add_argument("--repeat", type=int, default=5, help="imports per module; the fastest counts")
+    parser.add_argument("--budget-ms", type=float, default=150.0, help="cumulative import time allowed per module")
+    parser.add_argument("--forbid", nargs="*", default=DEFAULT_FORBIDDEN,
+                        help="modules that must not be imported eagerly")
+    parser.add_argument("--baseline", help="JSON file of {module: total_ms} to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed slowdown over the baseline, as a fraction")
+    parser.add_argument("--write-baseline", help="write the measured {module: total_ms} to this file")
+    parser.add_argument("--top", type=int, default=5, help="slowest imports to report per module")
+    args = parser.parse_args(argv)
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    failed, totals = False, {}
+    for module in args.modules:
+        result = measure(module, args.repeat, args.forbid, args.top)
+        totals[module] = result["total_ms"]
+        limit = args.budget_ms
+        if module in baseline:
+            limit = min(limit, baseline[module] * (1 + args.tolerance))
+        result["limit_ms"] = round(limit, 2)
+        result["ok"] = result["total_ms"] <= limit and not result["forbidden_imported"]
+        failed = failed or not result["ok"]
+        print(json.dumps(result))
+        sys.stdout.flush()
+    if args.write_baseline:
+        with open(args.write_baseline, "w") as f:
+            json.dump(totals, f, indent=2)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+"""
+Offline throughput benchmark of the generate -> validate -> execute pipeline.
+
+Nothing external is needed: the LLM is a MockClient answering with
+deterministic SQL after a configurable latency, schema introspection is
+served by benchmark_schema's simulated MySQL connection (``--rtt-ms`` per
+round trip) and generated queries run against a SQLite database holding the
+same synthetic tables. Every combination of ``--sizes``, ``--concurrency``
+and ``--repeat-ratios`` runs on a fresh AIDatabaseQuery and prints one JSON
+line with requests/s, p50/p95/p99 end-to-end latency, cache hit ratio,
+schema fetch time, peak traced memory and per-stage histograms; ``--output``
+also writes them all to a file for comparing runs.
+
+    python benchmark_pipeline.py --sizes 50 1000 --concurrency 1 8 32 --repeat-ratios 0 0.5 0.9
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import re
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+from Metrics import metrics
+from ai_clients import MockClient
+from benchmark_schema import SimulatedConnection, synthetic_schema
+from ConnectionPool import ConnectionPool
+from SchemaGenerator import SchemaGenerator
+from SchemaStore import SchemaStore
+from database_query import AIDatabaseQuery
+from logging_config import setup_logging
+
+_TABLE = re.compile(r"table_(\d{5})")
+
+
+class SQLiteConnection:
+    """Gives a sqlite3 connection the ``cursor(buffered=...)`` signature ResultStream uses."""
+
+    def __init__(self, path: str):
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+
+    def cursor(self, buffered=None):
+        return self.conn.cursor()
+
+    def rollback(self):
+        self.conn.rollback()
+
+    def close(self):
+        self.conn.close()
+
+
+def create_sqlite_database(path: str, n_tables: int, rows_per_table: int):
+    """Creates the synthetic tables in ``path`` with ``rows_per_table`` rows each."""
+    tables, _ = synthetic_schema(n_tables)
+    conn = sqlite3.connect(path)
+    for name, columns in tables.items():
+        conn.execute(f"CREATE TABLE {name} ({', '.join(c for c, _, _, _ in columns)})")
+        conn.execute(f"CREATE INDEX idx_{name}_col_1 ON {name} (col_1)")
+        rows = []
+        for i in range(rows_per_table):
+            row = [i]
+            for j, (_, column_type, _, _) in enumerate(columns[1:], start=1):
+                if column_type == "datetime":
+                    row.append(f"{2015 + i % 10}-{1 + i % 12:02d}-01 00:00:00")
+                elif column_type == "int":
+                    row.append(i // 2)
+                else:
+                    row.append(f"v{(i * j) % 50}")
+            rows.append(row)
+        conn.executemany(f"INSERT INTO {name} VALUES ({', '.join('?' * len(columns))})", rows)
+    conn.commit()
+    conn.close()
+
+
+def question(index: int, n_tables: int, rng: random.Random) -> str:
+    """A distinct request; the numbers in it keep fuzzy cache matching from merging two requests."""
+    table = rng.randrange(n_tables)
+    value = index % 50
+    kind = index % 3 if table else index % 2
+    if kind == 0:
+        return f"list table_{table:05d} rows where col_1 is v{value} ({index})"
+    if kind == 1:
+        return f"count table_{table:05d} rows per col_3 since {2015 + value % 10} ({index})"
+    return f"show table_{table:05d} rows with their parent col_1 v{value} ({index})"
+
+
+def respond(prompt: str) -> str:
+    """MockClient responder; the request precedes the schema in the prompt, so its table is found first."""
+    table = int(_TABLE.search(prompt).group(1))
+    name = f"table_{table:05d}"
+    since = re.search(r"since (\d{4})", prompt)
+    if since:
+        return (f"```sql\nSELECT col_3, COUNT(*) AS n FROM {name} "
+                f"WHERE col_2 >= '{since.group(1)}-01-01' GROUP BY col_3;\n```")
+    value = re.search(r"\bv(\d+)\b", prompt).group(1)
+    if "with their parent" in prompt:
+        parent = f"table_{(table - 1) // 2:05d}"
+        return (f"SELECT c.*, p.col_1 AS parent_col_1 FROM {name} c JOIN {parent} p "
+                f"ON c.{parent}_id = p.{parent}_id WHERE p.col_1 = 'v{value}';")
+    return f"SELECT * FROM {name} WHERE col_1 = 'v{value}';"
+
+
+def workload(n_tables: int, requests: int, repeat_ratio: float, seed: int):
+    """``requests`` questions of which about ``repeat_ratio`` repeat an earlier one verbatim."""
+    rng = random.Random(seed)
+    distinct, items = [], []
+    for _ in range(requests):
+        if distinct and rng.random() < repeat_ratio:
+            items.append(rng.choice(distinct))
+        else:
+            distinct.append(question(len(distinct), n_tables, rng))
+            items.append(distinct[-1])
+    return items
+
+
+def _percentile(values, q: float):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def run(n_tables: int, concurrency: int, repeat_ratio: float, args, sqlite_path: str) -> dict:
+    schema_pool = ConnectionPool(lambda: SimulatedConnection(n_tables, args.rtt_ms / 1000.0),
+                                 name=f"synthetic-{n_tables}")
+    store = SchemaStore(ttl=3600, generator_factory=lambda: SchemaGenerator(pool=schema_pool))
+    pool = ConnectionPool(lambda: SQLiteConnection(sqlite_path), size=concurrency, name=f"sqlite-{n_tables}")
+    client = MockClient(respond, latency=args.llm_latency_ms / 1000.0, jitter=args.llm_jitter_ms / 1000.0)
+    db = AIDatabaseQuery(None, None, client, cache_size=args.cache_size, rate_limit=10 ** 9,
+                         mysql_pool=pool, schema_store=store)
+    items = workload(n_tables, args.requests, repeat_ratio, args.seed)
+    metrics.reset()
+    if args.memory:
+        tracemalloc.start()
+
+    start = time.perf_counter()
+    store.get_snapshot()
+    schema_fetch = time.perf_counter() - start
+
+    def handle(text):
+        began = time.perf_counter()
+        try:
+            result = db.generate_query(text, "mysql")
+            rows = db.execute_mysql_query(result["query"], max_rows=args.max_rows, timeout_ms=None)["rows"]
+        except Exception as e:
+            return time.perf_counter() - began, None, str(e)
+        return time.perf_counter() - began, result["cache"], len(rows)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        outcomes = list(executor.map(handle, items))
+    elapsed = time.perf_counter() - start
+    peak = None
+    if args.memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    pool.close()
+
+    latencies = [latency for latency, _, _ in outcomes]
+    errors = [rows for _, cache, rows in outcomes if isinstance(rows, str)]
+    hits = sum(1 for _, cache, _ in outcomes if cache and cache["match"] != "inflight")
+    coalesced = sum(1 for _, cache, _ in outcomes if cache and cache["match"] == "inflight")
+    snapshot = metrics.snapshot()
+    return {
+        "tables": n_tables,
+        "concurrency": concurrency,
+        "repeat_ratio": repeat_ratio,
+        "requests": len(items),
+        "distinct_requests": len(set(items)),
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+        "seconds": round(elapsed, 4),
+        "requests_per_second": round(len(items) / elapsed, 2),
+        "latency_p50_ms": round(_percentile(latencies, 0.50) * 1000, 3),
+        "latency_p95_ms": round(_percentile(latencies, 0.95) * 1000, 3),
+        "latency_p99_ms": round(_percentile(latencies, 0.99) * 1000, 3),
+        "cache_hit_ratio": round(hits / len(items), 4),
+        "coalesced_ratio": round(coalesced / len(items), 4),
+        "llm_calls": snapshot["counters"].get("llm_calls", {}).get("", 0),
+        "schema_fetch_seconds": round(schema_fetch, 4),
+        "peak_memory_bytes": peak,
+        "stages": {stage: {"count": h["count"], "mean_ms": round(h["sum"] / h["count"] * 1000, 3),
+                           "p50_ms": h["p50"] and h["p50"] * 1000, "p95_ms": h["p95"] and h["p95"] * 1000}
+                   for stage, h in snapshot["stages"].items()},
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 1000], help="tables in the synthetic schema")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--repeat-ratios", type=float, nargs="+", default=[0.0, 0.5, 0.9],
+                        help="fraction of requests that repeat an earlier request")
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario")
+    parser.add_argument("--llm-latency-ms", type=float, default=50.0)
+    parser.add_argument("--llm-jitter-ms", type=float, default=0.0,
+                        help="extra latency of up to this much, fixed per prompt")
+    parser.add_argument("--rtt-ms", type=float, default=0.5, help="simulated schema introspection round trip")
+    parser.add_argument("--rows-per-table", type=int, default=100)
+    parser.add_argument("--max-rows", type=int, default=1000)
+    parser.add_argument("--cache-size", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-memory", dest="memory", action="store_false",
+                        help="skip tracemalloc, which slows allocation-heavy code")
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--output", help="also write the run configuration and all results to this JSON file")
+    args = parser.parse_args(argv)
+
+    setup_logging(level=args.log_level)
+    metrics.enable()
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for n_tables in args.sizes:
+            sqlite_path = os.path.join(tmp, f"bench_{n_tables}.db")
+            create_sqlite_database(sqlite_path, n_tables, args.rows_per_table)
+            for concurrency in args.concurrency:
+                for repeat_ratio in args.repeat_ratios:
+                    result = run(n_tables, concurrency, repeat_ratio, args, sqlite_path)
+                    results.append(result)
+                    print(json.dumps(result))
+                    sys.stdout.flush()
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"config": vars(args), "python": platform.python_version(),
+                       "started": time.strftime("%Y-%m-%dT%H:%M:%S"), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+Timing comparison of the per-table and bulk schema introspection paths.
+
+By default the synthetic schemas are served by an in-process stand-in for a
+MySQL connection that answers both SHOW/DESCRIBE and INFORMATION_SCHEMA
+queries and charges a fixed latency per round trip (``--rtt-ms``). With
+``--live`` the synthetic tables are created in a scratch database on the
+server configured through the usual MYSQL_* variables and dropped afterwards.
+
+    python benchmark_schema.py --sizes 10 500 5000 --rtt-ms 0.5
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+from SchemaGenerator import SchemaGenerator
+from logging_config import setup_logging
+
+
+def synthetic_schema(n_tables: int, columns_per_table: int = 8):
+    """Returns {table: [(column, type, nullable, key)]} plus FK rows."""
+    tables, foreign_keys = {}, []
+    for i in range(n_tables):
+        name = f"table_{i:05d}"
+        columns = [(f"{name}_id", "int", "NO", "PRI")]
+        for j in range(1, columns_per_table):
+            columns.append((f"col_{j}", "varchar(64)" if j % 2 else "datetime", "YES", "MUL" if j == 1 else ""))
+        if i:
+            parent = f"table_{(i - 1) // 2:05d}"
+            columns.append((f"{parent}_id", "int", "YES", "MUL"))
+            foreign_keys.append((name, f"{parent}_id", f"fk_{name}", parent, f"{parent}_id"))
+        tables[name] = columns
+    return tables, foreign_keys
+
+
+class SimulatedCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.rows = []
+
+    def execute(self, sql, params=()):
+        self.conn.round_trips += 1
+        time.sleep(self.conn.rtt)
+        tables, fks = self.conn.tables, self.conn.foreign_keys
+        wanted = set(params) if "TABLE_NAME IN" in sql else None
+
+        def keep(table):
+            return wanted is None or table in wanted
+
+        if sql.startswith("SHOW TABLES"):
+            self.rows = [(t,) for t in tables]
+        elif sql.startswith("DESCRIBE"):
+            table = re.search(r"`(.+?)`", sql).group(1)
+            self.rows = [(c, t, n, k, None, "") for c, t, n, k in tables[table]]
+        elif sql.startswith("SHOW KEYS"):
+            table = re.search(r"`(.+?)`", sql).group(1)
+            self.rows = self._keys(table)
+        elif "CRC32" in sql:  # fetch_table_versions
+            # (table, CREATE_TIME, column, index and foreign key checksums)
+            self.rows = [(t, None, len(cols), len(self._keys(t)), sum(fk[0] == t for fk in fks))
+                         for t, cols in tables.items()]
+        elif "INFORMATION_SCHEMA.KEY_COLUMN_USAGE" in sql:
+            self.rows = [fk for fk in fks if keep(fk[0])]
+        elif "INFORMATION_SCHEMA.COLUMNS" in sql:
+            self.rows = [(t, c, ty, n) for t, cols in tables.items() if keep(t) for c, ty, n, _ in cols]
+        elif "INFORMATION_SCHEMA.STATISTICS" in sql:
+            self.rows = [(t, row[2], row[1], row[4]) for t in tables if keep(t) for row in self._keys(t)]
+        elif "INFORMATION_SCHEMA.TABLES" in sql:
+            self.rows = [(t,) for t in tables if keep(t)]
+        else:
+            raise ValueError(f"Unsupported statement: {sql[:40]}")
+
+    def _keys(self, table):
+        rows = []
+        for column, _, _, key in self.conn.tables[table]:
+            if key == "PRI":
+                rows.append((table, 0, "PRIMARY", 1, column))
+            elif key == "MUL":
+                rows.append((table, 1, f"idx_{column}", 1, column))
+        return rows
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+
+class SimulatedConnection:
+    def __init__(self, n_tables: int, rtt: float):
+        self.tables, self.foreign_keys = synthetic_schema(n_tables)
+        self.rtt = rtt
+        self.round_trips = 0
+
+    def cursor(self):
+        return SimulatedCursor(self)
+
+
+def create_live_schema(n_tables: int):
+    import mysql.connector
+
+    database = f"qg_bench_{n_tables}"
+    config = SchemaGenerator().db_config
+    config["database"] = None
+    conn = mysql.connector.connect(**config)
+    cursor = conn.cursor()
+    cursor.execute(f"DROP DATABASE IF EXISTS `{database}`")
+    cursor.execute(f"CREATE DATABASE `{database}`")
+    cursor.execute(f"USE `{database}`")
+    tables, foreign_keys = synthetic_schema(n_tables)
+    parents = {fk[0]: fk[3] for fk in foreign_keys}
+    for name, columns in tables.items():
+        defs = [f"`{c}` {t} {'NULL' if n == 'YES' else 'NOT NULL'}" for c, t, n, _ in columns]
+        defs.append(f"PRIMARY KEY (`{columns[0][0]}`)")
+        defs.append("KEY `idx_col_1` (`col_1`)")
+        if name in parents:
+            parent = parents[name]
+            defs.append(f"FOREIGN KEY (`{parent}_id`) REFERENCES `{parent}` (`{parent}_id`)")
+        cursor.execute(f"CREATE TABLE `{name}` ({', '.join(defs)})")
+    cursor.close()
+    return conn, database
+
+
+def run(n_tables: int, rtt: float, live: bool):
+    results = {"tables": n_tables}
+    outputs = {}
+    for label, bulk in (("per_table", False), ("bulk", True)):
+        generator = SchemaGenerator()
+        if live:
+            conn, database = create_live_schema(n_tables)
+            generator.mysql_conn = conn
+        else:
+            generator.mysql_conn = conn = SimulatedConnection(n_tables, rtt)
+        start = time.perf_counter()
+        outputs[label] = generator.fetch_schema(bulk=bulk)
+        results[f"{label}_seconds"] = round(time.perf_counter() - start, 4)
+        if not live:
+            results[f"{label}_round_trips"] = conn.round_trips
+        else:
+            cursor = conn.cursor()
+            cursor.execute(f"DROP DATABASE `{database}`")
+            cursor.close()
+            conn.close()
+    results["same_result"] = outputs["per_table"] == outputs["bulk"]
+    results["speedup"] = round(results["per_table_seconds"] / max(results["bulk_seconds"], 1e-9), 1)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 500, 5000])
+    parser.add_argument("--rtt-ms", type=float, default=0.5,
+                        help="simulated round-trip latency in milliseconds")
+    parser.add_argument("--live", action="store_true",
+                        help="create the synthetic schemas on the configured MySQL server")
+    args = parser.parse_args(argv)
+    if args.live and not os.getenv("MYSQL_HOST"):
+        parser.error("--live needs MYSQL_HOST and credentials in the environment")
+    setup_logging()
+    for n in args.sizes:
+        print(json.dumps(run(n, args.rtt_ms / 1000.0, args.live)))
+        sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
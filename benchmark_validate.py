@@ -0,0 +1,81 @@
+"""
+Microbenchmark of QueryOptimizer.validate against the original substring check.
+
+Runs both validators over a corpus of generated-style queries and reports
+per-call time for the original check, the tokenizer with a cold cache and
+with a warm cache, plus the verdicts where the two disagree (the original
+rejects columns such as IsDeleted; the tokenizer rejects writes it missed).
+
+    python benchmark_validate.py --repeat 2000
+"""
+import argparse
+import json
+import logging
+import time
+
+from QueryOptimizer import QueryOptimizer
+from SQLTokenizer import analyze
+from logging_config import setup_logging
+
+CORPUS = [
+    "SELECT CustomerID, Name FROM Sales_Customer WHERE IsDeleted = 0 LIMIT 10;",
+    "SELECT p.Name, p.AlteredDate FROM Production_Product p WHERE p.DroppedFlag = 0;",
+    "```sql\nSELECT e.JobTitle, COUNT(*) AS n\nFROM HumanResources_Employee e\nGROUP BY e.JobTitle\n"
+    "ORDER BY n DESC\nLIMIT 5;\n```;",
+    "WITH recent AS (SELECT SalesOrderID, OrderDate FROM Sales_SalesOrderHeader "
+    "WHERE OrderDate >= '2014-01-01') SELECT COUNT(*) FROM recent;",
+    "SELECT Name FROM Production_Product WHERE Name LIKE '%drop table%' -- DELETE nothing\n;",
+    "SELECT SUM(TotalDue) /* revoke? no */ FROM Sales_SalesOrderHeader WHERE Status = 5;",
+    "DELETE FROM Sales_Customer WHERE CustomerID = 1;",
+    "SELECT 1; DROP TABLE Sales_Customer;",
+    "INSERT INTO Sales_Customer (Name) VALUES ('x');",
+    "SELECT * INTO OUTFILE '/tmp/customers.csv' FROM Sales_Customer;",
+    "UPDATE Production_Product SET ListPrice = 0;",
+]
+
+
+def legacy_validate(query: str, prohibited=("DROP", "DELETE", "TRUNCATE", "GRANT", "REVOKE", "ALTER")) -> bool:
+    """The substring check QueryOptimizer.validate used before the tokenizer."""
+    for pattern in prohibited:
+        if pattern in query.upper():
+            return False
+    return True
+
+
+def per_call_us(func, queries, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for query in queries:
+            func(query)
+    return (time.perf_counter() - start) / (repeat * len(queries)) * 1e6
+
+
+def run(repeat: int) -> dict:
+    optimizer = QueryOptimizer()
+    # Distinct texts defeat the per-query cache, so this measures tokenizing itself.
+    cold = [f"{query} -- {i}" for i in range(repeat) for query in CORPUS]
+    analyze.cache_clear()
+    results = {
+        "queries": len(CORPUS),
+        "legacy_us": round(per_call_us(legacy_validate, CORPUS, repeat), 2),
+        "tokenizer_cold_us": round(per_call_us(optimizer.check, cold, 1), 2),
+        "tokenizer_warm_us": round(per_call_us(optimizer.check, CORPUS, repeat), 2),
+    }
+    results["disagreements"] = [
+        {"query": query, "legacy": legacy_validate(query), "tokenizer": optimizer.check(query) or "allowed"}
+        for query in CORPUS if legacy_validate(query) != (optimizer.check(query) is None)
+    ]
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=2000, help="passes over the corpus")
+    args = parser.parse_args(argv)
+    setup_logging()
+    logging.disable(logging.INFO)
+    print(json.dumps(run(args.repeat), indent=2))
+
+
+if __name__ == "__main__":
+    main()
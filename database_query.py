@@ -1,17 +1,23 @@
 import os
-import re
-import json
 import logging
-import mysql.connector
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional
+from ConnectionPool import ConnectionPool, get_mysql_pool
+from ResultStream import ResultStream
+from db_backends import DatabaseBackend, get_backend, get_dialect, looks_like_dsn
 from ai_clients import AIClient
 from RateLimiter import RateLimiter
-from SchemaGenerator import SchemaGenerator
+from SchemaStore import SchemaStore
+from SchemaManager import SchemaManager, estimate_tokens
 from QueryCache import QueryCache
 from QueryOptimizer import QueryOptimizer
-from prompttemplate import MySQLPromptTemplate, MSSQLPromptTemplate, PostgreSQLPromptTemplate
-from logging_config import setup_logging
+from ExampleStore import ExampleStore
+from Metrics import metrics
+from PlanGuard import PlanGuard, PlanRejected
+from prompttemplate import get_prompt_template
+from logging_config import log_query_record
 
-setup_logging()
 logger = logging.getLogger(__name__)
 
 class AIDatabaseQuery:
@@ -19,56 +25,310 @@ class AIDatabaseQuery:
     Main class handling SQL generation and execution.
     """
     def __init__(self, mysql_conn_str: str, mssql_conn_str: str, ai_client: AIClient,
-                 cache_size: int = 100, rate_limit: int = 30):
+                 cache_size: int = 100, rate_limit: int = 30, schema_ttl: Optional[float] = None,
+                 schema_token_budget: int = 1500, cache_path: Optional[str] = None,
+                 mysql_pool: Optional[ConnectionPool] = None, tokens_per_minute: Optional[int] = None,
+                 plan_guard: Optional[PlanGuard] = None, plan_retries: int = 1,
+                 schema_store: Optional[SchemaStore] = None, example_store: Optional[ExampleStore] = None,
+                 examples_k: int = 3, example_token_budget: int = 400,
+                 backends: Optional[Dict[str, DatabaseBackend]] = None):
         self.mysql_conn_str = mysql_conn_str
         self.mssql_conn_str = mssql_conn_str
         self.ai_client = ai_client
-        self.query_cache = QueryCache(cache_size)
-        self.rate_limiter = RateLimiter(rate_limit)
+        cache_path = cache_path or os.getenv("QUERY_CACHE_PATH")
+        l2 = None
+        if cache_path:
+            from SQLiteCacheStore import SQLiteCacheStore
+            l2 = SQLiteCacheStore(cache_path)
+            # Expiry and the max_entries/max_bytes bounds are applied by compaction only.
+            l2.start_compaction(float(os.getenv("QUERY_CACHE_COMPACT_INTERVAL", 600)))
+        self.query_cache = QueryCache(cache_size, l2=l2)
+        tokens_per_minute = tokens_per_minute or int(os.getenv("LLM_TOKENS_PER_MINUTE", 0)) or None
+        self.rate_limiter = RateLimiter(rate_limit, tokens_per_minute=tokens_per_minute)
         self.optimizer = QueryOptimizer()
-        self.mysql_conn = None
+        backends = dict(backends or {})
+        if "mysql" in backends:
+            schema_store = schema_store or backends["mysql"].schema_store
+            mysql_pool = mysql_pool or backends["mysql"].pool
+        self.schema_store = schema_store or SchemaStore.shared(ttl=schema_ttl)
+        self.schema_token_budget = schema_token_budget
+        self._schema_managers = {}  # schema store -> SchemaManager of its current snapshot
+        self._schema_manager_lock = threading.Lock()
+        self.schema_store.add_listener(self._on_schema_change)
+        self.mysql_pool = mysql_pool or get_mysql_pool()
+        backends.setdefault("mysql", DatabaseBackend("mysql", pool=self.mysql_pool, schema_store=self.schema_store))
+        if "mssql" not in backends and looks_like_dsn(mssql_conn_str):
+            backends["mssql"] = get_backend("mssql", mssql_conn_str)
+        self.backends: Dict[str, DatabaseBackend] = {}
+        self._backends_lock = threading.Lock()
+        for name, backend in backends.items():
+            self._attach_backend(get_dialect(name).name, backend)
+        if plan_guard is None and os.getenv("PLAN_GUARD", "").lower() in ("1", "true", "yes"):
+            plan_guard = PlanGuard(self.mysql_pool)
+        self.plan_guard = plan_guard
+        self.plan_retries = plan_retries
+        if example_store is None and os.getenv("EXAMPLE_STORE_PATH"):
+            example_store = ExampleStore(os.getenv("EXAMPLE_STORE_PATH"))
+        self.example_store = example_store
+        self.examples_k = examples_k
+        self.example_token_budget = example_token_budget
         self.mssql_conn = None
+        self._inflight = {}  # (cache key, max_tokens) -> Future of the generation in progress
+        self._inflight_lock = threading.Lock()
         logger.info("AIDatabaseQuery initialized.")
 
     def connect_mysql(self):
+        """Verifies that the shared pool can reach MySQL; queries borrow pooled connections."""
         try:
-            self.mysql_conn = mysql.connector.connect(
-                host=os.getenv('MYSQL_HOST'),
-                port=os.getenv('MYSQL_PORT'),
-                user=os.getenv('MYSQL_USER'),
-                password=os.getenv('MYSQL_PASSWORD'),
-                database=os.getenv('MYSQL_DATABASE')
-            )
-            logger.info("Connected to MySQL database.")
+            with self.mysql_pool.connection():
+                logger.info("Connected to MySQL database.")
         except Exception as e:
             logger.error("Failed to connect to MySQL: %s", str(e))
             raise
 
-    def execute_mysql_query(self, query: str):
+    def _attach_backend(self, name: str, backend: DatabaseBackend) -> None:
+        self.backends[name] = backend
+        if backend.schema_store is not self.schema_store:
+            backend.schema_store.add_listener(self._on_schema_change)
+
+    def backend(self, db_type: str) -> DatabaseBackend:
+        """
+        The backend serving ``db_type``: one passed in, or the process-wide
+        one for the dialect's environment variable (POSTGRES_DSN, MSSQL_CONN_STR,
+        SQLITE_PATH), attached on first use. Raises ValueError if neither exists.
+        """
+        name = get_dialect(db_type).name
+        backend = self.backends.get(name)
+        if backend is None:
+            with self._backends_lock:
+                backend = self.backends.get(name)
+                if backend is None:
+                    backend = get_backend(name)
+                    self._attach_backend(name, backend)
+        return backend
+
+    def _schema_store_for(self, db_type: str) -> SchemaStore:
+        # Dialects without a database of their own generate against the default (MySQL) schema.
+        try:
+            return self.backend(db_type).schema_store
+        except ValueError:
+            return self.schema_store
+
+    def stream_query(self, query: str, db_type: str = "mysql", batch_size: int = 1000,
+                     max_rows: Optional[int] = 100000, max_bytes: Optional[int] = 64 * 1024 * 1024,
+                     timeout_ms: Optional[int] = 30000, guard: bool = True) -> ResultStream:
+        """
+        Returns a ResultStream that reads the query result in batches from the
+        ``db_type`` backend's pool, bounded by ``max_rows``/``max_bytes`` and
+        the dialect's statement timeout. Extracts SQL from a markdown code
+        block if present. On MySQL with a plan guard, raises PlanRejected for
+        queries whose plan is too expensive (cached plans make this free for
+        generated queries, which were checked when they were generated).
+        The outcome is logged and reported to the example store once the
+        stream has been read to the end or failed.
+        """
+        backend = self.backend(db_type)
+        if guard and self.plan_guard is not None and backend.dialect.name == "mysql":
+            snapshot = backend.schema_store.peek()
+            self.plan_guard.check(query, snapshot.schema if snapshot is not None else None)
+        return ResultStream(backend.pool, query, batch_size=batch_size, max_rows=max_rows,
+                            max_bytes=max_bytes, timeout_ms=timeout_ms, dialect=backend.dialect,
+                            on_complete=lambda stream, error: self._stream_finished(db_type, stream, error))
+
+    def _stream_finished(self, db_type: str, stream: ResultStream, error: Optional[Exception]) -> None:
+        if error is None:
+            logger.info("Query returned %d rows%s", stream.row_count, " (truncated)" if stream.truncated else "")
+        else:
+            logger.error("Failed to execute %s query: %s", db_type, str(error))
+        if self.example_store is not None:
+            self.example_store.record_execution(stream.sql, error is None,
+                                                stream.elapsed if error is None else None)
+
+    def stream_mysql_query(self, query: str, batch_size: int = 1000, max_rows: Optional[int] = 100000,
+                           max_bytes: Optional[int] = 64 * 1024 * 1024,
+                           timeout_ms: Optional[int] = 30000, guard: bool = True) -> ResultStream:
+        """stream_query on the MySQL database."""
+        return self.stream_query(query, "mysql", batch_size=batch_size, max_rows=max_rows,
+                                 max_bytes=max_bytes, timeout_ms=timeout_ms, guard=guard)
+
+    @metrics.timed("execute")
+    def execute_query(self, query: str, db_type: str = "mysql", max_rows: Optional[int] = 10000,
+                      max_bytes: Optional[int] = 64 * 1024 * 1024, timeout_ms: Optional[int] = 30000) -> dict:
         """
-        Executes a query on the MySQL database.
+        Executes a query on the ``db_type`` database.
         Extracts SQL from a markdown code block if present.
+        Returns a dictionary with keys "columns", "rows" (at most ``max_rows``)
+        and "truncated".
         """
-        if not self.mysql_conn:
-            self.connect_mysql()
         try:
-            match = re.search(r"```sql\s*(.*?)\s*```", query, re.DOTALL | re.IGNORECASE)
-            if match:
-                sql_code = match.group(1).strip()
-            else:
-                sql_code = query.strip()
-            logger.info("Executing SQL query: %s", sql_code)
-            cursor = self.mysql_conn.cursor()
-            cursor.execute(sql_code)
-            rows = cursor.fetchall()
-            for row in rows:
-                print(row)
-            cursor.close()
+            stream = self.stream_query(query, db_type, max_rows=max_rows, max_bytes=max_bytes,
+                                       timeout_ms=timeout_ms)
         except Exception as e:
-            logger.error("Failed to execute MySQL query: %s", str(e))
+            # Rejected before it ran; the stream reports the outcome of a query that did.
+            logger.error("Failed to execute %s query: %s", db_type, str(e))
             raise
+        with stream:
+            rows = stream.fetchall()
+        return {"columns": stream.columns, "rows": rows, "truncated": stream.truncated}
+
+    def execute_mysql_query(self, query: str, max_rows: Optional[int] = 10000,
+                            max_bytes: Optional[int] = 64 * 1024 * 1024,
+                            timeout_ms: Optional[int] = 30000) -> dict:
+        """execute_query on the MySQL database."""
+        return self.execute_query(query, "mysql", max_rows=max_rows, max_bytes=max_bytes, timeout_ms=timeout_ms)
+
+    def _on_schema_change(self, changed_tables, removed_tables):
+        # Drop only the cached queries that touch the changed tables; the rest stay warm.
+        self.query_cache.invalidate_tables(list(changed_tables) + list(removed_tables))
+        if self.plan_guard is not None:
+            self.plan_guard.clear()
+
+    def get_schema_manager(self, db_type: str = "mysql") -> SchemaManager:
+        """Returns a SchemaManager for the current snapshot, rebuilding its index only when the schema changed."""
+        store = self._schema_store_for(db_type)
+        schema_config = store.get_schema()
+        manager = self._schema_managers.get(store)
+        if manager is None or manager.full_schema is not schema_config:
+            # One thread builds the index; concurrent first requests wait for it instead of building their own.
+            with self._schema_manager_lock:
+                manager = self._schema_managers.get(store)
+                if manager is None or manager.full_schema is not schema_config:
+                    manager = SchemaManager(schema_config, token_budget=self.schema_token_budget)
+                    self._schema_managers[store] = manager
+        return manager
+
+    def warm_cache(self, log_path: str = "application.log", limit: Optional[int] = None) -> int:
+        """
+        Preloads the query cache with the queries an ``application.log``
+        recorded, streaming the file. Later entries for the same request win.
+        Queries that failed to execute, fail validation or reference no table
+        of the current schema are skipped. Returns the number of entries loaded.
+        """
+        from log_history import iter_query_pairs
+        schemas = {}  # db_type -> (snapshot, schema manager)
+        loaded = skipped = 0
+        for pair in iter_query_pairs(log_path):
+            if limit is not None and loaded >= limit:
+                break
+            if pair.executed is False:
+                skipped += 1
+                continue
+            if pair.db_type not in schemas:
+                schemas[pair.db_type] = (self._schema_store_for(pair.db_type).get_snapshot(),
+                                         self.get_schema_manager(pair.db_type))
+            snapshot, schema_manager = schemas[pair.db_type]
+            query = self.optimizer.rewrite(pair.sql, pair.db_type, snapshot.schema).sql
+            references = schema_manager.find_references(query)
+            if not references or self.optimizer.check(query, pair.db_type) is not None:
+                skipped += 1
+                continue
+            self.query_cache.set(pair.question, pair.db_type, query, schema_fingerprint=snapshot.fingerprint,
+                                 references=references, schema_versions=snapshot.versions)
+            loaded += 1
+        logger.info("Preloaded %d cached queries from %s (%d skipped)", loaded, log_path, skipped)
+        return loaded
+
+    def _lookup_cache(self, user_input: str, db_type: str, snapshot) -> Optional[dict]:
+        # Exact and normalized matches only: a similar prompt can differ in a value that changes the SQL.
+        cached = self.query_cache.lookup(user_input, db_type, snapshot.fingerprint, snapshot.versions, fuzzy=False)
+        if not cached:
+            return None
+        logger.info("Returning cached query (%s match, confidence %.2f)", cached["match"], cached["confidence"])
+        # For simplicity, assume cached queries have no latency/usage metrics.
+        return {"query": cached["query"], "latency": None, "usage": None, "ttft": None, "rewrites": [],
+                "cache": {"match": cached["match"], "confidence": cached["confidence"],
+                          "matched_input": cached["matched_input"]}}
+
+    def _build_prompt(self, user_input: str, db_type: str):
+        """Returns (system prompt, user prompt, schema manager) for an uncached request."""
+        with metrics.timer("prompt_build"):
+            prompt_template = get_prompt_template(db_type)
+            schema_manager = self.get_schema_manager(db_type)
+            examples = ""
+            if self.example_store is not None:
+                examples = self.example_store.format(self.example_store.select(
+                    user_input, db_type, k=self.examples_k, token_budget=self.example_token_budget))
+            # Examples show the relevant tables in use, so they take part of the schema budget.
+            budget = max(self.schema_token_budget - estimate_tokens(examples), self.schema_token_budget // 2) \
+                if examples else self.schema_token_budget
+            schema_str = schema_manager.get_context(user_input, token_budget=budget)
+            user_prompt = prompt_template.user_prompt(user_input, schema_str, examples)
+            return prompt_template.system_prompt(), user_prompt, schema_manager
+
+    def _finish_query(self, user_input: str, db_type: str, result: dict, snapshot,
+                      schema_manager: SchemaManager) -> dict:
+        """Optimizes, validates and (with a plan guard) EXPLAIN-checks the generated query, then caches it."""
+        with metrics.timer("validate"):
+            rewritten = self.optimizer.rewrite(result["query"], db_type, snapshot.schema)
+            optimized_query = rewritten.sql
+            reason = self.optimizer.check(optimized_query, db_type)
+        if reason is not None:
+            metrics.incr("validation_rejects")
+            logger.warning("Query validation failed: %s", reason)
+            raise ValueError(f"Query validation failed: {reason}")
+        if self.plan_guard is not None and db_type.lower() == "mysql":
+            self.plan_guard.check(optimized_query, snapshot.schema)
+        self.query_cache.set(user_input, db_type, optimized_query,
+                             schema_fingerprint=snapshot.fingerprint,
+                             references=schema_manager.find_references(optimized_query),
+                             schema_versions=snapshot.versions)
+        if self.example_store is not None:
+            self.example_store.record(user_input, optimized_query, db_type)
+        log_query_record(logger, "Generated and optimized query: %s", optimized_query)
+        return {"query": optimized_query, "latency": result["latency"], "usage": result["usage"],
+                "ttft": result.get("ttft"), "rewrites": rewritten.rewrites, "cache": None}
+
+    def _join_inflight(self, user_input: str, db_type: str, max_tokens: int):
+        """
+        Single-flight: returns (key, future, leader). The first caller for a key
+        becomes the leader and must settle the future; concurrent callers for
+        the same key get the leader's future to wait on.
+        """
+        key = (self.query_cache.key_for(user_input, db_type), max_tokens)
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                return key, future, False
+            future = Future()
+            self._inflight[key] = future
+            return key, future, True
 
-    @RateLimiter(30)
+    def _settle_inflight(self, key, future: Future, result: Optional[dict] = None,
+                         error: Optional[Exception] = None) -> None:
+        """
+        Releases the followers of ``key``. The leader calls it in a finally, so
+        a leader stopped by a BaseException (KeyboardInterrupt, SystemExit, task
+        cancellation) with neither a result nor an error still fails them.
+        """
+        with self._inflight_lock:
+            self._inflight.pop(key, None)
+        if result is None and error is None:
+            error = RuntimeError("the in-flight query generation was interrupted")
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    @staticmethod
+    def _coalesced(result: dict, user_input: str) -> dict:
+        # Followers share the leader's query but did not spend latency or tokens of their own.
+        logger.info("Returning query from an in-flight request")
+        metrics.incr("coalesced")
+        return {"query": result["query"], "latency": None, "usage": None, "ttft": None, "rewrites": [],
+                "cache": {"match": "inflight", "confidence": 1.0, "matched_input": user_input}}
+
+    @staticmethod
+    def _regeneration_prompt(user_msg: str, query: str, rejection: PlanRejected) -> str:
+        hints = "\n".join(f"- {hint}" for hint in rejection.hints)
+        return (f"{user_msg}\n\nThis query was rejected because its plan is too expensive "
+                f"({rejection.reason}):\n{query}\nReturn a cheaper query for the same request.\n{hints}").rstrip()
+
+    @staticmethod
+    def _token_estimate(system_msg: str, user_msg: str, max_tokens: int) -> int:
+        # Reserved before the call and settled against the reported usage afterwards.
+        return estimate_tokens(system_msg) + estimate_tokens(user_msg) + max_tokens
+
+    @metrics.timed("generate")
     def generate_query(self, user_input: str, db_type: str, max_tokens: int = 150) -> dict:
         """
         Generates a query with caching and rate limiting.
@@ -76,36 +336,143 @@ class AIDatabaseQuery:
           - "query": the optimized SQL query (str)
           - "latency": latency in seconds (float)
           - "usage": token usage details (dict)
+          - "ttft": seconds until the model's first token (float)
+          - "rewrites": descriptions of the rewrites QueryOptimizer applied (list)
+          - "cache": None, or the cache "match" type, "confidence" and "matched_input"
         """
-        schema_generator = SchemaGenerator()
-        schema_config = schema_generator.get_schema()
-        schema_str = json.dumps(schema_config, indent=2)
-        #logger.info("Schema Config: %s", schema_str)
-        if cached_query := self.query_cache.get(user_input, db_type):
-            logger.info("Returning cached query")
-            # For simplicity, assume cached queries have no latency/usage metrics.
-            return {"query": cached_query, "latency": None, "usage": None}
-        if db_type.lower() == "mysql":
-            prompt_template = MySQLPromptTemplate()
-        elif db_type.lower() == "mssql":
-            prompt_template = MSSQLPromptTemplate()
-        elif db_type.lower() == "postgresql":
-            prompt_template = PostgreSQLPromptTemplate()
+        snapshot = self._schema_store_for(db_type).get_snapshot()
+        if cached := self._lookup_cache(user_input, db_type, snapshot):
+            return cached
+        key, future, leader = self._join_inflight(user_input, db_type, max_tokens)
+        if not leader:
+            return self._coalesced(future.result(), user_input)
+        result = error = None
+        try:
+            system_msg, user_msg, schema_manager = self._build_prompt(user_input, db_type)
+            for attempt in range(self.plan_retries + 1):
+                reserved = self._token_estimate(system_msg, user_msg, max_tokens)
+                self.rate_limiter.acquire(reserved)
+                metrics.incr("llm_calls")
+                with metrics.timer("llm"):
+                    generated = self.ai_client.generate_query(user_msg, max_tokens, system_prompt=system_msg)
+                self.rate_limiter.record_usage(reserved, generated.get("usage"))
+                try:
+                    result = self._finish_query(user_input, db_type, generated, snapshot, schema_manager)
+                    break
+                except PlanRejected as rejection:
+                    if attempt == self.plan_retries:
+                        raise
+                    logger.warning("Regenerating query after plan rejection: %s", rejection.reason)
+                    user_msg = self._regeneration_prompt(user_msg, generated["query"], rejection)
+        except Exception as e:
+            logger.error("Query generation failed: %s", str(e))
+            error = e
+            raise
+        finally:
+            self._settle_inflight(key, future, result, error)
+        return result
+
+    def generate_queries(self, inputs: List[str], db_type: str, max_tokens: int = 150,
+                         max_workers: int = 8) -> List[dict]:
+        """
+        Generates queries for a batch of inputs, one result per input in order.
+        Equivalent inputs are generated once and the distinct ones run
+        concurrently on at most ``max_workers`` threads. Results keep the
+        generate_query shape; an item that failed has "query" None and an
+        "error" message instead of raising.
+        """
+        keys = [self.query_cache.key_for(text, db_type) for text in inputs]
+        unique = {}
+        for key, text in zip(keys, inputs):
+            unique.setdefault(key, text)
+        if not unique:
+            return []
+        results = {}
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(unique)))) as pool:
+            futures = {key: pool.submit(self.generate_query, text, db_type, max_tokens)
+                       for key, text in unique.items()}
+            for key, future in futures.items():
+                try:
+                    results[key] = future.result()
+                except Exception as e:
+                    results[key] = {"query": None, "latency": None, "usage": None, "ttft": None,
+                                    "rewrites": [], "cache": None, "error": str(e)}
+        return [dict(results[key]) for key in keys]
+
+    @metrics.timed("generate")
+    async def agenerate_query(self, user_input: str, db_type: str, max_tokens: int = 150) -> dict:
+        """
+        Coroutine version of generate_query with the same result shape.
+
+        Only the LLM call awaits the client directly; the blocking steps (the
+        first schema load, on-disk cache I/O, building a schema index) run in
+        worker threads so the event loop keeps serving other requests.
+        """
+        import asyncio  # already loaded by the running event loop; kept out of synchronous imports
+        store = self._schema_store_for(db_type)
+        snapshot = store.peek()
+        if snapshot is None:
+            snapshot = await asyncio.to_thread(store.get_snapshot)
         else:
-            raise ValueError(f"Unsupported database type: {db_type}")
-        system_msg = prompt_template.system_prompt()
-        user_msg = prompt_template.user_prompt(user_input, schema_str)
+            snapshot = store.get_snapshot()
+        if self.query_cache.l2 is None:
+            cached = self._lookup_cache(user_input, db_type, snapshot)
+        else:
+            cached = await asyncio.to_thread(self._lookup_cache, user_input, db_type, snapshot)
+        if cached:
+            return cached
+        key, future, leader = self._join_inflight(user_input, db_type, max_tokens)
+        if not leader:
+            # Shielded: a cancelled follower must not cancel the future the leader settles.
+            return self._coalesced(await asyncio.shield(asyncio.wrap_future(future)), user_input)
+        result = error = None
         try:
-            result = self.ai_client.generate_query(user_msg, max_tokens, system_prompt=system_msg)
-            generated_query = result["query"]
-            latency = result["latency"]
-            usage = result["usage"]
-            optimized_query = self.optimizer.optimize(generated_query, db_type)
-            if not self.optimizer.validate(optimized_query):
-                raise ValueError("Query validation failed")
-            self.query_cache.set(user_input, db_type, optimized_query)
-            logger.info("Generated and optimized query: %s", optimized_query)
-            return {"query": optimized_query, "latency": latency, "usage": usage}
+            system_msg, user_msg, schema_manager = await asyncio.to_thread(self._build_prompt, user_input, db_type)
+            for attempt in range(self.plan_retries + 1):
+                reserved = self._token_estimate(system_msg, user_msg, max_tokens)
+                await self.rate_limiter.aacquire(reserved)
+                metrics.incr("llm_calls")
+                with metrics.timer("llm"):
+                    generated = await self.ai_client.agenerate_query(user_msg, max_tokens, system_prompt=system_msg)
+                self.rate_limiter.record_usage(reserved, generated.get("usage"))
+                try:
+                    if self.query_cache.l2 is None and self.plan_guard is None:
+                        result = self._finish_query(user_input, db_type, generated, snapshot, schema_manager)
+                    else:
+                        result = await asyncio.to_thread(self._finish_query, user_input, db_type, generated,
+                                                         snapshot, schema_manager)
+                    break
+                except PlanRejected as rejection:
+                    if attempt == self.plan_retries:
+                        raise
+                    logger.warning("Regenerating query after plan rejection: %s", rejection.reason)
+                    user_msg = self._regeneration_prompt(user_msg, generated["query"], rejection)
         except Exception as e:
             logger.error("Query generation failed: %s", str(e))
-            raise
\ No newline at end of file
+            error = e
+            raise
+        finally:
+            self._settle_inflight(key, future, result, error)
+        return result
+
+    async def agenerate_queries(self, inputs: List[str], db_type: str, max_tokens: int = 150,
+                                max_concurrency: int = 32) -> List[dict]:
+        """Async counterpart of generate_queries, bounded by ``max_concurrency`` in-flight generations."""
+        import asyncio
+        keys = [self.query_cache.key_for(text, db_type) for text in inputs]
+        unique = {}
+        for key, text in zip(keys, inputs):
+            unique.setdefault(key, text)
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def run(text):
+            async with semaphore:
+                try:
+                    return await self.agenerate_query(text, db_type, max_tokens)
+                except Exception as e:
+                    return {"query": None, "latency": None, "usage": None, "ttft": None,
+                            "rewrites": [], "cache": None, "error": str(e)}
+
+        done = await asyncio.gather(*(run(text) for text in unique.values()))
+        results = dict(zip(unique.keys(), done))
+        return [dict(results[key]) for key in keys]
@@ -0,0 +1,542 @@
+import os
+import re
+import time
+import logging
+import threading
+from itertools import count
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+from ConnectionPool import ConnectionPool, get_mysql_pool, mysql_config_from_env
+from SchemaGenerator import SchemaGenerator
+from SchemaStore import DEFAULT_SCHEMA_TTL, SchemaStore
+from Metrics import metrics
+from logging_config import log_payload
+
+logger = logging.getLogger(__name__)
+
+# Environment variable holding each dialect's connection string (MySQL uses the MYSQL_* variables).
+DSN_ENV = {"mssql": "MSSQL_CONN_STR", "postgresql": "POSTGRES_DSN", "sqlite": "SQLITE_PATH"}
+
+# Pauses longer than this between SQLite progress callbacks are the reader idling between batches.
+_SQLITE_IDLE_GAP = 0.1
+# A MySQL result abandoned part-way is drained after KILL QUERY; beyond this many rows the connection is dropped.
+_MYSQL_MAX_DRAIN_ROWS = 10000
+_MYSQL_QUERY_INTERRUPTED = 1317
+_cursor_ids = count(1)
+
+
+class Dialect:
+    """
+    Stateless per-dialect behaviour: how to connect, how to open a streaming
+    cursor with a statement timeout, and (except for MySQL, which keeps
+    SchemaGenerator) one catalog query that returns every table's columns,
+    keys, indexes and foreign keys in a single round trip.
+
+    ``CATALOG_SQL`` yields rows of (kind, table_name, column_name, detail,
+    flag, ordinal) where kind is 'C' (column: detail is the type, flag
+    'YES'/'NO' for nullable), 'I' (index key: detail is the index name, flag
+    'P' primary, 'U' unique or 'N') or 'F' (foreign key: detail is the
+    referenced table and flag the referenced column). ``VERSIONS_SQL`` yields
+    (table, version) where the version changes with the table's definition,
+    its indexes or its foreign keys.
+    """
+
+    name = ""
+    placeholder = "%s"
+    # Server-side cursors that describe their result only once rows are fetched.
+    describes_on_fetch = False
+    CATALOG_SQL = ""
+    VERSIONS_SQL = ""
+
+    def connect(self, dsn):
+        raise NotImplementedError
+
+    def open_cursor(self, conn, timeout_ms: Optional[int]):
+        """Returns a cursor that streams its result, with the statement bounded by ``timeout_ms``."""
+        return conn.cursor()
+
+    def close_cursor(self, conn, timeout_ms: Optional[int]) -> None:
+        """Undoes what ``open_cursor`` changed on the connection."""
+
+    def cancel(self, conn, cursor, pool: ConnectionPool) -> None:
+        """Interrupts the statement running on ``conn``; called from another thread than the reader's."""
+        raise NotImplementedError
+
+    def discard_rest(self, conn, cursor, pool: ConnectionPool) -> bool:
+        """
+        Ends a result that was not read to the end so ``conn`` can be reused;
+        returns False if the connection has to be dropped instead. Closing
+        the cursor is enough unless a dialect streams over the connection.
+        """
+        return True
+
+    def catalog_query(self, tables: Optional[List[str]] = None) -> Tuple[str, tuple]:
+        if tables is None:
+            return self.CATALOG_SQL, ()
+        placeholders = ", ".join([self.placeholder] * len(tables))
+        return f"SELECT * FROM ({self.CATALOG_SQL}) catalog WHERE table_name IN ({placeholders})", tuple(tables)
+
+    def schema_generator(self, backend: "DatabaseBackend"):
+        return CatalogSchemaGenerator(backend)
+
+
+class MySQLDialect(Dialect):
+    name = "mysql"
+
+    def connect(self, dsn: dict):
+        import mysql.connector
+        return mysql.connector.connect(**dsn)
+
+    def open_cursor(self, conn, timeout_ms: Optional[int]):
+        cursor = conn.cursor(buffered=False)
+        if timeout_ms:
+            cursor.execute("SET SESSION MAX_EXECUTION_TIME = %s", (int(timeout_ms),))
+        return cursor
+
+    def close_cursor(self, conn, timeout_ms: Optional[int]) -> None:
+        if timeout_ms:
+            reset = conn.cursor()
+            reset.execute("SET SESSION MAX_EXECUTION_TIME = DEFAULT")
+            reset.close()
+
+    def cancel(self, conn, cursor, pool: ConnectionPool) -> None:
+        # KILL QUERY ends the statement and keeps the session; it has to be sent over another connection.
+        with pool.connection(timeout=1.0) as other:
+            killer = other.cursor()
+            killer.execute("KILL QUERY %s", (int(conn.connection_id),))
+            killer.close()
+
+    def discard_rest(self, conn, cursor, pool: ConnectionPool) -> bool:
+        # Unread rows of an unbuffered result block the connection until they are read.
+        if not getattr(conn, "unread_result", True):
+            return True  # the statement failed or was interrupted: nothing is left to read
+        try:
+            self.cancel(conn, cursor, pool)
+            drained = 0
+            while True:
+                rows = cursor.fetchmany(1000)
+                if not rows:
+                    return True
+                drained += len(rows)
+                if drained > _MYSQL_MAX_DRAIN_ROWS:
+                    return False
+        except Exception as e:
+            return getattr(e, "errno", None) == _MYSQL_QUERY_INTERRUPTED
+
+    def schema_generator(self, backend: "DatabaseBackend"):
+        return SchemaGenerator(pool=backend.pool, db_config=backend.dsn)
+
+
+_MSSQL_TABLE = "CASE WHEN SCHEMA_NAME(o.schema_id) = 'dbo' THEN o.name ELSE SCHEMA_NAME(o.schema_id) + '.' + o.name END"
+
+
+class MSSQLDialect(Dialect):
+    """SQL Server through pyodbc; tables outside ``dbo`` are named ``schema.table``."""
+
+    name = "mssql"
+    placeholder = "?"
+    CATALOG_SQL = f"""
+        SELECT 'C' AS kind, {_MSSQL_TABLE} AS table_name, c.name AS column_name,
+               TYPE_NAME(c.user_type_id) + CASE
+                   WHEN TYPE_NAME(c.user_type_id) IN ('varchar', 'char', 'varbinary', 'binary')
+                       THEN '(' + CASE c.max_length WHEN -1 THEN 'max' ELSE CAST(c.max_length AS varchar(10)) END + ')'
+                   WHEN TYPE_NAME(c.user_type_id) IN ('nvarchar', 'nchar')
+                       THEN '(' + CASE c.max_length WHEN -1 THEN 'max' ELSE CAST(c.max_length / 2 AS varchar(10)) END + ')'
+                   WHEN TYPE_NAME(c.user_type_id) IN ('decimal', 'numeric')
+                       THEN '(' + CAST(c.precision AS varchar(10)) + ',' + CAST(c.scale AS varchar(10)) + ')'
+                   ELSE '' END AS detail,
+               CASE WHEN c.is_nullable = 1 THEN 'YES' ELSE 'NO' END AS flag, c.column_id AS ordinal
+        FROM sys.columns c JOIN sys.objects o ON o.object_id = c.object_id
+        WHERE o.type IN ('U', 'V') AND o.is_ms_shipped = 0
+        UNION ALL
+        SELECT 'I', {_MSSQL_TABLE}, c.name, i.name,
+               CASE WHEN i.is_primary_key = 1 THEN 'P' WHEN i.is_unique = 1 THEN 'U' ELSE 'N' END, ic.key_ordinal
+        FROM sys.indexes i
+        JOIN sys.index_columns ic ON ic.object_id = i.object_id AND ic.index_id = i.index_id
+        JOIN sys.columns c ON c.object_id = ic.object_id AND c.column_id = ic.column_id
+        JOIN sys.objects o ON o.object_id = i.object_id
+        WHERE o.type = 'U' AND o.is_ms_shipped = 0 AND ic.key_ordinal > 0
+        UNION ALL
+        SELECT 'F', {_MSSQL_TABLE}, pc.name, {_MSSQL_TABLE.replace("o.", "ro.")}, rc.name, fkc.constraint_column_id
+        FROM sys.foreign_key_columns fkc
+        JOIN sys.objects o ON o.object_id = fkc.parent_object_id
+        JOIN sys.columns pc ON pc.object_id = fkc.parent_object_id AND pc.column_id = fkc.parent_column_id
+        JOIN sys.objects ro ON ro.object_id = fkc.referenced_object_id
+        JOIN sys.columns rc ON rc.object_id = fkc.referenced_object_id AND rc.column_id = fkc.referenced_column_id
+    """
+    VERSIONS_SQL = f"""
+        SELECT {_MSSQL_TABLE},
+               CONCAT(o.modify_date, ':', CHECKSUM_AGG(CHECKSUM(c.column_id, c.name, c.system_type_id,
+                                                                 c.max_length, c.is_nullable)),
+                      ':', (SELECT CHECKSUM_AGG(CHECKSUM(i.name, i.is_unique, ic.key_ordinal, ic.column_id))
+                            FROM sys.indexes i
+                            JOIN sys.index_columns ic ON ic.object_id = i.object_id AND ic.index_id = i.index_id
+                            WHERE i.object_id = o.object_id),
+                      ':', (SELECT CHECKSUM_AGG(CHECKSUM(fkc.constraint_object_id, fkc.parent_column_id,
+                                                         fkc.referenced_object_id, fkc.referenced_column_id))
+                            FROM sys.foreign_key_columns fkc WHERE fkc.parent_object_id = o.object_id))
+        FROM sys.objects o JOIN sys.columns c ON c.object_id = o.object_id
+        WHERE o.type IN ('U', 'V') AND o.is_ms_shipped = 0
+        GROUP BY o.object_id, o.schema_id, o.name, o.modify_date
+    """
+
+    def connect(self, dsn: str):
+        import pyodbc
+        return pyodbc.connect(dsn, autocommit=False)
+
+    def open_cursor(self, conn, timeout_ms: Optional[int]):
+        if timeout_ms:
+            conn.timeout = max(1, -(-int(timeout_ms) // 1000))  # pyodbc takes whole seconds
+        return conn.cursor()
+
+    def close_cursor(self, conn, timeout_ms: Optional[int]) -> None:
+        if timeout_ms:
+            conn.timeout = 0
+
+    def cancel(self, conn, cursor, pool: ConnectionPool) -> None:
+        cursor.cancel()
+
+
+_PG_TABLE = "CASE WHEN n.nspname = 'public' THEN c.relname::text ELSE n.nspname || '.' || c.relname END"
+_PG_SCHEMAS = "n.nspname NOT IN ('pg_catalog', 'information_schema') AND n.nspname !~ '^pg_toast'"
+
+
+class PostgreSQLDialect(Dialect):
+    """PostgreSQL through psycopg2; tables outside ``public`` are named ``schema.table``."""
+
+    name = "postgresql"
+    describes_on_fetch = True
+    CATALOG_SQL = f"""
+        SELECT 'C'::text AS kind, {_PG_TABLE} AS table_name, a.attname::text AS column_name,
+               format_type(a.atttypid, a.atttypmod) AS detail,
+               CASE WHEN a.attnotnull THEN 'NO' ELSE 'YES' END AS flag, a.attnum::int AS ordinal
+        FROM pg_catalog.pg_attribute a
+        JOIN pg_catalog.pg_class c ON c.oid = a.attrelid
+        JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+        WHERE c.relkind IN ('r', 'p', 'v', 'm') AND a.attnum > 0 AND NOT a.attisdropped AND {_PG_SCHEMAS}
+        UNION ALL
+        SELECT 'I', {_PG_TABLE}, a.attname::text, ic.relname::text,
+               CASE WHEN i.indisprimary THEN 'P' WHEN i.indisunique THEN 'U' ELSE 'N' END, k.ord::int
+        FROM pg_catalog.pg_index i
+        JOIN pg_catalog.pg_class c ON c.oid = i.indrelid
+        JOIN pg_catalog.pg_class ic ON ic.oid = i.indexrelid
+        JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+        CROSS JOIN LATERAL unnest(i.indkey::int2[]) WITH ORDINALITY AS k(attnum, ord)
+        JOIN pg_catalog.pg_attribute a ON a.attrelid = c.oid AND a.attnum = k.attnum
+        WHERE {_PG_SCHEMAS}
+        UNION ALL
+        SELECT 'F', {_PG_TABLE}, a.attname::text,
+               CASE WHEN rn.nspname = 'public' THEN rc.relname::text ELSE rn.nspname || '.' || rc.relname END,
+               ra.attname::text, k.ord::int
+        FROM pg_catalog.pg_constraint con
+        JOIN pg_catalog.pg_class c ON c.oid = con.conrelid
+        JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+        JOIN pg_catalog.pg_class rc ON rc.oid = con.confrelid
+        JOIN pg_catalog.pg_namespace rn ON rn.oid = rc.relnamespace
+        CROSS JOIN LATERAL unnest(con.conkey, con.confkey) WITH ORDINALITY AS k(attnum, ref_attnum, ord)
+        JOIN pg_catalog.pg_attribute a ON a.attrelid = con.conrelid AND a.attnum = k.attnum
+        JOIN pg_catalog.pg_attribute ra ON ra.attrelid = con.confrelid AND ra.attnum = k.ref_attnum
+        WHERE con.contype = 'f' AND {_PG_SCHEMAS}
+    """
+    VERSIONS_SQL = f"""
+        SELECT {_PG_TABLE},
+               md5(string_agg(a.attnum || ':' || a.attname || ':' || format_type(a.atttypid, a.atttypmod)
+                              || ':' || a.attnotnull, ',' ORDER BY a.attnum))
+               || ':' || coalesce((SELECT md5(string_agg(pg_get_indexdef(i.indexrelid), ','
+                                                         ORDER BY pg_get_indexdef(i.indexrelid)))
+                                   FROM pg_catalog.pg_index i WHERE i.indrelid = c.oid), '')
+               || ':' || coalesce((SELECT md5(string_agg(con.conname || ' ' || pg_get_constraintdef(con.oid), ','
+                                                         ORDER BY con.conname))
+                                   FROM pg_catalog.pg_constraint con
+                                   WHERE con.conrelid = c.oid AND con.contype = 'f'), '')
+        FROM pg_catalog.pg_class c
+        JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+        JOIN pg_catalog.pg_attribute a ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+        WHERE c.relkind IN ('r', 'p', 'v', 'm') AND {_PG_SCHEMAS}
+        GROUP BY c.oid, n.nspname, c.relname
+    """
+
+    def connect(self, dsn: str):
+        import psycopg2
+        return psycopg2.connect(dsn)
+
+    def open_cursor(self, conn, timeout_ms: Optional[int]):
+        if timeout_ms:
+            # SET LOCAL ends with the transaction, which the pool rolls back on release.
+            setup = conn.cursor()
+            setup.execute("SET LOCAL statement_timeout = %s", (int(timeout_ms),))
+            setup.close()
+        # A named cursor is server-side: rows cross the network one fetchmany at a time.
+        return conn.cursor(name=f"result_stream_{next(_cursor_ids)}")
+
+    def cancel(self, conn, cursor, pool: ConnectionPool) -> None:
+        conn.cancel()
+
+
+class SQLiteDialect(Dialect):
+    """
+    SQLite through the standard library, as a local stand-in for a server.
+    The DSN is a file path or a ``file:`` URI; every pooled connection opens
+    it separately, so a plain ``:memory:`` database is not shared between them.
+    """
+
+    name = "sqlite"
+    placeholder = "?"
+    CATALOG_SQL = """
+        SELECT 'C' AS kind, m.name AS table_name, p.name AS column_name, p.type AS detail,
+               CASE WHEN p."notnull" OR p.pk THEN 'NO' ELSE 'YES' END AS flag, p.cid + 1 AS ordinal
+        FROM sqlite_master m JOIN pragma_table_info(m.name) p
+        WHERE m.type IN ('table', 'view') AND m.name NOT LIKE 'sqlite_%'
+        UNION ALL
+        SELECT 'I', m.name, p.name, 'PRIMARY', 'P', p.pk
+        FROM sqlite_master m JOIN pragma_table_info(m.name) p
+        WHERE m.type = 'table' AND m.name NOT LIKE 'sqlite_%' AND p.pk > 0
+        UNION ALL
+        SELECT 'I', m.name, ii.name, il.name, CASE WHEN il."unique" THEN 'U' ELSE 'N' END, ii.seqno + 1
+        FROM sqlite_master m JOIN pragma_index_list(m.name) il JOIN pragma_index_info(il.name) ii
+        WHERE m.type = 'table' AND m.name NOT LIKE 'sqlite_%' AND il.origin != 'pk'
+        UNION ALL
+        SELECT 'F', m.name, fk."from", fk."table", fk."to", fk.seq + 1
+        FROM sqlite_master m JOIN pragma_foreign_key_list(m.name) fk
+        WHERE m.type = 'table' AND m.name NOT LIKE 'sqlite_%'
+    """
+    # The stored CREATE statement (foreign keys included) is rewritten by every ALTER TABLE;
+    # CREATE INDEX statements are separate entries, so the table's are appended to it.
+    VERSIONS_SQL = """
+        SELECT t.name, t.sql || ';' || coalesce((SELECT group_concat(sql, ';') FROM (
+                   SELECT i.sql FROM sqlite_master i
+                   WHERE i.type = 'index' AND i.tbl_name = t.name AND i.sql IS NOT NULL ORDER BY i.name)), '')
+        FROM sqlite_master t WHERE t.type IN ('table', 'view') AND t.name NOT LIKE 'sqlite_%'
+    """
+
+    def connect(self, dsn: str):
+        import sqlite3
+        return sqlite3.connect(dsn, timeout=5.0, check_same_thread=False, uri=dsn.startswith("file:"))
+
+    def open_cursor(self, conn, timeout_ms: Optional[int]):
+        if timeout_ms:
+            budget, state = timeout_ms / 1000.0, {"busy": 0.0, "last": time.monotonic()}
+
+            def interrupt():
+                # Counts only the time SQLite spends executing, not pauses between fetched batches.
+                now = time.monotonic()
+                gap, state["last"] = now - state["last"], now
+                if gap < _SQLITE_IDLE_GAP:
+                    state["busy"] += gap
+                return state["busy"] > budget
+
+            conn.set_progress_handler(interrupt, 1000)
+        return conn.cursor()
+
+    def close_cursor(self, conn, timeout_ms: Optional[int]) -> None:
+        if timeout_ms:
+            conn.set_progress_handler(None, 0)
+
+    def cancel(self, conn, cursor, pool: ConnectionPool) -> None:
+        conn.interrupt()
+
+
+DIALECTS: Dict[str, Dialect] = {
+    "mysql": MySQLDialect(),
+    "mssql": MSSQLDialect(),
+    "postgresql": PostgreSQLDialect(),
+    "sqlite": SQLiteDialect(),
+}
+
+
+def get_dialect(name: str) -> Dialect:
+    dialect = DIALECTS.get(name.lower())
+    if dialect is None:
+        raise ValueError(f"Unsupported database type: {name}")
+    return dialect
+
+
+class CatalogSchemaGenerator:
+    """
+    SchemaGenerator counterpart for dialects with a single catalog query.
+    Produces the same {"tables", "relationships"} structure, so SchemaStore,
+    SchemaManager and QueryOptimizer work unchanged.
+    """
+
+    def __init__(self, backend: "DatabaseBackend"):
+        self.backend = backend
+        self.dialect = backend.dialect
+        self.pool = backend.pool
+        self.db_config = {"host": backend.name}
+        self.schema = {}
+        self.relationships = {}
+
+    def _rows(self, sql: str, params: tuple = ()) -> list:
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            # Without parameters the driver must not apply its placeholder formatting (psycopg2's '%').
+            cursor.execute(sql, params) if params else cursor.execute(sql)
+            rows = cursor.fetchall()
+            cursor.close()
+        return rows
+
+    def _apply_catalog(self, rows: Iterable[tuple], tables: Optional[List[str]] = None) -> List[str]:
+        by_kind = {"C": [], "I": [], "F": []}
+        for row in rows:
+            by_kind[row[0]].append(row)
+        if tables is not None:
+            for table in tables:
+                self.schema.pop(table, None)
+                self.relationships.pop(table, None)
+        found = []
+        for _, table, column, column_type, nullable, _ in sorted(by_kind["C"], key=lambda r: (r[1], r[5])):
+            entry = self.schema.get(table)
+            if entry is None or table not in found:
+                entry = self.schema[table] = {"columns": [], "primary_key": None, "column_types": {},
+                                              "nullable": [], "indexes": {}}
+                found.append(table)
+            entry["columns"].append(column)
+            entry["column_types"][column] = column_type
+            if nullable == "YES":
+                entry["nullable"].append(column)
+        for _, table, column, index_name, flag, _ in sorted(by_kind["I"], key=lambda r: (r[1], r[3], r[5])):
+            entry = self.schema.get(table)
+            if entry is None or table not in found:
+                continue
+            if flag == "P":
+                entry["primary_key"] = (entry["primary_key"] or []) + [column]
+            else:
+                index = entry["indexes"].setdefault(index_name, {"columns": [], "unique": flag == "U"})
+                index["columns"].append(column)
+        for _, table, column, ref_table, ref_column, _ in sorted(by_kind["F"], key=lambda r: (r[1], r[5], r[2])):
+            if table in found:
+                self.relationships.setdefault(table, []).append(
+                    {"column": column, "references": {"table": ref_table, "column": ref_column}})
+        return found
+
+    def fetch_schema(self, bulk: bool = True):
+        """Fetches the full schema with one catalog query (``bulk`` is accepted for SchemaGenerator parity)."""
+        try:
+            with metrics.timer("schema_fetch"):
+                self.schema, self.relationships = {}, {}
+                tables = self._apply_catalog(self._rows(*self.dialect.catalog_query()))
+            log_payload(logger, "Tables found: %s", tables)
+            logger.info("%s schema fetched: %d tables.", self.backend.name, len(tables))
+            return {"tables": self.schema, "relationships": self.relationships}
+        except Exception as e:
+            logger.error("Failed to fetch schema from %s: %s", self.backend.name, str(e))
+            raise
+
+    def fetch_tables(self, tables):
+        """Re-introspects only the given tables; returns {"tables", "relationships"} restricted to them."""
+        tables = list(tables)
+        if not tables:
+            return {"tables": {}, "relationships": {}}
+        try:
+            with metrics.timer("schema_fetch_tables"):
+                self._apply_catalog(self._rows(*self.dialect.catalog_query(tables)), tables)
+            logger.info("Re-introspected %d tables of %s.", len(tables), self.backend.name)
+            return {
+                "tables": {t: self.schema[t] for t in tables if t in self.schema},
+                "relationships": {t: self.relationships[t] for t in tables if t in self.relationships},
+            }
+        except Exception as e:
+            logger.error("Failed to fetch tables %s from %s: %s", tables, self.backend.name, str(e))
+            raise
+
+    def fetch_table_versions(self):
+        """Returns {table: version} in a single round trip."""
+        try:
+            with metrics.timer("schema_versions"):
+                return {table: str(version) for table, version in self._rows(self.dialect.VERSIONS_SQL)}
+        except Exception as e:
+            logger.error("Failed to fetch table versions from %s: %s", self.backend.name, str(e))
+            raise
+
+    def get_schema(self):
+        if not self.schema:
+            return self.fetch_schema()
+        return {"tables": self.schema, "relationships": self.relationships}
+
+
+def _redact(dsn) -> str:
+    """A loggable name for ``dsn`` without its password."""
+    if isinstance(dsn, dict):
+        return f"{dsn.get('host')}:{dsn.get('port')}/{dsn.get('database')}"
+    dsn = re.sub(r"(?i)\b(pwd|password)\s*=\s*[^;\s]*", r"\1=***", dsn)
+    return re.sub(r"(://[^:/@]+):[^@]*@", r"\1:***@", dsn)
+
+
+class DatabaseBackend:
+    """
+    One database: its dialect, a connection pool and a schema snapshot store.
+
+    Connections are created lazily by the pool and reused across requests,
+    and the schema is introspected once and then refreshed incrementally by
+    the store, so serving many databases from one process costs neither a
+    reconnect nor a re-introspection per request. Use ``get_backend`` to
+    share one backend per database across the process.
+    """
+
+    def __init__(self, dialect: Union[str, Dialect], dsn=None, pool: Optional[ConnectionPool] = None,
+                 schema_store: Optional[SchemaStore] = None, pool_size: Optional[int] = None,
+                 schema_ttl: Optional[float] = None):
+        self.dialect = get_dialect(dialect) if isinstance(dialect, str) else dialect
+        self.dsn = dsn if dsn is not None else dsn_from_env(self.dialect.name)
+        self.name = f"{self.dialect.name}://{_redact(self.dsn)}" if self.dsn is not None else self.dialect.name
+        if pool is None:
+            if self.dsn is None:
+                raise ValueError(f"No {self.dialect.name} database configured; set "
+                                 f"{DSN_ENV.get(self.dialect.name, 'MYSQL_*')} or pass a connection string")
+            if self.dialect.name == "mysql":
+                pool = get_mysql_pool(self.dsn, size=pool_size)
+            else:
+                pool = ConnectionPool(
+                    lambda: self.dialect.connect(self.dsn),
+                    size=pool_size or int(os.getenv("DB_POOL_SIZE", 5)),
+                    timeout=float(os.getenv("DB_POOL_TIMEOUT", 10)),
+                    idle_timeout=float(os.getenv("DB_POOL_IDLE_TIMEOUT", 300)),
+                    name=self.name,
+                )
+        self.pool = pool
+        self._schema_store = schema_store
+        self._schema_ttl = DEFAULT_SCHEMA_TTL if schema_ttl is None else schema_ttl
+        self._lock = threading.Lock()
+        logger.info("DatabaseBackend initialized for %s", self.name)
+
+    @property
+    def schema_store(self) -> SchemaStore:
+        if self._schema_store is None:
+            with self._lock:
+                if self._schema_store is None:
+                    self._schema_store = SchemaStore(self._schema_ttl,
+                                                     generator_factory=lambda: self.dialect.schema_generator(self))
+        return self._schema_store
+
+    def close(self) -> None:
+        self.pool.close()
+
+
+def dsn_from_env(dialect: str):
+    """The configured connection string for ``dialect`` (MySQL: the MYSQL_* config), or None."""
+    if dialect == "mysql":
+        return mysql_config_from_env() if os.getenv("MYSQL_HOST") else None
+    variable = DSN_ENV.get(dialect)
+    return os.getenv(variable) or None if variable else None
+
+
+def looks_like_dsn(value: Optional[str]) -> bool:
+    """True for an ODBC/libpq ``key=value`` string or a URL, as opposed to a placeholder."""
+    return bool(value) and ("=" in value or "://" in value)
+
+
+_backends: Dict[tuple, DatabaseBackend] = {}
+_backends_lock = threading.Lock()
+
+
+def get_backend(dialect: str, dsn=None, pool_size: Optional[int] = None) -> DatabaseBackend:
+    """Returns the process-wide backend for ``dsn`` (default: the dialect's environment variable)."""
+    dialect = get_dialect(dialect).name
+    dsn = dsn if dsn is not None else dsn_from_env(dialect)
+    if dsn is None:
+        raise ValueError(f"No {dialect} database configured; set {DSN_ENV.get(dialect, 'MYSQL_*')}")
+    key = (dialect, tuple(sorted(dsn.items())) if isinstance(dsn, dict) else dsn)
+    with _backends_lock:
+        backend = _backends.get(key)
+        if backend is None:
+            backend = _backends[key] = DatabaseBackend(dialect, dsn, pool_size=pool_size)
+        return backend
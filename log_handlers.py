@@ -0,0 +1,55 @@
+"""
+Handlers installed by logging_config.setup_logging. Kept apart so that
+modules which only log (and import logging_config for log_payload) do not
+pay for importing ``logging.handlers``.
+"""
+import os
+import logging
+from logging.handlers import QueueHandler, TimedRotatingFileHandler
+
+
+class RotatingTimedFileHandler(TimedRotatingFileHandler):
+    """Rolls the log over at the ``when`` interval or once it would exceed ``max_bytes``, whichever comes first."""
+
+    def __init__(self, filename: str, max_bytes: int = 0, when: str = "midnight", backup_count: int = 5,
+                 encoding: str = "utf-8"):
+        super().__init__(filename, when=when, backupCount=backup_count, encoding=encoding, delay=True)
+        self.max_bytes = max_bytes
+
+    def shouldRollover(self, record) -> bool:
+        if super().shouldRollover(record):
+            return True
+        if self.max_bytes <= 0:
+            return False
+        if self.stream is None:
+            self.stream = self._open()
+        return self.stream.tell() + len(self.format(record)) + 1 >= self.max_bytes
+
+    def rotation_filename(self, default_name: str) -> str:
+        # Size-based rollovers can happen several times within one time suffix; keep them apart.
+        name, n = default_name, 1
+        while os.path.exists(name):
+            name, n = f"{default_name}.{n}", n + 1
+        return name
+
+
+class TruncatingQueueHandler(QueueHandler):
+    """
+    Enqueues records for the listener thread. Only the message is rendered
+    here (cut to ``max_payload`` characters); timestamps, formatting and
+    file I/O happen on the listener thread.
+    """
+
+    def __init__(self, log_queue, max_payload: int):
+        super().__init__(log_queue)
+        self.max_payload = max_payload
+
+    def prepare(self, record):
+        message = record.getMessage()
+        if self.max_payload and len(message) > self.max_payload:
+            message = f"{message[:self.max_payload]}... [{len(message) - self.max_payload} more chars]"
+        if record.exc_info:
+            message = f"{message}\n{logging.Formatter().formatException(record.exc_info)}"
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg, record.args, record.exc_info, record.exc_text = message, None, None, None
+        return record
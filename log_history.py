@@ -0,0 +1,96 @@
+"""
+Streaming reader for ``application.log``.
+
+Records are read line by line; lines that do not start with a timestamp
+continue the previous record's message (multi-line SQL, schema dumps). Only
+the current record is held in memory, and a message longer than
+``max_message`` characters keeps its beginning only.
+"""
+import re
+import json
+from collections import namedtuple
+from datetime import datetime
+from typing import Iterator, Optional
+
+LogRecord = namedtuple("LogRecord", "timestamp logger level message")
+QueryPair = namedtuple("QueryPair", "timestamp question sql db_type executed")
+
+_RECORD = re.compile(r"(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d{3}) - (\S+) - ([A-Z]+) - (.*)", re.DOTALL)
+_PROMPT = re.compile(r"Generating (MySQL|MSSQL|PostgreSQL|SQLite) prompt for query: (.*)", re.DOTALL)
+_GENERATED = "Generated and optimized query: "
+_SCHEMA = "Schema Config: "
+_EXECUTED_OK = ("Query returned ",)
+_EXECUTED_FAILED = ("Failed to execute",)
+# Appended by TruncatingQueueHandler to a message cut at LOG_MAX_PAYLOAD.
+_TRUNCATED = re.compile(r"\.\.\. \[\d+ more chars\]$")
+
+DEFAULT_MAX_MESSAGE = 64 * 1024
+
+
+def parse_timestamp(timestamp: str) -> datetime:
+    return datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S,%f")
+
+
+def iter_records(path: str, max_message: int = DEFAULT_MAX_MESSAGE) -> Iterator[LogRecord]:
+    """Yields every record of the log at ``path`` in order."""
+    header, parts, size = None, [], 0
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for line in f:
+            match = _RECORD.match(line)
+            if match is None:
+                if header is not None and size < max_message:
+                    parts.append(line)
+                    size += len(line)
+                continue
+            if header is not None:
+                yield LogRecord(*header, "".join(parts).rstrip("\n")[:max_message])
+            header = match.group(1, 2, 3)
+            parts, size = [match.group(4)], len(match.group(4))
+    if header is not None:
+        yield LogRecord(*header, "".join(parts).rstrip("\n")[:max_message])
+
+
+def iter_query_pairs(path: str, max_message: int = DEFAULT_MAX_MESSAGE) -> Iterator[QueryPair]:
+    """
+    Pairs each "Generating <dialect> prompt for query" record with the
+    "Generated and optimized query" that follows it. ``executed`` is True or
+    False when a later "Query returned"/"Failed to execute" record reports
+    the outcome before the next request, and None when the log does not say.
+    ``timestamp`` is when the request arrived (its prompt record). Requests
+    or queries that the logger truncated are skipped.
+    """
+    prompt: Optional[tuple] = None   # (timestamp, question, db_type) awaiting its query
+    pending: Optional[list] = None   # QueryPair fields awaiting the execution outcome
+    for record in iter_records(path, max_message):
+        message = record.message
+        match = _PROMPT.match(message)
+        if match is not None:
+            if pending is not None:
+                yield QueryPair(*pending)
+                pending = None
+            prompt = (record.timestamp, match.group(2).strip(), match.group(1).lower())
+        elif message.startswith(_GENERATED) and prompt is not None:
+            if pending is not None:
+                yield QueryPair(*pending)
+                pending = None
+            if not _TRUNCATED.search(prompt[1]) and not _TRUNCATED.search(message):
+                pending = [prompt[0], prompt[1], message[len(_GENERATED):].strip(), prompt[2], None]
+            prompt = None
+        elif pending is not None and message.startswith(_EXECUTED_OK + _EXECUTED_FAILED):
+            pending[4] = message.startswith(_EXECUTED_OK)
+            yield QueryPair(*pending)
+            pending = None
+    if pending is not None:
+        yield QueryPair(*pending)
+
+
+def last_schema(path: str, max_message: int = 16 * 1024 * 1024) -> Optional[dict]:
+    """The last "Schema Config" dump in the log as {"tables", "relationships"}, or None if there is none."""
+    schema = None
+    for record in iter_records(path, max_message):
+        if record.message.startswith(_SCHEMA):
+            try:
+                schema = json.loads(record.message[len(_SCHEMA):])
+            except ValueError:
+                continue
+    return schema
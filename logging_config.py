@@ -1,20 +1,81 @@
+import os
+import queue
+import atexit
+import random
 import logging
 
-def setup_logging():
+_settings = {"payload_level": logging.INFO, "sample_rate": 1.0}
+_listener = None
+
+
+def log_payload(logger: logging.Logger, msg: str, *args) -> None:
+    """
+    Logs a prompt, schema or query body. In the development profile this is
+    INFO; in the production profile it is DEBUG on the ``payload.<name>``
+    logger for a sampled fraction of calls, and skipped (unformatted) otherwise.
+    """
+    level, rate = _settings["payload_level"], _settings["sample_rate"]
+    if level == logging.INFO:
+        logger.info(msg, *args)
+    elif rate >= 1.0 or random.random() < rate:
+        logging.getLogger("payload." + logger.name).debug(msg, *args)
+
+
+def log_query_record(logger: logging.Logger, msg: str, *args) -> None:
+    """
+    Logs a request or the SQL generated for it at INFO in every profile.
+    log_history pairs these records back up (example import, cache warm-up,
+    replay), so they are never sampled; the queue handler still caps their
+    length at LOG_MAX_PAYLOAD.
+    """
+    logger.info(msg, *args)
+
+
+def setup_logging(profile: str = None, log_file: str = None, level: str = None):
+    """
+    Configures the root logger once: records go through a queue to a
+    listener thread that writes ``application.log`` (rotated daily and by
+    size) and the console, so handlers never block the caller.
+
+    The ``production`` profile (LOG_PROFILE) logs payloads only as sampled
+    DEBUG (LOG_PAYLOAD_SAMPLE_RATE, default 0.01); the request/SQL records
+    of ``log_query_record`` stay at INFO. LOG_FILE, LOG_LEVEL,
+    LOG_MAX_BYTES, LOG_ROTATE_WHEN, LOG_BACKUP_COUNT and LOG_MAX_PAYLOAD
+    override the defaults.
+
+    Library modules only create loggers; the entry point (main.py,
+    streamlit_app.py, the benchmark and replay scripts) calls this once.
+    """
+    global _listener
     logger = logging.getLogger()
     # If the root logger already has handlers, skip reconfiguration
     if logger.hasHandlers():
         return
-    logger.setLevel(logging.INFO)
+    from logging.handlers import QueueListener
+    from log_handlers import RotatingTimedFileHandler, TruncatingQueueHandler
+    profile = (profile or os.getenv("LOG_PROFILE", "development")).lower()
+    logger.setLevel((level or os.getenv("LOG_LEVEL", "INFO")).upper())
+    if profile == "production":
+        _settings["payload_level"] = logging.DEBUG
+        _settings["sample_rate"] = float(os.getenv("LOG_PAYLOAD_SAMPLE_RATE", 0.01))
+        logging.getLogger("payload").setLevel(logging.DEBUG)
     formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-    
+
     # File handler writes to application.log
-    file_handler = logging.FileHandler("application.log")
+    file_handler = RotatingTimedFileHandler(
+        log_file or os.getenv("LOG_FILE", "application.log"),
+        max_bytes=int(os.getenv("LOG_MAX_BYTES", 50 * 1024 * 1024)),
+        when=os.getenv("LOG_ROTATE_WHEN", "midnight"),
+        backup_count=int(os.getenv("LOG_BACKUP_COUNT", 7)),
+    )
     file_handler.setFormatter(formatter)
-    
+
     # Console handler
     console_handler = logging.StreamHandler()
     console_handler.setFormatter(formatter)
-    
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
\ No newline at end of file
+
+    log_queue = queue.SimpleQueue()
+    _listener = QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+    logger.addHandler(TruncatingQueueHandler(log_queue, int(os.getenv("LOG_MAX_PAYLOAD", 4000))))
@@ -1,24 +1,37 @@
 import logging
-from abc import ABC, abstractmethod
-from logging_config import setup_logging
+from abc import ABC
+from logging_config import log_query_record
 
-setup_logging()
 logger = logging.getLogger(__name__)
 
 class PromptTemplate(ABC):
-    @abstractmethod
+    """
+    System prompt plus a user prompt with ``{query_description}`` and
+    ``{schema}`` fields for one SQL dialect. The texts are class constants
+    (the user prompt already stripped), so rendering a prompt is one
+    ``str.format``; use the shared instances from ``get_prompt_template``.
+    """
+    dialect: str
+    SYSTEM_PROMPT: str
+    USER_PROMPT: str
+
     def system_prompt(self) -> str:
         """Returns the system prompt for the AI model."""
-        pass
+        return self.SYSTEM_PROMPT
+
+    def user_prompt(self, query_description: str, schema: str, examples: str = "") -> str:
+        """Returns the user prompt given the query description, schema and optional few-shot examples."""
+        log_query_record(logger, "Generating %s prompt for query: %s", self.dialect, query_description)
+        return self.with_examples(self.USER_PROMPT.format(query_description=query_description, schema=schema),
+                                  examples)
 
-    @abstractmethod
-    def user_prompt(self, query_description: str, schema: str) -> str:
-        """Returns the user prompt given the query description and schema."""
-        pass
+    @staticmethod
+    def with_examples(prompt: str, examples: str) -> str:
+        return f"{prompt}\n\n{examples}" if examples else prompt
 
 class MySQLPromptTemplate(PromptTemplate):
-    def system_prompt(self) -> str:
-        return '''
+    dialect = "MySQL"
+    SYSTEM_PROMPT = '''
             Goal:
             You are an advanced MySQL expert assistant. Your primary responsibility is to generate efficient, syntactically correct, and optimized MySQL queries based on the user’s input. Your queries must strictly adhere to MySQL syntax and best practices.
 
@@ -45,9 +58,7 @@ class MySQLPromptTemplate(PromptTemplate):
                 •	Ensure that string concatenation uses CONCAT() instead of + (which is specific to MSSQL).
                 •	If subqueries are used, ensure they are optimized and consider using JOINs instead where possible.'''
 
-    def user_prompt(self, query_description: str, schema: str) -> str:
-        logger.info(f"Generating MySQL prompt for query: {query_description}")
-        return f"""
+    USER_PROMPT = """
             Generate and return the MySQL query for the following request:
             {query_description}
 
@@ -58,8 +69,8 @@ class MySQLPromptTemplate(PromptTemplate):
             """.strip()
 
 class MSSQLPromptTemplate(PromptTemplate):
-    def system_prompt(self) -> str:
-        return '''
+    dialect = "MSSQL"
+    SYSTEM_PROMPT = '''
             Goal:
             You are an expert in Microsoft SQL Server (MSSQL) and Transact-SQL (T-SQL). Your task is to generate highly optimized, MSSQL-compatible queries based on the user’s requirements. The queries should follow SQL Server best practices for performance and correctness.
 
@@ -87,9 +98,7 @@ class MSSQLPromptTemplate(PromptTemplate):
                 •	If date manipulation is needed, use SQL Server functions such as GETDATE(), DATEADD(), or DATEDIFF().
                 •	If performance optimization is necessary, consider using WITH (NOLOCK) hints in read-heavy scenarios (while explaining potential trade-offs).'''
 
-    def user_prompt(self, query_description: str, schema: str) -> str:
-        logger.info(f"Generating MSSQL prompt for query: {query_description}")
-        return f"""
+    USER_PROMPT = """
             Generate an MSSQL query for the following request:
             {query_description}
 
@@ -100,12 +109,10 @@ class MSSQLPromptTemplate(PromptTemplate):
             """.strip()
 
 class PostgreSQLPromptTemplate(PromptTemplate):
-    def system_prompt(self) -> str:
-        return "You are a PostgreSQL expert assistant. Generate only PostgreSQL-compatible queries."
+    dialect = "PostgreSQL"
+    SYSTEM_PROMPT = "You are a PostgreSQL expert assistant. Generate only PostgreSQL-compatible queries."
 
-    def user_prompt(self, query_description: str, schema: str) -> str:
-        logger.info(f"Generating PostgreSQL prompt for query: {query_description}")
-        return f"""
+    USER_PROMPT = """
             Generate a PostgreSQL query for the following request:
             {query_description}
 
@@ -113,4 +120,34 @@ class PostgreSQLPromptTemplate(PromptTemplate):
             {schema}
 
             Ensure the query is optimized for PostgreSQL execution plans and indexing.
-            """.strip()
\ No newline at end of file
+            """.strip()
+
+class SQLitePromptTemplate(PromptTemplate):
+    dialect = "SQLite"
+    SYSTEM_PROMPT = "You are a SQLite expert assistant. Generate only SQLite-compatible queries."
+
+    USER_PROMPT = """
+            Generate a SQLite query for the following request:
+            {query_description}
+
+            Schema details:
+            {schema}
+
+            Ensure the query uses SQLite's functions and syntax and can use the available indexes.
+            """.strip()
+
+
+PROMPT_TEMPLATES = {
+    "mysql": MySQLPromptTemplate(),
+    "mssql": MSSQLPromptTemplate(),
+    "postgresql": PostgreSQLPromptTemplate(),
+    "sqlite": SQLitePromptTemplate(),
+}
+
+
+def get_prompt_template(db_type: str) -> PromptTemplate:
+    """Returns the shared template for ``db_type`` (mysql, mssql, postgresql or sqlite)."""
+    template = PROMPT_TEMPLATES.get(db_type.lower())
+    if template is None:
+        raise ValueError(f"Unsupported database type: {db_type}")
+    return template
@@ -0,0 +1,221 @@
+"""
+Cache warm-up and traffic replay driven by an ``application.log``.
+
+``preload`` streams the log and writes every logged (request, generated
+query) pair through AIDatabaseQuery.warm_cache into the persistent query
+cache at ``--cache-path`` (default QUERY_CACHE_PATH), so the next process
+starts warm. It needs the live database only for the schema the entries are
+validated against.
+
+``replay`` sends the logged requests through AIDatabaseQuery in their
+original order, with their original inter-arrival times divided by
+``--speedup`` (0 sends them as fast as ``--concurrency`` allows). The LLM is
+a MockClient answering each request with the SQL the log recorded for it
+after ``--llm-latency-ms``, and the schema is the last "Schema Config" dump
+in the log unless ``--live`` introspects the configured database (and then
+also executes the queries). The log is read as a stream and latencies go
+into fixed-bucket histograms, so memory stays flat however long the log is.
+One JSON object with throughput, latency percentiles, dispatch lag and cache
+behaviour is printed at the end.
+
+    python replay_log.py replay --log application.log --speedup 60 --concurrency 16
+    python replay_log.py preload --log application.log --cache-path query_cache.db
+"""
+import argparse
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from Metrics import Histogram, metrics
+from ai_clients import MockClient
+from SchemaStore import SchemaStore
+from database_query import AIDatabaseQuery
+from log_history import iter_query_pairs, last_schema, parse_timestamp
+from logging_config import setup_logging
+
+# The SQL the log recorded for the request the current thread is replaying.
+_logged_sql = contextvars.ContextVar("logged_sql", default="SELECT 1;")
+
+
+class LoggedSchemaGenerator:
+    """Serves a schema read from the log in place of SchemaGenerator; every table has a fixed version."""
+
+    def __init__(self, schema: dict):
+        self.db_config = {}
+        self.schema = {}
+        self.relationships = {}
+        self._logged = schema
+
+    def fetch_table_versions(self):
+        return {table: "logged" for table in self._logged["tables"]}
+
+    def fetch_schema(self, bulk: bool = True):
+        self.schema = dict(self._logged["tables"])
+        self.relationships = dict(self._logged.get("relationships", {}))
+        return {"tables": self.schema, "relationships": self.relationships}
+
+    def fetch_tables(self, tables):
+        schema = self.fetch_schema()
+        return {"tables": {t: schema["tables"][t] for t in tables if t in schema["tables"]},
+                "relationships": {t: schema["relationships"][t] for t in tables if t in schema["relationships"]}}
+
+
+def _quantiles_ms(histogram: Histogram) -> dict:
+    summary = histogram.to_dict()
+    return {f"{q}_ms": summary[q] and round(summary[q] * 1000, 3) for q in ("p50", "p95", "p99")}
+
+
+def replay(args) -> dict:
+    if args.live:
+        store = None
+    else:
+        schema = last_schema(args.log)
+        if schema is None:
+            raise SystemExit(f"{args.log} has no \"Schema Config\" dump; use --live to introspect the database")
+        store = SchemaStore(ttl=10 ** 9, generator_factory=lambda: LoggedSchemaGenerator(schema))
+    client = MockClient(lambda prompt: _logged_sql.get(), latency=args.llm_latency_ms / 1000.0)
+    db = AIDatabaseQuery(None, None, client, cache_size=args.cache_size, rate_limit=args.rate_limit,
+                         cache_path=args.cache_path, schema_store=store)
+    if args.preload:
+        db.warm_cache(args.log)
+    metrics.reset()
+
+    latency, lag = Histogram(), Histogram()
+    counts = {"requests": 0, "errors": 0, "generated": 0}
+    matches = {}
+    lock = threading.Lock()
+    slots = threading.BoundedSemaphore(args.concurrency)
+    first_error = []
+
+    def handle(pair, dispatched):
+        _logged_sql.set(pair.sql)
+        try:
+            result = db.generate_query(pair.question, pair.db_type)
+            if args.live and pair.db_type == "mysql":
+                db.execute_mysql_query(result["query"], max_rows=args.max_rows)
+            error = None
+        except Exception as e:
+            result, error = None, e
+        finally:
+            slots.release()
+        elapsed = time.perf_counter() - dispatched
+        with lock:
+            latency.observe(elapsed)
+            if error is not None:
+                counts["errors"] += 1
+                if not first_error:
+                    first_error.append(str(error))
+            elif result["cache"] is None:
+                counts["generated"] += 1
+            else:
+                match = result["cache"]["match"]
+                matches[match] = matches.get(match, 0) + 1
+
+    pairs = iter_query_pairs(args.log)
+    if args.limit:
+        pairs = islice(pairs, args.limit)
+    origin = previous = None
+    offset = 0.0
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency, thread_name_prefix="replay") as executor:
+        for pair in pairs:
+            logged_at = parse_timestamp(pair.timestamp)
+            if origin is None:
+                origin = previous = logged_at
+            gap = (logged_at - previous).total_seconds()
+            offset += min(max(gap, 0.0), args.max_gap) if args.max_gap is not None else max(gap, 0.0)
+            previous = logged_at
+            if args.speedup:
+                delay = start + offset / args.speedup - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            # At most ``concurrency`` requests in flight; the log is never read ahead of them.
+            slots.acquire()
+            dispatched = time.perf_counter()
+            if args.speedup:
+                lag.observe(max(0.0, dispatched - (start + offset / args.speedup)))
+            counts["requests"] += 1
+            executor.submit(handle, pair, dispatched)
+    elapsed = time.perf_counter() - start
+
+    requests = counts["requests"]
+    snapshot = metrics.snapshot()
+    hits = sum(n for match, n in matches.items() if match != "inflight")
+    return {
+        "log": args.log,
+        "speedup": args.speedup,
+        "concurrency": args.concurrency,
+        "requests": requests,
+        "errors": counts["errors"],
+        "first_error": first_error[0] if first_error else None,
+        "seconds": round(elapsed, 4),
+        "logged_seconds": round(offset, 3),
+        "requests_per_second": round(requests / elapsed, 2) if elapsed else None,
+        "latency": _quantiles_ms(latency),
+        "dispatch_lag": _quantiles_ms(lag) if args.speedup else None,
+        "cache_hit_ratio": round(hits / requests, 4) if requests else None,
+        "cache_matches": matches,
+        "coalesced": matches.get("inflight", 0),
+        "generated": counts["generated"],
+        "llm_calls": client.calls,
+        "stages": {stage: {"count": h["count"], "mean_ms": round(h["sum"] / h["count"] * 1000, 3),
+                           "p50_ms": h["p50"] and h["p50"] * 1000, "p95_ms": h["p95"] and h["p95"] * 1000}
+                   for stage, h in snapshot["stages"].items()},
+    }
+
+
+def preload(args) -> dict:
+    if not args.cache_path:
+        raise SystemExit("preload needs --cache-path or QUERY_CACHE_PATH to write the cache to")
+    db = AIDatabaseQuery(None, None, MockClient(), cache_path=args.cache_path)
+    start = time.perf_counter()
+    loaded = db.warm_cache(args.log, limit=args.limit)
+    return {"log": args.log, "cache_path": args.cache_path, "loaded": loaded,
+            "seconds": round(time.perf_counter() - start, 4)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--log", default="application.log")
+    parser.add_argument("--cache-path", default=os.getenv("QUERY_CACHE_PATH"),
+                        help="persistent (L2) query cache; replays without one use memory only")
+    parser.add_argument("--limit", type=int, help="read at most this many logged requests")
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--output", help="also write the result to this JSON file")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("preload", help="write the logged queries into the persistent cache")
+
+    replay_parser = commands.add_parser("replay", help="send the logged requests through the pipeline")
+    replay_parser.add_argument("--speedup", type=float, default=1.0,
+                               help="divide the logged inter-arrival times by this (0: no waiting)")
+    replay_parser.add_argument("--max-gap", type=float, default=None,
+                               help="cap logged idle gaps at this many seconds")
+    replay_parser.add_argument("--concurrency", type=int, default=8, help="requests in flight at most")
+    replay_parser.add_argument("--preload", action="store_true", help="warm the cache from the log first")
+    replay_parser.add_argument("--llm-latency-ms", type=float, default=50.0)
+    replay_parser.add_argument("--rate-limit", type=int, default=10 ** 9, help="LLM requests per minute")
+    replay_parser.add_argument("--cache-size", type=int, default=1000)
+    replay_parser.add_argument("--live", action="store_true",
+                               help="introspect and query the configured MySQL database")
+    replay_parser.add_argument("--max-rows", type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    setup_logging(level=args.log_level)
+    metrics.enable()
+    result = preload(args) if args.command == "preload" else replay(args)
+    print(json.dumps(result))
+    sys.stdout.flush()
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"config": vars(args), "started": time.strftime("%Y-%m-%dT%H:%M:%S"), "result": result},
+                      f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
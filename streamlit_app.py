@@ -1,7 +1,8 @@
 import streamlit as st
 import os
 import re
-import json
+import time
+import threading
 import pandas as pd
 from dotenv import load_dotenv
 load_dotenv()
@@ -9,71 +10,196 @@ load_dotenv()
 # Import your modules
 from ai_clients import OpenAIClient
 from database_query import AIDatabaseQuery
+from logging_config import setup_logging
+
+# Streamlit re-executes this script on every interaction; only the first run configures logging.
+setup_logging()
 
 st.title("SQL Query Generator and Executor")
 
+PAGE_SIZE = int(os.getenv("UI_PAGE_SIZE", 100))
+MAX_RESULT_ROWS = int(os.getenv("UI_MAX_RESULT_ROWS", 100000))
+MAX_PAGE_BYTES = int(os.getenv("UI_MAX_PAGE_BYTES", 4 * 1024 * 1024))
+POLL_INTERVAL = 0.3
+
+
+@st.cache_resource
+def get_db() -> AIDatabaseQuery:
+    """
+    One AIDatabaseQuery per server process, so the AI client, connection
+    pool, schema snapshot, query cache and rate limiter are shared by every
+    session and rerun instead of being rebuilt on each click. With
+    CACHE_PRELOAD_LOG the cache starts warm from that application.log.
+    """
+    db = AIDatabaseQuery(
+        mysql_conn_str="...",
+        mssql_conn_str="...",
+        ai_client=OpenAIClient(api_key=os.getenv("OPENAI_API_KEY"))
+    )
+    if os.getenv("CACHE_PRELOAD_LOG"):
+        db.warm_cache(os.getenv("CACHE_PRELOAD_LOG"))
+    return db
+
+
+class QueryJob:
+    """
+    Generates a prompt's SQL and reads its first page on a background
+    thread. Every page is a query of its own (the SQL narrowed with
+    LIMIT/OFFSET by QueryOptimizer.paginate) on a pooled connection, so a
+    session holds no connection and only the page it shows between reruns.
+    ``cancel`` interrupts a running query; an LLM call already in flight
+    finishes on its thread and its result is discarded.
+    """
+
+    def __init__(self, db: AIDatabaseQuery, prompt: str, page_size: int = PAGE_SIZE):
+        self.db = db
+        self.prompt = prompt
+        self.page_size = page_size
+        self.status = "running"  # running, done, failed or cancelled
+        self.stage = "Generating SQL query..."
+        self.result = None
+        self.error = None
+        self.stream = None
+        self.page_number = 0
+        self.frame = None  # DataFrame of page_number
+        self.has_next = False
+        self.page_truncated = False  # the page was cut at MAX_PAGE_BYTES
+        self._cancelled = threading.Event()
+        self._lock = threading.Lock()
+        self.started = time.monotonic()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        try:
+            result = self.db.generate_query(self.prompt, "mysql")
+            if self._cancelled.is_set():
+                return
+            self.result = result
+            self.stage = "Executing the query on the database..."
+            page = self._fetch(0)
+            with self._lock:
+                if not self._cancelled.is_set():
+                    self.frame, self.has_next, self.page_truncated = page
+                    self.status = "done"
+        except Exception as e:
+            if not self._cancelled.is_set():
+                self.error = e
+                self.status = "failed"
+
+    def _fetch(self, number: int):
+        """Runs the query for page ``number``; returns (DataFrame, has next page, truncated)."""
+        offset = number * self.page_size
+        # One row past the page tells whether there is a next one.
+        count = min(self.page_size + 1, MAX_RESULT_ROWS - offset)
+        sql = self.db.optimizer.paginate(self.result["query"], "mysql", offset, count)
+        stream = self.db.stream_mysql_query(sql, max_rows=count, max_bytes=MAX_PAGE_BYTES)
+        with self._lock:
+            if self._cancelled.is_set():
+                raise RuntimeError("Query cancelled")
+            self.stream = stream
+        with stream:
+            rows = stream.fetchall()
+        truncated = stream.truncated and len(rows) < count
+        return (pd.DataFrame.from_records(rows[:self.page_size], columns=stream.columns),
+                len(rows) > self.page_size, truncated)
+
+    def show_page(self, number: int) -> None:
+        """Loads page ``number`` on the caller's thread unless it is the page already loaded."""
+        if number != self.page_number:
+            self.frame, self.has_next, self.page_truncated = self._fetch(number)
+            self.page_number = number
+
+    def cancel(self):
+        self._cancelled.set()
+        with self._lock:
+            if self.status == "running":
+                self.status = "cancelled"
+            stream = self.stream
+        if stream is not None:
+            # The job's thread gets the interruption as an error and closes the stream.
+            stream.cancel()
+
+
+def show_next_page():
+    job = st.session_state.job
+    if job.has_next:
+        st.session_state.page = job.page_number + 1
+
+
+def show_previous_page():
+    st.session_state.page = max(0, st.session_state.page - 1)
+
+
+def show_metrics(result: dict):
+    if result["cache"] is not None:
+        st.write(f"**Served from cache** ({result['cache']['match']} match)")
+        return
+    latency, usage = result["latency"], result["usage"]
+    latency_text = f"{latency:.2f} seconds" if latency is not None else "n/a"
+    # Display latency and token usage with cost information.
+    if usage and "total_tokens" in usage:
+        tokens = usage["total_tokens"]
+        cost = tokens / 1000 * 0.002  # Example cost: $0.002 per 1,000 tokens
+        st.write(f"**Latency:** {latency_text}, **Cost:** ${cost:.5f} ({tokens} tokens)")
+    else:
+        st.write(f"**Latency:** {latency_text}")
+
+
+def show_results(job: QueryJob):
+    st.subheader("Query Results:")
+    try:
+        job.show_page(st.session_state.page)
+    except Exception as e:
+        st.error(f"Failed to load page {st.session_state.page + 1}: {e}")
+        return
+    frame, page = job.frame, job.page_number
+    if frame.empty and page == 0:
+        st.info("The query executed successfully but returned no results.")
+        return
+    # Optionally, parse the table name from the SQL query.
+    table_name_match = re.search(r"FROM\s+([a-zA-Z_][a-zA-Z0-9_]*)", job.result["query"], re.IGNORECASE)
+    table_name = table_name_match.group(1) if table_name_match else "Query Results"
+    st.write(f"**Table:** {table_name}")
+    st.dataframe(frame, hide_index=True, use_container_width=True)
+    first_row = page * job.page_size + 1
+    previous_col, label_col, next_col = st.columns([1, 3, 1])
+    previous_col.button("Previous", on_click=show_previous_page, disabled=page == 0)
+    label_col.write(f"Rows {first_row}-{first_row + len(frame) - 1}")
+    next_col.button("Next", on_click=show_next_page, disabled=not job.has_next)
+    if job.page_truncated:
+        st.warning(f"This page was cut at {MAX_PAGE_BYTES} bytes; some of its rows are not shown.")
+    elif not job.has_next and first_row + len(frame) - 1 >= MAX_RESULT_ROWS:
+        st.warning(f"Only the first {MAX_RESULT_ROWS} rows can be shown.")
+
+
+db = get_db()
+
 # User prompt input
 user_prompt_text = st.text_area("Enter your query prompt:")
 
-if st.button("Generate and Execute Query"):
-    try:
-        st.info("Generating SQL query...")
-        # Create an instance of your database query class.
-        db = AIDatabaseQuery(
-            mysql_conn_str="...", 
-            mssql_conn_str="...", 
-            ai_client=OpenAIClient(api_key=os.getenv("OPENAI_API_KEY"))
-        )
-        
-        # Generate the query and retrieve metrics (for MySQL in this example)
-        result = db.generate_query(user_prompt_text, "mysql")
-        generated_query = result["query"]
-        latency = result["latency"]
-        usage = result["usage"]
-        
+job = st.session_state.get("job")
+if st.button("Generate and Execute Query", disabled=job is not None and job.status == "running"):
+    if job is not None:
+        job.cancel()
+    job = st.session_state.job = QueryJob(db, user_prompt_text)
+    st.session_state.page = 0
+
+if job is not None:
+    if job.result is not None:
         st.subheader("Generated SQL Query:")
-        st.code(generated_query, language="sql")
-        
-        # Display latency and token usage with cost information.
-        if usage and "total_tokens" in usage:
-            tokens = usage["total_tokens"]
-            cost = tokens / 1000 * 0.002  # Example cost: $0.002 per 1,000 tokens
-            st.write(f"**Latency:** {latency:.2f} seconds, **Cost:** ${cost:.5f} ({tokens} tokens)")
-        else:
-            st.write(f"**Latency:** {latency:.2f} seconds")
-        
-        st.info("Executing the query on the database...")
-        if not db.mysql_conn:
-            db.connect_mysql()
-        
-        # Extract SQL code from markdown if present.
-        match = re.search(r"```sql\s*(.*?)\s*```", generated_query, re.DOTALL | re.IGNORECASE)
-        if match:
-            sql_code = match.group(1).strip()
-        else:
-            sql_code = generated_query.strip()
-        
-        # Execute the query and fetch results.
-        cursor = db.mysql_conn.cursor()
-        cursor.execute(sql_code)
-        rows = cursor.fetchall()
-        columns = [desc[0] for desc in cursor.description] if cursor.description else []
-        cursor.close()
-        
-        st.subheader("Query Results:")
-        if rows:
-            df = pd.DataFrame(rows, columns=columns)
-            # If there's only one column but multiple rows, transpose the DataFrame.
-            if df.shape[1] == 1 and df.shape[0] > 1:
-                df = df.T
-            # Optionally, parse the table name from the SQL query.
-            table_name_match = re.search(r"FROM\s+([a-zA-Z_][a-zA-Z0-9_]*)", sql_code, re.IGNORECASE)
-            table_name = table_name_match.group(1) if table_name_match else "Query Results"
-            st.write(f"**Table:** {table_name}")
-            # Convert DataFrame to HTML without the index.
-            html_table = df.to_html(index=False)
-            st.markdown(html_table, unsafe_allow_html=True)
-        else:
-            st.info("The query executed successfully but returned no results.")
-    except Exception as e:
-        st.error(f"An error occurred: {e}")
\ No newline at end of file
+        st.code(job.result["query"], language="sql")
+        show_metrics(job.result)
+    if job.status == "running":
+        st.info(f"{job.stage} ({time.monotonic() - job.started:.0f}s)")
+        if st.button("Cancel"):
+            job.cancel()
+            st.rerun()
+        # Poll the background job; the script thread never waits on the LLM or the database.
+        time.sleep(POLL_INTERVAL)
+        st.rerun()
+    elif job.status == "cancelled":
+        st.warning("Query cancelled.")
+    elif job.status == "failed":
+        st.error(f"An error occurred: {job.error}")
+    else:
+        show_results(job)
@@ -0,0 +1,31 @@
+import os
+import shutil
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+import benchmark_pipeline
+import benchmark_schema
+
+
+class TestBenchmarks(unittest.TestCase):
+    """The offline benchmarks' simulated MySQL must keep answering the queries SchemaGenerator sends."""
+
+    def test_schema_benchmark_bulk_matches_per_table(self):
+        result = benchmark_schema.run(12, rtt=0.0, live=False)
+        self.assertTrue(result["same_result"])
+
+    def test_pipeline_benchmark_runs_without_errors(self):
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        path = os.path.join(tmp, "bench.db")
+        benchmark_pipeline.create_sqlite_database(path, 12, rows_per_table=20)
+        args = SimpleNamespace(rtt_ms=0.0, llm_latency_ms=0.0, llm_jitter_ms=0.0, cache_size=100,
+                               requests=30, seed=0, memory=False, max_rows=100)
+        result = benchmark_pipeline.run(12, 4, 0.5, args, path)
+        self.assertEqual(result["errors"], 0, result["first_error"])
+        self.assertEqual(result["requests"], 30)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from ConnectionPool import ConnectionPool
+from ExampleStore import ExampleStore
+from ResultStream import ResultStream
+from db_backends import get_dialect
+
+LOG = """\
+2025-03-02 17:14:33,773 - prompttemplate - INFO - Generating MySQL prompt for query: Give me total online sales amount
+2025-03-02 17:14:34,975 - database_query - INFO - Generated and optimized query: ```sql
+SELECT SUM(LineTotal) AS TotalSalesAmount
+FROM Sales_SalesOrderDetail;
+```;
+2025-03-02 17:15:10,101 - prompttemplate - INFO - Generating MySQL prompt for query: Count of employees per department
+2025-03-02 17:15:11,202 - database_query - INFO - Generated and optimized query: SELECT DepartmentID, COUNT(*) FROM HumanResources_Employee GROUP BY DepartmentID;
+2025-03-02 17:15:11,305 - database_query - ERROR - Failed to execute mysql query: Unknown column 'DepartmentID'
+"""
+
+
+class TestExampleStore(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+
+    def import_log(self, store):
+        path = os.path.join(self.dir, "application.log")
+        with open(path, "w") as f:
+            f.write(LOG)
+        return store.import_log(path)
+
+    def test_imported_log_pairs_are_offered(self):
+        store = ExampleStore()
+        self.assertEqual(self.import_log(store), 2)
+        selected = store.select("total online sales amount by year", "mysql")
+        self.assertEqual([example.question for example in selected], ["Give me total online sales amount"])
+        self.assertIsNone(selected[0].executed)
+
+    def test_failed_examples_are_never_offered(self):
+        store = ExampleStore()
+        self.import_log(store)
+        self.assertEqual(store.select("count of employees per department", "mysql"), [])
+
+    def test_verified_examples_come_first_and_unverified_ones_are_capped(self):
+        store = ExampleStore()
+        store.record("total sales amount by year", "SELECT 1 FROM a", "mysql")
+        store.record("total sales amount by month", "SELECT 2 FROM b", "mysql")
+        store.record("total sales amount by day", "SELECT 3 FROM c", "mysql", executed=True)
+        selected = store.select("total sales amount by week", "mysql", k=3)
+        self.assertEqual(len(selected), 2)
+        self.assertIs(selected[0].executed, True)
+        self.assertEqual(len(store.select("total sales amount by week", "mysql", k=3, max_unverified=0)), 1)
+
+    def test_stream_outcome_verifies_the_example(self):
+        path = os.path.join(self.dir, "test.db")
+        conn = sqlite3.connect(path)
+        conn.execute("CREATE TABLE t (id INTEGER)")
+        conn.commit()
+        conn.close()
+        dialect = get_dialect("sqlite")
+        pool = ConnectionPool(lambda: dialect.connect(path), size=1, name="test")
+        self.addCleanup(pool.close)
+        store = ExampleStore()
+        store.record("all ids", "SELECT id FROM t", "sqlite")
+        store.record("all names", "SELECT name FROM t", "sqlite")
+
+        def record(stream, error):
+            store.record_execution(stream.sql, error is None, stream.elapsed)
+
+        with ResultStream(pool, "SELECT id FROM t", dialect=dialect, on_complete=record) as stream:
+            stream.fetchall()
+        with self.assertRaises(sqlite3.OperationalError):
+            with ResultStream(pool, "SELECT name FROM t", dialect=dialect, on_complete=record) as stream:
+                stream.fetchall()
+        executed = {example.question: example.executed for example in store._examples.values()}
+        self.assertEqual(executed, {"all ids": True, "all names": False})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from QueryCache import QueryCache, normalize_prompt
+from SQLiteCacheStore import SQLiteCacheStore
+
+
+class TestNormalizePrompt(unittest.TestCase):
+    def test_case_punctuation_and_stop_words(self):
+        self.assertEqual(normalize_prompt("Show me the total SALES, please!"), normalize_prompt("total sales"))
+
+    def test_operators_are_kept(self):
+        self.assertNotEqual(normalize_prompt("orders with amount > 100"), normalize_prompt("orders with amount < 100"))
+        self.assertNotEqual(normalize_prompt("amount >= 100"), normalize_prompt("amount > 100"))
+
+    def test_quoted_literals_keep_their_case(self):
+        self.assertNotEqual(normalize_prompt("customers in 'TX'"), normalize_prompt("customers in 'tx'"))
+        self.assertNotEqual(normalize_prompt('customers in "New York"'), normalize_prompt("customers in New York"))
+
+
+class TestFuzzyLookup(unittest.TestCase):
+    def setUp(self):
+        self.cache = QueryCache(max_size=10, fuzzy_threshold=0.5)
+
+    def fuzzy(self, prompt):
+        return self.cache.lookup(prompt, "mysql", fuzzy=True)
+
+    def test_fuzzy_is_opt_in(self):
+        self.cache.set("total sales by region", "mysql", "SELECT 1;")
+        self.assertIsNone(self.cache.lookup("sales by region total", "mysql"))
+        self.assertEqual(self.fuzzy("sales by region total")["match"], "fuzzy")
+
+    def test_different_literal_is_not_a_match(self):
+        self.cache.set("customers in state 'TX'", "mysql", "SELECT 1;")
+        self.assertIsNone(self.fuzzy("customers in state 'WA'"))
+
+    def test_extra_content_word_is_not_a_match(self):
+        self.cache.set("total sales in january", "mysql", "SELECT 1;")
+        self.assertIsNone(self.fuzzy("total sales in january and february"))
+
+    def test_different_number_is_not_a_match(self):
+        self.cache.set("total sales in 2023", "mysql", "SELECT 1;")
+        self.assertIsNone(self.fuzzy("total sales in 2024"))
+
+    def test_different_operator_is_not_a_match(self):
+        self.cache.set("orders with amount > 100", "mysql", "SELECT 1;")
+        self.assertIsNone(self.fuzzy("orders with amount < 100"))
+
+    def test_other_dialect_is_not_a_match(self):
+        self.cache.set("total sales by region", "mysql", "SELECT 1;")
+        self.assertIsNone(self.cache.lookup("sales by region total", "mssql", fuzzy=True))
+
+
+class TestEviction(unittest.TestCase):
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = QueryCache(max_size=2)
+        cache.set("first", "mysql", "SELECT 1;")
+        cache.set("second", "mysql", "SELECT 2;")
+        self.assertEqual(cache.get("first", "mysql"), "SELECT 1;")
+        cache.set("third", "mysql", "SELECT 3;")
+        self.assertIsNone(cache.get("second", "mysql"))
+        self.assertEqual(cache.get("first", "mysql"), "SELECT 1;")
+        self.assertEqual(cache.get("third", "mysql"), "SELECT 3;")
+        self.assertEqual(cache.evictions, 1)
+
+    def test_expired_entry_is_dropped(self):
+        cache = QueryCache(ttl=0.05)
+        cache.set("first", "mysql", "SELECT 1;")
+        self.assertEqual(cache.get("first", "mysql"), "SELECT 1;")
+        time.sleep(0.1)
+        self.assertIsNone(cache.get("first", "mysql"))
+        self.assertEqual((len(cache), cache.bytes, cache.expirations), (0, 0, 1))
+
+    def test_byte_budget_evicts_oldest_entries(self):
+        query = "SELECT " + "x" * 200 + ";"
+        cache = QueryCache(max_size=100, max_bytes=600)
+        for prompt in ("first", "second", "third"):
+            cache.set(prompt, "mysql", query)
+        self.assertLessEqual(cache.bytes, 600)
+        self.assertIsNone(cache.get("first", "mysql"))
+        self.assertEqual(cache.get("third", "mysql"), query)
+
+    def test_entry_larger_than_budget_is_not_cached(self):
+        cache = QueryCache(max_bytes=100)
+        cache.set("first", "mysql", "SELECT " + "x" * 200 + ";")
+        self.assertEqual((len(cache), cache.bytes), (0, 0))
+
+
+class TestSchemaFingerprint(unittest.TestCase):
+    def test_lookup_without_fingerprint_keeps_entries(self):
+        cache = QueryCache()
+        cache.set("first", "mysql", "SELECT 1;", schema_fingerprint="v1")
+        self.assertEqual(cache.get("first", "mysql"), "SELECT 1;")
+        self.assertEqual(cache.get("first", "mysql", "v1"), "SELECT 1;")
+        self.assertEqual(cache.invalidations, 0)
+
+    def test_changed_fingerprint_invalidates(self):
+        cache = QueryCache()
+        cache.set("first", "mysql", "SELECT 1;", schema_fingerprint="v1")
+        self.assertIsNone(cache.get("first", "mysql", "v2"))
+        self.assertEqual((len(cache), cache.invalidations), (0, 1))
+
+    def test_l2_lookup_without_fingerprint_keeps_entries(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        l2 = SQLiteCacheStore(os.path.join(directory, "cache.sqlite3"))
+        QueryCache(l2=l2).set("first", "mysql", "SELECT 1;", schema_fingerprint="v1")
+        self.assertEqual(QueryCache(l2=l2).get("first", "mysql"), "SELECT 1;")
+        cache = QueryCache(l2=l2)
+        self.assertEqual(cache.get("first", "mysql", "v1"), "SELECT 1;")
+        self.assertIsNone(QueryCache(l2=l2).get("first", "mysql", "v2"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,32 @@
+import unittest
+from QueryOptimizer import QueryOptimizer
+
+
+class TestPaginate(unittest.TestCase):
+    def setUp(self):
+        self.optimizer = QueryOptimizer()
+
+    def test_adds_limit_and_offset(self):
+        self.assertEqual(self.optimizer.paginate("```sql\nSELECT a FROM t;\n```", "mysql", 20, 101),
+                         "SELECT a FROM t LIMIT 101 OFFSET 20;")
+
+    def test_page_stays_within_an_existing_limit(self):
+        for sql in ("SELECT a FROM t LIMIT 10, 50", "SELECT a FROM t LIMIT 50 OFFSET 10"):
+            self.assertEqual(self.optimizer.paginate(sql, "mysql", 20, 101), "SELECT a FROM t LIMIT 30 OFFSET 30;")
+        self.assertEqual(self.optimizer.paginate("SELECT a FROM t LIMIT 50", "mysql", 100, 101),
+                         "SELECT a FROM t LIMIT 0 OFFSET 100;")
+
+    def test_nested_limit_is_left_alone(self):
+        self.assertEqual(
+            self.optimizer.paginate("SELECT a FROM (SELECT b FROM u LIMIT 3) x ORDER BY a", "mysql", 0, 11),
+            "SELECT a FROM (SELECT b FROM u LIMIT 3) x ORDER BY a LIMIT 11 OFFSET 0;")
+
+    def test_rejects_what_it_cannot_paginate(self):
+        for sql, db_type in (("DELETE FROM t", "mysql"), ("SELECT 1; SELECT 2", "mysql"),
+                             ("SELECT a FROM t LIMIT ?", "mysql"), ("SELECT a FROM t", "mssql")):
+            with self.assertRaises(ValueError, msg=sql):
+                self.optimizer.paginate(sql, db_type, 0, 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
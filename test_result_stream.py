@@ -0,0 +1,67 @@
+import os
+import shutil
+import tempfile
+import unittest
+from ConnectionPool import ConnectionPool
+from ResultStream import ResultStream
+from db_backends import get_dialect
+
+
+class TestTruncation(unittest.TestCase):
+    ROWS = 10
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.dialect = get_dialect("sqlite")
+        path = os.path.join(self.dir, "test.db")
+        self.pool = ConnectionPool(lambda: self.dialect.connect(path), size=1, name="test")
+        with self.pool.connection() as conn:
+            conn.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, name TEXT)")
+            conn.executemany("INSERT INTO t VALUES (?, ?)", [(i, "x" * 10) for i in range(self.ROWS)])
+            conn.commit()
+
+    def tearDown(self):
+        self.pool.close()
+        shutil.rmtree(self.dir)
+
+    def stream(self, **kwargs):
+        kwargs.setdefault("batch_size", 3)
+        return ResultStream(self.pool, "SELECT id, name FROM t ORDER BY id", dialect=self.dialect, **kwargs)
+
+    def test_result_ending_at_max_rows_is_not_truncated(self):
+        with self.stream(max_rows=self.ROWS) as stream:
+            rows = stream.fetchall()
+        self.assertEqual(len(rows), self.ROWS)
+        self.assertFalse(stream.truncated)
+        self.assertTrue(stream.exhausted)
+
+    def test_result_beyond_max_rows_is_truncated(self):
+        with self.stream(max_rows=self.ROWS - 1) as stream:
+            rows = stream.fetchall()
+        self.assertEqual((len(rows), stream.row_count), (self.ROWS - 1, self.ROWS - 1))
+        self.assertTrue(stream.truncated)
+
+    def test_byte_cap_truncates_after_the_row_crossing_it(self):
+        # Each row is 8 bytes for the id and 10 for the name.
+        with self.stream(max_rows=None, max_bytes=18 * 4 + 1) as stream:
+            rows = stream.fetchall()
+        self.assertEqual(len(rows), 5)
+        self.assertTrue(stream.truncated)
+
+    def test_byte_cap_crossed_by_the_last_row_is_not_truncated(self):
+        with self.stream(max_rows=None, max_bytes=18 * self.ROWS - 1) as stream:
+            rows = stream.fetchall()
+        self.assertEqual(len(rows), self.ROWS)
+        self.assertFalse(stream.truncated)
+
+    def test_partially_read_stream_returns_its_connection(self):
+        stream = self.stream(max_rows=None).open()
+        self.assertEqual(len(next(stream.batches())), 3)
+        stream.close()
+        self.assertEqual(self.pool.discarded, 0)
+        with self.stream(max_rows=None) as stream:
+            self.assertEqual(len(stream.fetchall()), self.ROWS)
+
+
+if __name__ == "__main__":
+    unittest.main()
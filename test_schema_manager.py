@@ -0,0 +1,33 @@
+import unittest
+from SchemaManager import SchemaManager
+
+
+def schema(relationships):
+    return {
+        "tables": {
+            "orders": {"columns": ["id", "customer_id", "amount"], "primary_key": ["id"]},
+            "customers": {"columns": ["id", "name"], "primary_key": ["id"]},
+        },
+        "relationships": relationships,
+    }
+
+
+def foreign_key(column, table, referenced_column="id"):
+    return {"column": column, "constraint": f"fk_{column}", "references": {"table": table, "column": referenced_column}}
+
+
+class TestForeignKeyNeighbours(unittest.TestCase):
+    def test_neighbour_is_added_to_the_context(self):
+        manager = SchemaManager(schema({"orders": [foreign_key("customer_id", "customers")]}))
+        self.assertEqual({table for table, _ in manager.rank_tables("show all orders")}, {"orders", "customers"})
+        self.assertIn("customer_id -> customers.id", manager.get_context("show all orders"))
+
+    def test_foreign_key_to_a_table_outside_the_snapshot_is_ignored(self):
+        manager = SchemaManager(schema({"orders": [foreign_key("customer_id", "archive_customers")],
+                                        "dropped": [foreign_key("order_id", "orders")]}))
+        self.assertEqual([table for table, _ in manager.rank_tables("show all orders")], ["orders"])
+        self.assertEqual(manager.get_context("show all orders"), "orders(id PK, customer_id, amount)")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+import asyncio
+import sqlite3
+import threading
+import unittest
+from ConnectionPool import ConnectionPool
+from SchemaStore import SchemaStore
+from ai_clients import AIClient
+from database_query import AIDatabaseQuery
+
+
+class FakeGenerator:
+    def fetch_table_versions(self):
+        return {}
+
+    def fetch_schema(self):
+        return {"tables": {"customers": {"columns": ["id", "name"]}}, "relationships": {}}
+
+
+class BlockingClient(AIClient):
+    """Waits for ``release`` and then raises ``error`` (or returns a query)."""
+
+    def __init__(self):
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.error = None
+
+    def generate_query(self, prompt, max_tokens, system_prompt=None):
+        self.started.set()
+        self.release.wait(5)
+        if self.error is not None:
+            raise self.error
+        return {"query": "SELECT name FROM customers", "latency": 0.0, "usage": None}
+
+
+class TestSingleFlight(unittest.TestCase):
+    def setUp(self):
+        self.client = BlockingClient()
+        self.db = AIDatabaseQuery(
+            "", "", self.client, mysql_pool=ConnectionPool(lambda: sqlite3.connect(":memory:"), size=1, name="test"),
+            schema_store=SchemaStore(generator_factory=FakeGenerator))
+
+    def run_leader(self):
+        errors = []
+
+        def leader():
+            try:
+                self.db.generate_query("list customers", "mysql")
+            except BaseException as e:
+                errors.append(e)
+
+        thread = threading.Thread(target=leader)
+        thread.start()
+        self.assertTrue(self.client.started.wait(5))
+        return thread, errors
+
+    def test_followers_are_released_when_the_leader_is_interrupted(self):
+        self.client.error = KeyboardInterrupt()
+        thread, errors = self.run_leader()
+        key, future, leader = self.db._join_inflight("list customers", "mysql", 150)
+        self.assertFalse(leader)
+        self.client.release.set()
+        thread.join(5)
+        self.assertIsInstance(errors[0], KeyboardInterrupt)
+        self.assertIsInstance(future.exception(timeout=5), RuntimeError)
+        self.assertEqual(self.db._inflight, {})
+
+    def test_followers_get_the_leaders_query(self):
+        thread, errors = self.run_leader()
+        key, future, leader = self.db._join_inflight("list customers", "mysql", 150)
+        self.client.release.set()
+        thread.join(5)
+        self.assertEqual(errors, [])
+        self.assertIn("customers", future.result(timeout=5)["query"])
+        self.assertEqual(self.db._inflight, {})
+
+    def test_cancelled_async_leader_releases_followers(self):
+        async def scenario():
+            leader = asyncio.ensure_future(self.db.agenerate_query("list customers", "mysql"))
+            await asyncio.to_thread(self.client.started.wait, 5)
+            follower = asyncio.ensure_future(self.db.agenerate_query("list customers", "mysql"))
+            await asyncio.sleep(0.05)
+            leader.cancel()
+            with self.assertRaises(RuntimeError):
+                await asyncio.wait_for(follower, 5)
+            self.client.release.set()
+
+        asyncio.run(scenario())
+        self.assertEqual(self.db._inflight, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
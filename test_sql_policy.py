@@ -0,0 +1,94 @@
+import unittest
+from SQLTokenizer import SQLPolicy
+
+
+class TestReadOnlyPolicy(unittest.TestCase):
+    def setUp(self):
+        self.policy = SQLPolicy.read_only()
+
+    def assertAllowed(self, sql):
+        self.assertIsNone(self.policy.check(sql), sql)
+
+    def assertRejected(self, sql):
+        self.assertIsNotNone(self.policy.check(sql), sql)
+
+    def test_select_is_allowed(self):
+        self.assertAllowed("SELECT id, name FROM customers WHERE state = 'TX'")
+        self.assertAllowed("WITH t AS (SELECT id FROM orders) SELECT COUNT(*) FROM t")
+
+    def test_function_calls_named_like_keywords_are_allowed(self):
+        self.assertAllowed("SELECT REPLACE(name, 'a', 'b') FROM customers")
+        self.assertAllowed("SELECT INSERT(name, 1, 2, 'xy') FROM customers")
+        self.assertAllowed("SELECT TRUNCATE(amount, 2), LEFT(name, 3) FROM orders")
+
+    def test_keywords_inside_strings_and_comments_are_ignored(self):
+        self.assertAllowed("SELECT 'DROP TABLE x; INSERT INTO y' FROM t -- DELETE FROM t")
+
+    def test_writes_are_rejected(self):
+        self.assertRejected("INSERT INTO customers (name) VALUES ('x')")
+        self.assertRejected("REPLACE INTO customers (id, name) VALUES (1, 'x')")
+        self.assertRejected("UPDATE customers SET name = 'x'")
+        self.assertRejected("WITH t AS (SELECT 1) DELETE FROM customers")
+
+    def test_select_that_writes_or_locks_is_rejected(self):
+        self.assertRejected("SELECT * FROM customers INTO OUTFILE '/tmp/out.csv'")
+        self.assertRejected("SELECT * FROM customers FOR UPDATE")
+
+    def test_executable_comments_are_checked(self):
+        self.assertRejected("SELECT * FROM customers /*!50000 INTO OUTFILE '/tmp/x' */")
+        self.assertRejected("SELECT 1 FROM t /*! ; DELETE FROM t */")
+        self.assertRejected("SELECT /*M!100100 1; DROP TABLE t */ 1")
+        self.assertRejected("SELECT 1 FROM t /*!40101 ")
+
+    def test_optimizer_hints_and_plain_comments_are_allowed(self):
+        self.assertAllowed("SELECT /*+ MAX_EXECUTION_TIME(1000) */ id FROM customers")
+        self.assertAllowed("SELECT a*/* INTO OUTFILE */b FROM t")
+
+    def test_stacked_and_malformed_statements_are_rejected(self):
+        self.assertRejected("SELECT 1; DROP TABLE customers")
+        self.assertRejected("SELECT 'unterminated FROM customers")
+        self.assertRejected("")
+
+
+
+class TestDialectLexing(unittest.TestCase):
+    BACKSLASH_ESCAPE = "SELECT 1 FROM t WHERE a = 'x\\' ; COMMIT; DROP TABLE t; -- '"
+
+    def check(self, dialect, sql):
+        return SQLPolicy.read_only(dialect).check(sql)
+
+    def test_mysql_hash_comment_and_backslash_escape(self):
+        self.assertIsNone(self.check("mysql", "SELECT 1 # 2; DROP TABLE customers"))
+        self.assertIsNone(self.check("mysql", self.BACKSLASH_ESCAPE))
+        self.assertIsNotNone(self.check("mysql", "SELECT 1--1; DROP TABLE customers"))
+
+    def test_postgresql(self):
+        self.assertIsNotNone(self.check("postgresql", "SELECT 1 # 2; DROP TABLE customers"))
+        self.assertIsNotNone(self.check("postgresql", self.BACKSLASH_ESCAPE))
+        self.assertIsNone(self.check("postgresql", "SELECT E'x\\' ; DROP' FROM t"))
+        self.assertIsNone(self.check("postgresql", "SELECT $$ ; DROP TABLE t $$, $1"))
+        self.assertIsNotNone(self.check("postgresql", "SELECT $a$ ' $a$; DROP TABLE t; -- '"))
+        self.assertIsNotNone(self.check("postgresql", "SELECT [1] FROM t WHERE a = '[' ; DROP TABLE t; --]'"))
+
+    def test_mssql(self):
+        self.assertIsNotNone(self.check("mssql", "SELECT 1 # 2; DROP TABLE customers"))
+        self.assertIsNotNone(self.check("mssql", self.BACKSLASH_ESCAPE))
+        self.assertIsNone(self.check("mssql", "SELECT [order; DROP TABLE t] FROM [dbo].[orders]"))
+        self.assertIsNone(self.check("mssql", "SELECT TOP 10 name FROM customers WHERE name = N'O''Brien'"))
+
+    def test_sqlite(self):
+        self.assertIsNotNone(self.check("sqlite", "SELECT 1 # 2; DROP TABLE customers"))
+        self.assertIsNotNone(self.check("sqlite", self.BACKSLASH_ESCAPE))
+
+    def test_check_can_override_the_policy_dialect(self):
+        policy = SQLPolicy.read_only()
+        self.assertIsNone(policy.check("SELECT 1 # 2; DROP TABLE customers"))
+        self.assertIsNotNone(policy.check("SELECT 1 # 2; DROP TABLE customers", "postgresql"))
+
+    def test_mssql_brackets_are_not_identifiers_elsewhere(self):
+        self.assertIsNotNone(self.check("mysql", "SELECT [order; DROP TABLE t] FROM t"))
+        self.assertIsNotNone(self.check("postgresql", "SELECT [order; DROP TABLE t] FROM t"))
+
+
+if __name__ == "__main__":
+    unittest.main()
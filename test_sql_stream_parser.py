@@ -0,0 +1,39 @@
+import unittest
+from ai_clients import SQLStreamParser
+
+
+def feed(text, chunk=7):
+    """Feeds ``text`` in chunks; returns the completion once the parser reports it, else None."""
+    parser = SQLStreamParser()
+    for i in range(0, len(text), chunk):
+        completed = parser.feed(text[i:i + chunk])
+        if completed is not None:
+            return completed
+    return None
+
+
+class TestSQLStreamParser(unittest.TestCase):
+    def test_unfenced_sql_stops_at_the_semicolon(self):
+        sql = "SELECT c.name, COUNT(*) AS orders FROM customers c WHERE c.note <> 'a;b' GROUP BY c.name;"
+        self.assertEqual(feed(sql + "\nThis query counts orders."), sql)
+
+    def test_fenced_sql_stops_at_the_closing_fence(self):
+        reply = "Here is the query:\n```sql\nSELECT 1;\n```"
+        self.assertEqual(feed(reply + "\nMore text."), reply)
+
+    def test_prose_opening_with_an_sql_word_waits_for_the_fence(self):
+        for prose in ("With the schema above, you can use this query; it sums the totals:",
+                      "Show me the customers; the query below does that:",
+                      "Select the rows from the table; for example:"):
+            reply = f"{prose}\n```sql\nSELECT name FROM customers;\n```"
+            self.assertEqual(feed(reply + "\nDone."), reply, prose)
+
+    def test_prose_without_a_fence_is_never_cut(self):
+        self.assertIsNone(feed("Show me the customers; there is no such table. Sorry!"))
+
+    def test_unfenced_show_statement(self):
+        self.assertEqual(feed("SHOW TABLES;\nThese are the tables."), "SHOW TABLES;")
+
+
+if __name__ == "__main__":
+    unittest.main()
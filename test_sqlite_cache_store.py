@@ -0,0 +1,39 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from SQLiteCacheStore import SQLiteCacheStore
+
+
+class TestCompaction(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.store = SQLiteCacheStore(os.path.join(self.dir, "cache.sqlite3"), max_entries=2)
+
+    def fill(self):
+        for i in range(4):
+            self.store.set(f"key{i}", f"SELECT {i};", ttl=0.05 if i == 0 else None)
+            time.sleep(0.01)  # distinct last_access times
+
+    def test_compact_drops_expired_and_least_recently_used_entries(self):
+        self.fill()
+        time.sleep(0.1)
+        self.assertEqual(self.store.compact(), {"expired": 1, "trimmed": 1})
+        self.assertEqual(self.store.stats()["entries"], 2)
+        self.assertIsNone(self.store.get("key1"))
+        self.assertIsNotNone(self.store.get("key3"))
+
+    def test_started_compaction_runs_at_once(self):
+        self.fill()
+        self.store.start_compaction(interval=3600)
+        self.addCleanup(self.store.stop_compaction)
+        deadline = time.monotonic() + 5
+        while self.store.stats()["entries"] > 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.store.stats()["entries"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()